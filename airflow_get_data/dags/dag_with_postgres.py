@@ -4,14 +4,38 @@ import pandas as pd
 import yfinance as yf
 import numpy as np
 from psycopg2.extensions import register_adapter, AsIs
+from psycopg2.extras import execute_values
 
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 
+from stock_updates import (
+    BATCH_SIZE,
+    PRICE_COLUMNS,
+    clean_data,
+    get_rollup_start,
+    group_by_gap_start,
+    keep_last_trading_day,
+    split_batches,
+    to_rows,
+)
+
 register_adapter(np.int64, AsIs)
 register_adapter(np.float64, AsIs)
 
+MAX_ACTIVE_BATCHES = 8
+PAGE_SIZE = 1000
+UPSERT_QUERY = f"""
+    INSERT INTO stock_prize ({', '.join(PRICE_COLUMNS)}) VALUES %s
+    ON CONFLICT (ticker, date) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume
+"""
+
 default_args = {
     'owner': 'wrat',
     'retries': 5,
@@ -19,115 +43,169 @@ default_args = {
 }
 
 
-def main(ds_nodash):
+def get_ticker_batches(batch_size=BATCH_SIZE):
     """
-    Main function performed by Airflow. Get tickers from database,
-    downloads data for each ticker, cleans it and save cleaned data to database
+    Get tickers with their latest stored date from database and splits them into
+    batches, one mapped task per batch
     """
-    tickers = get_tickers()
-    company_tickers = [str(row[0]) for row in tickers]
-    for ticker in company_tickers:
-        data = get_ticker_data(ticker, ds_nodash)
-        if data is not None:
-            cleaned_data = clean_data(data, ticker)
-            if cleaned_data is not None:
-                save_data_to_db(cleaned_data)
+    return split_batches(get_last_dates(), batch_size)
+
+
+def update_ticker_batch(tickers, last_dates, ds_nodash):
+    """
+    Downloads the missing data of a batch of tickers, cleans it and saves all rows of
+    the batch to database in one upsert. Tickers with the same gap are downloaded in
+    one request, so a run after an outage catches up with all missed runs
+    """
+    logical_date = datetime.strptime(ds_nodash, '%Y%m%d').date()
+    data = {}
+    for start_date, gap_tickers in group_by_gap_start(tickers, last_dates, logical_date).items():
+        gap_data = get_batch_data(gap_tickers, start_date, logical_date)
+        if gap_data is None:
+            raise RuntimeError(f"Downloading data for {len(gap_tickers)} tickers since {start_date} failed")
+        data.update(gap_data)
+
+    cleaned = [clean_data(ticker_data, ticker) for ticker, ticker_data in data.items()]
+    cleaned = [ticker_data for ticker_data in cleaned if ticker_data is not None and not ticker_data.empty]
+    if not cleaned:
+        logging.info(f"No new data for batch starting with {tickers[0]}")
+        return 0
+    return save_data_to_db(pd.concat(cleaned, ignore_index=True))
 
 
-def get_tickers():
+def update_rollups(ds_nodash, ti):
     """
-    Get tickers from PostgresSQL database
+    Refreshes rollups since the earliest downloaded date of all batches
+    """
+    logical_date = datetime.strptime(ds_nodash, '%Y%m%d').date()
+    batches = ti.xcom_pull(task_ids='get_ticker_batches') or []
+    refresh_rollups(get_rollup_start(batches, logical_date))
+
+
+def get_last_dates():
+    """
+    Get tickers and their latest stored date from PostgresSQL database
+
+    :return:
+        - last_dates (dict): Mapping of tickers to their latest date in 'YYYY-MM-DD'
+        format, None for tickers without data
     """
     hook = PostgresHook(postgres_conn_id="postgres_localhost")
+    # Errors fail the task, an empty result would map no batches and load nothing.
+    conn = hook.get_conn()
     try:
-        conn = hook.get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT ticker FROM companies")
-        company_tickers = cur.fetchall()
-        cur.close()
+        with conn.cursor() as cur:
+            cur.execute("""SELECT c.ticker, MAX(s.date) FROM companies c
+                           LEFT JOIN stock_prize s ON s.ticker = c.ticker
+                           GROUP BY c.ticker""")
+            rows = cur.fetchall()
+    finally:
         conn.close()
-        logging.info("Successfully connected to db")
-        return company_tickers
-    except Exception as e:
-        logging.error(f"Error {e} Connecting to db failed")
-        return []
+    if not rows:
+        raise RuntimeError("No companies found in database")
+    logging.info("Successfully connected to db")
+    return {str(ticker): last_date.isoformat() if last_date else None for ticker, last_date in rows}
 
 
-def get_ticker_data(ticker, ds_nodash):
+def get_batch_data(tickers, start_date, logical_date):
     """
-    Get data for ticker from yfinance
+    Get data for tickers from yfinance in one request
+
+    The last trading day of every week is kept, like the weekly runs missed between
+    start_date and logical_date would have stored it.
+
+    :parameter:
+        - tickers (list of str): Company symbols.
+        - start_date (date): The first date to download.
+        - logical_date (date): The last date to download.
+    :return:
+        - data (dict) or None: Mapping of tickers to their history, tickers without
+        data are left out. If the download fails, the function returns None
     """
     try:
-        stock = yf.Ticker(ticker)
-        close_data = datetime.strptime(ds_nodash, '%Y%m%d')
-        end_data = close_data + timedelta(days=1)
-        data = stock.history(start=close_data, end=end_data)
-        logging.info(f"Got data for {ticker}")
-        return data
+        raw_data = yf.download(
+            tickers,
+            start=start_date,
+            end=logical_date + timedelta(days=1),
+            group_by='ticker',
+            auto_adjust=True,
+            actions=False,
+            threads=True,
+            progress=False,
+        )
     except Exception as e:
-        logging.error(f"Error: {e} while getting ticker data")
+        logging.error(f"Error: {e} while getting batch data")
         return None
+    if not isinstance(raw_data.columns, pd.MultiIndex):
+        raw_data = pd.concat({tickers[0]: raw_data}, axis=1)
 
+    data = {}
+    for ticker in tickers:
+        if ticker not in raw_data.columns.get_level_values(0):
+            continue
+        ticker_data = keep_last_trading_day(raw_data[ticker].dropna(subset=['Close']))
+        if not ticker_data.empty:
+            data[ticker] = ticker_data
+    logging.info(f"Got data for {len(data)} of {len(tickers)} tickers")
+    return data
 
-def clean_data(raw_data, ticker):
+
+def save_data_to_db(data):
     """
-    Cleans downloaded ticker data
+    Saves all rows of cleaned data to PostgresSQL database in one upsert over one
+    connection, rows already stored are updated
+
+    :return:
+        - count (int): The number of saved rows
     """
-    try:
-        data1 = raw_data.drop(columns=['Stock Splits', 'Dividends'])
-        data1['Open'] = data1['Open'].apply(lambda x: round(x, 2))
-        data1['Close'] = data1['Close'].apply(lambda x: round(x, 2))
-        data1['High'] = data1['High'].apply(lambda x: round(x, 2))
-        data1['Low'] = data1['Low'].apply(lambda x: round(x, 2))
-        data1['date'] = data1.index
-        data1.reset_index()
-        data1['date'] = pd.to_datetime(data1['date']).dt.date
-        data1.rename(columns={
-            'Close': 'close',
-            'Open': 'open',
-            'High': 'high',
-            'Low': 'low',
-            'Volume': 'volume'
-        }, inplace=True)
-        data1['ticker'] = ticker
-        data1.head()
-        logging.info("Data cleaned successfully")
-        return data1
-    except Exception as e:
-        logging.error(f"Error: {e} while cleaning data")
-        return None
+    hook = PostgresHook(postgres_conn_id="postgres_localhost")
+    rows = to_rows(data)
+    with hook.get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, UPSERT_QUERY, rows, page_size=PAGE_SIZE)
+        conn.commit()
+    logging.info(f"Imported database with {len(rows)} rows about {data['ticker'].nunique()} tickers")
+    return len(rows)
 
 
-def save_data_to_db(data):
+def refresh_rollups(since_date):
     """
-    Saves data to PostgresSQL database
+    Refreshes weekly and monthly rollup tables for periods starting from since_date
     """
     hook = PostgresHook(postgres_conn_id="postgres_localhost")
+    # Errors fail the task, the weekly and monthly tables would otherwise stay stale.
+    conn = hook.get_conn()
     try:
-        with hook.get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""INSERT INTO stock_prize (ticker, date, open, high, low, close, volume)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                            """, (
-                            data['ticker'].values[0], data['date'].values[0], data['open'].values[0],
-                            data['high'].values[0], data['low'].values[0], data['close'].values[0],
-                            data['volume'].values[0]
-                ))
-                conn.commit()
-                logging.info(f"Imported database with data about {data['ticker'].values[0]}")
-    except Exception as e:
-        logging.error(f"Error: {e} while saving to db")
+        with conn.cursor() as cur:
+            cur.execute("SELECT refresh_stock_rollups(%s)", (since_date,))
+        conn.commit()
+    finally:
+        conn.close()
+    logging.info(f"Refreshed rollups since {since_date}")
 
 
 with DAG(
     dag_id="dag_update_postgres_ver_final",
     default_args=default_args,
     start_date=datetime(2024, 7, 19),
-    schedule_interval='0 10 * * Fri'
+    schedule_interval='0 10 * * Fri',
+    catchup=False
 ) as dag:
-    task_update_database = PythonOperator(
-        task_id="postgres_connection",
-        python_callable=main
+    task_get_batches = PythonOperator(
+        task_id="get_ticker_batches",
+        python_callable=get_ticker_batches
+    )
+    # One mapped task instance per batch, at most MAX_ACTIVE_BATCHES download at once.
+    task_update_batches = PythonOperator.partial(
+        task_id="update_ticker_batch",
+        python_callable=update_ticker_batch,
+        max_active_tis_per_dag=MAX_ACTIVE_BATCHES
+    ).expand(op_kwargs=task_get_batches.output)
+    # Rollups are refreshed even if some batches failed, failed batches are retried.
+    # Missed runs are caught up by the next run, so they are not scheduled again.
+    task_refresh_rollups = PythonOperator(
+        task_id="refresh_rollups",
+        python_callable=update_rollups,
+        trigger_rule="all_done"
     )
-    task_update_database
+    task_get_batches >> task_update_batches >> task_refresh_rollups
@@ -0,0 +1,138 @@
+"""
+Data preparation steps of the update DAG. The module imports neither Airflow nor
+yfinance, so the steps can be tested and benchmarked without them.
+"""
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+BATCH_SIZE = 50
+MAX_GAP_DAYS = 365
+PRICE_COLUMNS = ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
+
+
+def split_batches(last_dates, batch_size=BATCH_SIZE):
+    """
+    Splits tickers into batches, one mapped task per batch
+
+    :parameter:
+        - last_dates (dict): Mapping of tickers to their latest stored date in
+        'YYYY-MM-DD' format or None.
+        - batch_size (int): The maximum number of tickers per batch.
+    :return:
+        - batches (list of dict): The keyword arguments of the mapped tasks, the sorted
+        'tickers' of every batch and their 'last_dates'
+    """
+    tickers = sorted(last_dates)
+    return [
+        {
+            'tickers': tickers[i:i + batch_size],
+            'last_dates': {ticker: last_dates[ticker] for ticker in tickers[i:i + batch_size]}
+        }
+        for i in range(0, len(tickers), batch_size)
+    ]
+
+
+def group_by_gap_start(tickers, last_dates, logical_date, max_gap_days=MAX_GAP_DAYS):
+    """
+    Groups tickers by the first date missing from database
+
+    :parameter:
+        - tickers (list of str): Company symbols.
+        - last_dates (dict): Mapping of tickers to their latest stored date in
+        'YYYY-MM-DD' format or None.
+        - logical_date (date): The logical date of the run, the last date to download.
+        - max_gap_days (int): The longest downloaded gap, older data is left to
+        get_historical_data.
+    :return:
+        - groups (dict): Mapping of start dates to the tickers missing data since then.
+        Tickers already stored up to logical_date are left out, tickers without data
+        start at logical_date
+    """
+    groups = {}
+    for ticker in tickers:
+        last_date = last_dates.get(ticker)
+        if last_date is None:
+            start_date = logical_date
+        else:
+            start_date = datetime.strptime(last_date, '%Y-%m-%d').date() + timedelta(days=1)
+            start_date = max(start_date, logical_date - timedelta(days=max_gap_days))
+        if start_date <= logical_date:
+            groups.setdefault(start_date, []).append(ticker)
+    return groups
+
+
+def get_rollup_start(batches, logical_date):
+    """
+    Returns the earliest date downloaded by any batch, rollups are refreshed from it
+
+    :parameter:
+        - batches (list of dict): The batches returned by split_batches.
+        - logical_date (date): The logical date of the run.
+    :return:
+        - start_date (date): The first downloaded date, logical_date when nothing is missing
+    """
+    start_dates = [
+        start_date
+        for batch in batches
+        for start_date in group_by_gap_start(batch['tickers'], batch['last_dates'], logical_date)
+    ]
+    return min(start_dates, default=logical_date)
+
+
+def keep_last_trading_day(data):
+    """
+    Keeps the last trading day of every week of daily bars, one row per week like the
+    weekly history in stock_prize. Weeks whose Friday is a market holiday keep their
+    Thursday or the last day traded before it.
+
+    :parameter:
+        - data (pandas.DataFrame): Daily bars indexed by date.
+    :return:
+        - data (pandas.DataFrame): One bar per calendar week, sorted by date
+    """
+    data = data.sort_index()
+    dates = pd.to_datetime(data.index)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    weeks = pd.Series(dates.to_period('W-SUN'))
+    return data[~weeks.duplicated(keep='last').to_numpy()]
+
+
+def clean_data(raw_data, ticker):
+    """
+    Cleans downloaded ticker data
+    """
+    try:
+        data1 = raw_data.drop(columns=['Stock Splits', 'Dividends'], errors='ignore')
+        data1['Open'] = data1['Open'].apply(lambda x: round(x, 2))
+        data1['Close'] = data1['Close'].apply(lambda x: round(x, 2))
+        data1['High'] = data1['High'].apply(lambda x: round(x, 2))
+        data1['Low'] = data1['Low'].apply(lambda x: round(x, 2))
+        data1['date'] = data1.index
+        data1.reset_index()
+        data1['date'] = pd.to_datetime(data1['date']).dt.date
+        data1.rename(columns={
+            'Close': 'close',
+            'Open': 'open',
+            'High': 'high',
+            'Low': 'low',
+            'Volume': 'volume'
+        }, inplace=True)
+        data1['ticker'] = ticker
+        data1.head()
+        logging.info("Data cleaned successfully")
+        return data1
+    except Exception as e:
+        logging.error(f"Error: {e} while cleaning data")
+        return None
+
+
+def to_rows(data):
+    """
+    Converts cleaned data to tuples of PRICE_COLUMNS values, missing values become NULL
+    """
+    values = data[PRICE_COLUMNS].astype(object)
+    values = values.where(values.notna(), None)
+    return list(values.itertuples(index=False, name=None))
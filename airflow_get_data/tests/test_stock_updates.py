@@ -0,0 +1,82 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dags')))
+
+from stock_updates import (
+    MAX_GAP_DAYS,
+    clean_data,
+    get_rollup_start,
+    group_by_gap_start,
+    keep_last_trading_day,
+    split_batches,
+    to_rows,
+)
+
+
+def test_split_batches_keeps_last_dates_of_batch():
+    last_dates = {'MSFT': '2024-07-12', 'AAPL': None, 'GOOGL': '2024-07-19'}
+
+    batches = split_batches(last_dates, batch_size=2)
+
+    assert batches == [
+        {'tickers': ['AAPL', 'GOOGL'], 'last_dates': {'AAPL': None, 'GOOGL': '2024-07-19'}},
+        {'tickers': ['MSFT'], 'last_dates': {'MSFT': '2024-07-12'}},
+    ]
+    assert split_batches({}) == []
+
+
+def test_to_rows_keeps_every_row_and_stores_nan_as_null():
+    raw = pd.DataFrame(
+        {
+            'Open': [1.234, 2.0],
+            'High': [2.0, 3.0],
+            'Low': [1.0, 1.0],
+            'Close': [1.5, np.nan],
+            'Volume': [10, 20],
+            'Dividends': [0.0, 0.0],
+            'Stock Splits': [0.0, 0.0],
+        },
+        index=pd.to_datetime(['2024-07-19', '2024-07-26']),
+    )
+
+    rows = to_rows(clean_data(raw, 'AAA'))
+
+    assert rows == [
+        ('AAA', date(2024, 7, 19), 1.23, 2.0, 1.0, 1.5, 10),
+        ('AAA', date(2024, 7, 26), 2.0, 3.0, 1.0, None, 20),
+    ]
+
+
+def test_group_by_gap_start():
+    last_dates = {'A': '2024-07-12', 'B': '2024-07-19', 'C': None, 'D': '2024-07-12', 'E': '2020-01-03'}
+
+    groups = group_by_gap_start(list(last_dates), last_dates, date(2024, 7, 19))
+
+    assert groups == {
+        date(2024, 7, 13): ['A', 'D'],
+        date(2024, 7, 19): ['C'],
+        date(2024, 7, 19) - timedelta(days=MAX_GAP_DAYS): ['E'],
+    }
+
+
+def test_rollup_start_is_earliest_gap():
+    batches = split_batches({'A': '2024-07-12', 'B': '2024-06-28', 'C': '2024-07-19'}, batch_size=1)
+
+    assert get_rollup_start(batches, date(2024, 7, 19)) == date(2024, 6, 29)
+    assert get_rollup_start(batches[2:], date(2024, 7, 19)) == date(2024, 7, 19)
+
+
+def test_keep_last_trading_day_of_every_week():
+    # Friday 2024-07-05 follows the Independence Day holiday, 2024-03-29 is Good Friday.
+    dates = pd.bdate_range('2024-03-25', '2024-03-28').append(pd.bdate_range('2024-07-01', '2024-07-12'))
+    data = pd.DataFrame({'Close': range(len(dates))}, index=dates.tz_localize('America/New_York'))
+    data = data.drop(pd.Timestamp('2024-07-04', tz='America/New_York'))
+
+    kept = keep_last_trading_day(data)
+
+    assert [str(day.date()) for day in kept.index] == ['2024-03-28', '2024-07-05', '2024-07-12']
@@ -0,0 +1,234 @@
+"""
+Benchmarks of the web app and ingestion hot paths on synthetic data.
+
+Runs offline: the database is replaced by synthetic frames, so no Postgres is needed.
+
+Usage:
+    python benchmarks/run_benchmarks.py                    # compare with baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline  # store new baselines
+    python benchmarks/run_benchmarks.py --resolution daily --threshold 1.3
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+from unittest import mock
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+sys.path.insert(0, os.path.join(ROOT, "webpage"))
+sys.path.insert(0, os.path.dirname(__file__))
+os.environ.setdefault("DBPORT", "5432")
+os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+os.environ.setdefault("WARM_UP_ON_START", "false")
+os.environ.setdefault("PRICE_MATRIX_DIR", "")
+
+import synthetic_data
+
+
+def measure(function, repeat=5, number=1):
+    """
+    Returns the median duration of one call of function in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        durations.append((time.perf_counter() - start) / number)
+    return statistics.median(durations)
+
+
+def bench_utils(history, results):
+    from utils import (
+        calculate_last_change,
+        calculate_pct_change_for_range,
+        filter_by_range,
+        get_value,
+    )
+
+    values = history[["ticker", "date", "close"]]
+    ticker = values["ticker"].iloc[0]
+
+    for range_option in ("3months", "5year"):
+        results[f"filter_by_range[{range_option}]"] = measure(
+            lambda: filter_by_range(values.copy(), range_option)
+        )
+
+    data = filter_by_range(values[values["ticker"] == ticker].copy(), "all")
+    results["utils.metrics[one ticker]"] = measure(
+        lambda: (
+            calculate_pct_change_for_range(data, ticker),
+            calculate_last_change(data, ticker),
+            get_value(data, ticker),
+        ),
+        number=20,
+    )
+
+
+def bench_store(history, results):
+    from store import SeriesStore
+
+    values = history[["ticker", "date", "close"]]
+    ticker = values["ticker"].iloc[0]
+
+    results["SeriesStore.build"] = measure(lambda: SeriesStore(values), repeat=3)
+    store = SeriesStore(values)
+    results["SeriesStore.get_frame[1year]"] = measure(
+        lambda: store.get_frame(ticker, "1year"), number=50
+    )
+    results["SummaryTable.build"] = measure(
+        lambda: (setattr(store, "_summary", None), store.get_summary()), repeat=3
+    )
+
+
+def bench_routes(history, results):
+    import models
+    from app import app
+    from extensions import cache
+
+    values = history[["ticker", "date", "close"]].copy()
+    tickers = list(values["ticker"].unique())
+    companies = synthetic_data.make_companies(tickers)
+    first, second = companies["name"].iloc[0], companies["name"].iloc[1]
+
+    client = app.test_client()
+    with mock.patch("routes.get_stock_values_from_db", return_value=values), \
+            mock.patch("routes.get_stock_companies_from_db", return_value=companies), \
+            mock.patch.object(models, "_series_store", None):
+
+        def clear_cache():
+            with app.app_context():
+                cache.clear()
+
+        def post(url, data):
+            response = client.post(url, data=data)
+            assert response.status_code == 200, response.data
+            return response
+
+        def cold_stock():
+            clear_cache()
+            post("/get_stock_data", {"ticker": first, "range": "all"})
+
+        results["route./get_stock_data[first request]"] = measure(
+            lambda: (setattr(models, "_series_store", None), cold_stock()), repeat=3
+        )
+        results["route./get_stock_data[uncached chart]"] = measure(cold_stock)
+        results["route./get_stock_data[cached chart]"] = measure(
+            lambda: post("/get_stock_data", {"ticker": first, "range": "all"}), number=20
+        )
+        results["route./compare_stocks[uncached chart]"] = measure(
+            lambda: (
+                clear_cache(),
+                post(
+                    "/compare_stocks",
+                    {"first_ticker": first, "second_ticker": second, "range": "5year"},
+                ),
+            )
+        )
+        results["route./api/stocks[50 tickers]"] = measure(
+            lambda: client.get(f"/api/stocks?tickers={','.join(tickers[:50])}&range=1year"),
+        )
+        results["route./api/stock[columns]"] = measure(
+            lambda: client.get(f"/api/stock{tickers[0]}?format=columns"), number=20
+        )
+
+
+def bench_ingestion(history, results, skipped):
+    raw = synthetic_data.make_yfinance_history()
+
+    # The DAG steps live in a module without Airflow imports.
+    sys.path.insert(0, os.path.join(ROOT, "airflow_get_data", "dags"))
+    import stock_updates
+
+    results["dag.clean_data"] = measure(lambda: stock_updates.clean_data(raw.copy(), "AAA"), number=10)
+    cleaned = stock_updates.clean_data(raw.copy(), "AAA")
+    results["dag.to_rows"] = measure(lambda: stock_updates.to_rows(cleaned), number=10)
+
+    sys.path.insert(0, os.path.join(ROOT, "get_historical_data"))
+    import copy_loader
+    import raw_store
+
+    # Cleaning of the COPY loader, the same rules as the Spark importer.
+    results["raw_store.clean_raw_frame"] = measure(lambda: raw_store.clean_raw_frame(history))
+    results["copy_loader.iter_chunks"] = measure(
+        lambda: sum(len(chunk) for chunk in copy_loader.iter_chunks([history])), repeat=3
+    )
+
+    try:
+        import_hist_data = importlib.import_module("import_hist_data")
+    except ImportError as e:
+        skipped["import_hist_data.clean_data"] = str(e)
+    else:
+        spark = import_hist_data.initialize_spark()
+        frame = spark.createDataFrame(raw.reset_index().astype({"Date": str}))
+        results["import_hist_data.clean_data"] = measure(
+            lambda: import_hist_data.clean_data(frame, "AAA").count(), repeat=3
+        )
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, duration in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference:
+            ratio = duration / reference
+            status = "REGRESSION" if ratio > threshold else "ok"
+            if ratio > threshold:
+                regressions.append(name)
+            print(f"{name:45s} {duration * 1000:10.3f} ms  baseline {reference * 1000:10.3f} ms  x{ratio:5.2f}  {status}")
+        else:
+            print(f"{name:45s} {duration * 1000:10.3f} ms  (no baseline)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=15)
+    parser.add_argument("--resolution", choices=sorted(synthetic_data.FREQUENCIES), default="weekly")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="fail when a benchmark is slower than baseline times threshold")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    history = synthetic_data.make_price_history(args.tickers, args.years, args.resolution)
+    print(f"Synthetic data: {args.tickers} tickers x {args.years} years of {args.resolution} bars "
+          f"= {len(history)} rows")
+
+    results, skipped = {}, {}
+    bench_utils(history, results)
+    bench_store(history, results)
+    bench_routes(history, results)
+    bench_ingestion(history, results, skipped)
+
+    for name, reason in skipped.items():
+        print(f"{name:45s} skipped: {reason}")
+
+    key = f"{args.resolution}:{args.tickers}x{args.years}"
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        # Benchmarks skipped on this machine keep the baseline recorded elsewhere.
+        baselines[key] = {**baselines.get(key, {}), **results}
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline {key} written to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baselines.get(key, {}), args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed more than x{args.threshold}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
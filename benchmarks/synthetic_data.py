@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = {"weekly": "W-FRI", "daily": "B"}
+
+
+def make_tickers(count):
+    """
+    Returns count unique synthetic ticker symbols such as 'AAA', 'AAB', ...
+    """
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    index = np.arange(count)
+    return ["".join(letters[[i // 676 % 26, i // 26 % 26, i % 26]]) for i in index]
+
+
+def make_companies(tickers):
+    """
+    Returns a companies DataFrame with columns 'ticker', 'name'.
+    """
+    return pd.DataFrame({"ticker": tickers, "name": [f"{ticker} Holdings Inc." for ticker in tickers]})
+
+
+def make_price_history(tickers=500, years=15, resolution="weekly", seed=0):
+    """
+    Generates OHLCV bars for every ticker as geometric Brownian motion paths.
+
+    :parameter:
+        - tickers (int or list of str): The number of tickers or their symbols.
+        - years (int): The length of the history ending today.
+        - resolution (str): 'weekly' or 'daily' bars.
+        - seed (int): The random seed.
+    :return:
+        - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'open',
+        'high', 'low', 'close', 'volume' sorted by date, as stored in stock_prize.
+    """
+    if isinstance(tickers, int):
+        tickers = make_tickers(tickers)
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.today().normalize()
+    dates = pd.date_range(end - pd.DateOffset(years=years), end, freq=FREQUENCIES[resolution])
+
+    periods, count = len(dates), len(tickers)
+    scale = np.sqrt(5 if resolution == "weekly" else 1) * 0.015
+    returns = rng.normal(0.0004, scale, size=(periods, count))
+    close = rng.uniform(10, 500, size=count) * np.exp(np.cumsum(returns, axis=0))
+    open_ = close * np.exp(rng.normal(0, scale / 2, size=close.shape))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, scale, size=close.shape))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, scale, size=close.shape))
+    volume = rng.integers(100_000, 50_000_000, size=close.shape)
+
+    return pd.DataFrame(
+        {
+            "ticker": np.tile(np.array(tickers, dtype=object), periods),
+            "date": np.repeat(dates.to_numpy(), count),
+            "open": open_.ravel().round(2),
+            "high": high.ravel().round(2),
+            "low": low.ravel().round(2),
+            "close": close.ravel().round(2),
+            "volume": volume.ravel(),
+        }
+    )
+
+
+def make_yfinance_history(periods=760, resolution="weekly", seed=0):
+    """
+    Generates one ticker's history in the shape returned by yfinance's Ticker.history:
+    indexed by a timezone-aware 'Date' with 'Open', 'High', 'Low', 'Close', 'Volume',
+    'Dividends' and 'Stock Splits' columns at full float precision.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.today(tz="America/New_York").normalize()
+    index = pd.date_range(end=end, periods=periods, freq=FREQUENCIES[resolution], name="Date")
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0, 0.03, periods)))
+    return pd.DataFrame(
+        {
+            "Open": close * (1 + rng.normal(0, 0.01, periods)),
+            "High": close * 1.02,
+            "Low": close * 0.98,
+            "Close": close,
+            "Volume": rng.integers(100_000, 50_000_000, periods),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=index,
+    )
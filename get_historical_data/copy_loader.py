@@ -0,0 +1,190 @@
+"""
+Spark-free bulk loader of historical stock data.
+
+Rows are cleaned with the same rules as the Spark importer, streamed in chunks through
+'COPY ... FROM STDIN' into a temporary staging table and merged into stock_prize with
+'INSERT ... ON CONFLICT (ticker, date)', so reloading the same data updates rows in place.
+"""
+import argparse
+import io
+import os
+import time
+
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+from raw_store import (
+    CSV_DIRECTORY,
+    PRICE_COLUMNS,
+    RAW_DIRECTORY,
+    clean_raw_frame,
+    to_raw_frame,
+)
+
+CHUNK_SIZE = 50000
+STAGING_TABLE = "stock_prize_staging"
+
+CREATE_STAGING = f"""
+    CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+        ticker VARCHAR(20),
+        date DATE,
+        open DECIMAL(10, 2),
+        high DECIMAL(10, 2),
+        low DECIMAL(10, 2),
+        close DECIMAL(10, 2),
+        volume BIGINT
+    ) ON COMMIT DELETE ROWS
+"""
+COPY_STAGING = f"COPY {STAGING_TABLE} ({', '.join(PRICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+MERGE_STAGING = f"""
+    INSERT INTO stock_prize ({', '.join(PRICE_COLUMNS)})
+    SELECT DISTINCT ON (ticker, date) {', '.join(PRICE_COLUMNS)} FROM {STAGING_TABLE}
+    ORDER BY ticker, date
+    ON CONFLICT (ticker, date) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume
+"""
+
+
+def iter_csv_frames(directory=CSV_DIRECTORY):
+    """
+    Yields the rows of every per-ticker CSV file of a directory, one DataFrame per file.
+    """
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".csv"):
+            hist = pd.read_csv(os.path.join(directory, filename))
+            yield to_raw_frame(hist, filename[:-4])
+
+
+def iter_raw_frames(directory=RAW_DIRECTORY, batch_size=CHUNK_SIZE):
+    """
+    Yields the rows of the Parquet raw layer in record batches of at most batch_size rows.
+    """
+    from raw_store import PARTITIONING, RAW_SCHEMA, ds
+
+    dataset = ds.dataset(directory, schema=RAW_SCHEMA, format="parquet", partitioning=PARTITIONING)
+    for batch in dataset.to_batches(columns=PRICE_COLUMNS, batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def iter_chunks(frames, chunk_size=CHUNK_SIZE):
+    """
+    Regroups DataFrames of any size into cleaned chunks of at most chunk_size rows.
+    """
+    pending = []
+    pending_rows = 0
+    for df in frames:
+        df = clean_raw_frame(df)
+        for start in range(0, len(df), chunk_size):
+            part = df.iloc[start:start + chunk_size]
+            pending.append(part)
+            pending_rows += len(part)
+            if pending_rows >= chunk_size:
+                chunk = pd.concat(pending, ignore_index=True)
+                yield chunk.iloc[:chunk_size]
+                rest = chunk.iloc[chunk_size:]
+                pending, pending_rows = ([rest], len(rest)) if len(rest) else ([], 0)
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def copy_chunk(cur, chunk):
+    """
+    Streams a chunk through COPY into the staging table and merges it into stock_prize.
+
+    :parameter:
+        - cur (psycopg2.extensions.cursor): A cursor of the loading transaction.
+        - chunk (pandas.DataFrame): Cleaned rows with the PRICE_COLUMNS.
+    :return:
+        - count (int): The number of inserted or updated rows.
+    """
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, header=False, index=False, columns=PRICE_COLUMNS)
+    buffer.seek(0)
+    cur.copy_expert(COPY_STAGING, buffer)
+    cur.execute(MERGE_STAGING)
+    return cur.rowcount
+
+
+def load(conn, frames, chunk_size=CHUNK_SIZE):
+    """
+    Loads stock rows into stock_prize, committing after every chunk.
+
+    :parameter:
+        - conn (psycopg2.extensions.connection): The database connection.
+        - frames (iterable of pandas.DataFrame): Rows with the raw layer columns.
+        - chunk_size (int): The number of rows copied and merged per transaction.
+    :return:
+        - report (dict): The number of 'rows' read, the number of 'merged' rows, the
+        'min_date' of the loaded rows (None when no rows were loaded), the elapsed
+        'seconds' and 'rows_per_second'.
+    """
+    started = time.perf_counter()
+    rows = merged = 0
+    min_date = None
+    with conn.cursor() as cur:
+        cur.execute(CREATE_STAGING)
+        for chunk in iter_chunks(frames, chunk_size):
+            merged += copy_chunk(cur, chunk)
+            conn.commit()
+            rows += len(chunk)
+            chunk_min_date = chunk["date"].min()
+            min_date = chunk_min_date if min_date is None else min(min_date, chunk_min_date)
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "merged": merged,
+        "min_date": min_date,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+    }
+
+
+def get_connection():
+    load_dotenv()
+
+    db_name = os.getenv("DBNAME")
+    db_user = os.getenv("DBUSER")
+    db_password = os.getenv("DBPASSWORD")
+    db_server = os.getenv("DBHOST")
+    db_port = os.getenv("DBPORT")
+
+    if not all([db_name, db_user, db_password, db_server, db_port]):
+        raise ValueError("Database configuration environment variables are missing!")
+
+    return psycopg2.connect(database=db_name, user=db_user, password=db_password,
+                            host=db_server, port=db_port)
+
+
+def main(source=None, chunk_size=CHUNK_SIZE):
+    source = source or ("raw" if os.path.isdir(RAW_DIRECTORY) else "csv")
+    frames = iter_raw_frames(RAW_DIRECTORY, chunk_size) if source == "raw" else iter_csv_frames(CSV_DIRECTORY)
+
+    conn = get_connection()
+    try:
+        report = load(conn, frames, chunk_size)
+        if report["min_date"] is not None:
+            with conn.cursor() as cur:
+                cur.execute("SELECT refresh_stock_rollups(%s)", (report["min_date"],))
+            conn.commit()
+    finally:
+        conn.close()
+
+    print(
+        f"Loaded {report['rows']} rows ({report['merged']} merged) in {report['seconds']:.1f} s, "
+        f"{report['rows_per_second']:.0f} rows/s"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loads historical stock data with COPY")
+    parser.add_argument("--source", choices=["raw", "csv"],
+                        help="the Parquet raw layer or the CSV files, defaults to the raw layer if it exists")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    main(args.source, args.chunk_size)
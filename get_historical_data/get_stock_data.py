@@ -1,12 +1,34 @@
+import argparse
 import psycopg2
 from dotenv import load_dotenv
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 import yfinance as yf
 import pandas as pd
 
+from raw_store import (
+    MANIFEST_FILE,
+    RAW_DIRECTORY,
+    Manifest,
+    append_raw,
+    get_last_dates,
+    write_raw,
+)
 
-def main():
+START_DATE = "2010-01-01"
+INTERVAL = "1wk"
+WORKERS = 8
+REQUESTS_PER_SECOND = 2.0
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
+BAR_DAYS = {"1d": 1, "1wk": 7, "1mo": 31}
+
+
+def main(end=None, workers=WORKERS, rate=REQUESTS_PER_SECOND, incremental=False):
     load_dotenv()
 
     db_name = os.getenv("DBNAME")
@@ -25,8 +47,12 @@ def main():
                 conn.commit()
             company_tickers_list = [str(row[0]) for row in company_tickers]
 
-            for ticker in company_tickers_list:
-                get_stock_data(ticker)
+            if incremental:
+                report = update_history(company_tickers_list, end=end, workers=workers, rate=rate)
+            else:
+                report = download_history(company_tickers_list, end=end, workers=workers, rate=rate)
+            print_report(report)
+            return report
 
     except psycopg2.Error as e:
         print(f"Database error: {e}")
@@ -34,14 +60,242 @@ def main():
         print(f"Unexpected error: {e}")
 
 
-def get_stock_data(ticker):
+def get_stock_data(ticker, start=START_DATE, end=None):
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(start='2010-01-01', end='2024-07-16', interval='1wk')
-        hist.to_csv(f"data/{ticker}.csv")
+        hist = yfinance_fetcher(ticker, start, end or date.today().isoformat())
+        write_raw(hist, ticker)
     except Exception as e:
         print(f"Failed to save stock data for {ticker}: {e}")
 
 
+def yfinance_fetcher(ticker, start, end, interval=INTERVAL):
+    """
+    Downloads the price history of a ticker from Yahoo Finance.
+
+    :parameter:
+        - ticker (str): The company symbol.
+        - start (str): The first date in 'YYYY-MM-DD' format.
+        - end (str): The date after the last downloaded bar in 'YYYY-MM-DD' format.
+        - interval (str): The bar interval, such as '1wk' or '1d'.
+    :return:
+        - hist (pandas.DataFrame): The history indexed by 'Date'.
+    """
+    return yf.Ticker(ticker).history(start=start, end=end, interval=interval)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how many requests start per second.
+
+    The bucket holds up to 'capacity' tokens and is refilled with 'rate' tokens per
+    second. Every request takes one token and waits until one is available.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        :parameter:
+            - rate (float): Tokens added per second.
+            - capacity (int, optional): The maximum burst size. Defaults to one second of tokens.
+            - clock, sleep (callable, optional): Time functions, replaceable in tests.
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def fetch_ticker(ticker, fetcher, limiter, start, end, writer, retries=RETRIES,
+                 backoff=BACKOFF_SECONDS, sleep=time.sleep):
+    """
+    Downloads and stores the history of one ticker, retrying failed downloads.
+
+    :parameter:
+        - ticker (str): The company symbol.
+        - fetcher (callable): A function (ticker, start, end) returning a DataFrame.
+        - limiter (TokenBucket): The rate limiter shared by all downloads.
+        - start, end (str): The downloaded date range.
+        - writer (callable): A function (hist, ticker) storing the history and returning
+        the number of stored rows.
+        - retries (int): The number of retries after a failed attempt.
+        - backoff (float): The delay before the first retry in seconds, doubled for
+        every following retry.
+    :return:
+        - result (dict): The 'status' ('ok', 'empty' or 'failed'), the number of 'rows',
+        the number of 'attempts' and the last 'error' message.
+    """
+    error = None
+    for attempt in range(1, retries + 2):
+        limiter.acquire()
+        try:
+            hist = fetcher(ticker, start, end)
+        except Exception as e:
+            error = str(e)
+            if attempt <= retries:
+                sleep(backoff * 2 ** (attempt - 1))
+            continue
+
+        if hist is None or hist.empty:
+            return {"status": "empty", "rows": 0, "attempts": attempt, "error": None}
+        try:
+            rows = writer(hist, ticker)
+        except Exception as e:
+            return {"status": "failed", "rows": 0, "attempts": attempt, "error": str(e)}
+        return {"status": "ok", "rows": rows, "attempts": attempt, "error": None}
+
+    return {"status": "failed", "rows": 0, "attempts": retries + 1, "error": error}
+
+
+def download_history(tickers, fetcher=yfinance_fetcher, start=START_DATE, end=None,
+                     workers=WORKERS, rate=REQUESTS_PER_SECOND, retries=RETRIES,
+                     backoff=BACKOFF_SECONDS, writer=None):
+    """
+    Downloads the history of many tickers concurrently.
+
+    At most 'workers' downloads run at the same time and no more than 'rate' downloads
+    start per second, retries included.
+
+    :parameter:
+        - tickers (list of str): Company symbols to download.
+        - fetcher (callable): A function (ticker, start, end) returning a DataFrame.
+        Defaults to yfinance_fetcher.
+        - start (str): The first date in 'YYYY-MM-DD' format.
+        - end (str, optional): The date after the last downloaded bar. Defaults to today.
+        - workers (int): The number of concurrent downloads.
+        - rate (float): The number of downloads started per second.
+        - retries (int): The number of retries of a failed download.
+        - backoff (float): The delay before the first retry in seconds.
+        - writer (callable, optional): A function (hist, ticker) storing the history.
+        Defaults to write_raw, recording the last dates in the raw layer manifest.
+    :return:
+        - report (pandas.DataFrame): One row per ticker with columns 'ticker', 'status',
+        'rows', 'attempts', 'error' and 'seconds'.
+    """
+    end = end or date.today().isoformat()
+    if writer is None:
+        manifest = Manifest(os.path.join(RAW_DIRECTORY, MANIFEST_FILE))
+
+        def writer(hist, ticker):
+            return write_raw(hist, ticker, manifest=manifest)
+
+    limiter = TokenBucket(rate)
+
+    def run(ticker):
+        started = time.perf_counter()
+        result = fetch_ticker(ticker, fetcher, limiter, start, end, writer, retries, backoff)
+        return {"ticker": ticker, **result, "seconds": time.perf_counter() - started}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, tickers))
+
+    return pd.DataFrame(results, columns=["ticker", "status", "rows", "attempts", "error", "seconds"])
+
+
+def update_history(tickers, fetcher=yfinance_fetcher, end=None, workers=WORKERS,
+                   rate=REQUESTS_PER_SECOND, retries=RETRIES, backoff=BACKOFF_SECONDS,
+                   manifest=None, interval=INTERVAL, directory=RAW_DIRECTORY):
+    """
+    Downloads only the bars missing from the raw layer.
+
+    The last stored date of a ticker is read from the manifest, or from the raw layer
+    for tickers the manifest does not know. Only complete bars are stored, the bar of
+    the running week is downloaded again by the next update. The manifest is saved
+    after every ticker, so an interrupted update resumes with the tickers it did not
+    reach. Bars already stored in the partition are skipped even when the manifest lags
+    behind it.
+
+    :parameter:
+        - tickers (list of str): Company symbols to update.
+        - fetcher, end, workers, rate, retries, backoff: See download_history.
+        - manifest (Manifest, optional): The checkpoint manifest. Defaults to the manifest
+        of the raw layer.
+        - interval (str): The bar interval of the stored history.
+        - directory (str): The root directory of the raw layer.
+    :return:
+        - report (pandas.DataFrame): One row per ticker, see download_history. Tickers
+        without new complete bars have the status 'up_to_date'.
+    """
+    end = end or date.today().isoformat()
+    until_date = date.fromisoformat(end) - timedelta(days=BAR_DAYS[interval])
+    manifest = manifest or Manifest(os.path.join(directory, MANIFEST_FILE))
+    stored_last_dates = get_last_dates(directory) if any(
+        manifest.get_last_date(ticker) is None for ticker in tickers
+    ) else {}
+
+    last_dates = {}
+    pending = []
+    up_to_date = []
+    for ticker in tickers:
+        last_date = manifest.get_last_date(ticker) or stored_last_dates.get(ticker)
+        last_dates[ticker] = last_date
+        if last_date is not None and last_date + timedelta(days=BAR_DAYS[interval]) > until_date:
+            up_to_date.append(ticker)
+        else:
+            pending.append(ticker)
+
+    def fetch_missing(ticker, start, end):
+        last_date = last_dates[ticker]
+        start = (last_date + timedelta(days=1)).isoformat() if last_date else start
+        return fetcher(ticker, start, end)
+
+    def append(hist, ticker):
+        df = append_raw(hist, ticker, until_date, directory)
+        if not df.empty:
+            manifest.record(ticker, df["date"].max())
+        return len(df)
+
+    report = download_history(
+        pending,
+        fetcher=fetch_missing,
+        end=end,
+        workers=workers,
+        rate=rate,
+        retries=retries,
+        backoff=backoff,
+        writer=append,
+    )
+    skipped = pd.DataFrame(
+        {"ticker": up_to_date, "status": "up_to_date", "rows": 0, "attempts": 0, "error": None, "seconds": 0.0}
+    )
+    return pd.concat([report, skipped], ignore_index=True) if up_to_date else report
+
+
+def print_report(report):
+    counts = report["status"].value_counts()
+    print(
+        f"Downloaded {counts.get('ok', 0)} tickers ({report['rows'].sum()} rows), "
+        f"{counts.get('up_to_date', 0)} up to date, {counts.get('empty', 0)} empty, "
+        f"{counts.get('failed', 0)} failed"
+    )
+    for row in report[report["status"] == "failed"].itertuples():
+        print(f"Failed to save stock data for {row.ticker} after {row.attempts} attempts: {row.error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Downloads historical stock data of all companies")
+    parser.add_argument("--end", help="the date after the last bar in YYYY-MM-DD format, defaults to today")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="downloads started per second")
+    parser.add_argument("--incremental", action="store_true",
+                        help="download only bars newer than the stored history")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(end=args.end, workers=args.workers, rate=args.rate, incremental=args.incremental)
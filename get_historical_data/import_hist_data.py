@@ -1,15 +1,47 @@
+import argparse
 import os
+import psycopg2
 from dotenv import load_dotenv
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import to_date, round, lit
+from pyspark.sql.functions import to_date, round, lit, input_file_name, regexp_extract, substring
+from pyspark.sql.types import StructType, StructField, StringType, DoubleType, LongType
 
+from raw_store import (
+    CSV_DIRECTORY,
+    PRICE_COLUMNS,
+    PRICE_DECIMALS,
+    RAW_DIRECTORY,
+    ROUNDED_COLUMNS,
+    read_raw_spark,
+)
 
-def main():
+JDBC_BATCH_SIZE = int(os.getenv("JDBC_BATCH_SIZE", "10000"))
+JDBC_NUM_PARTITIONS = int(os.getenv("JDBC_NUM_PARTITIONS", "8"))
+
+CSV_SCHEMA = StructType([
+    StructField("Date", StringType()),
+    StructField("Open", DoubleType()),
+    StructField("High", DoubleType()),
+    StructField("Low", DoubleType()),
+    StructField("Close", DoubleType()),
+    StructField("Volume", LongType()),
+    StructField("Dividends", DoubleType()),
+    StructField("Stock Splits", DoubleType()),
+])
+
+
+def main(mode=None, batch_size=JDBC_BATCH_SIZE, num_partitions=JDBC_NUM_PARTITIONS):
     spark = initialize_spark()
-    DATA_DIRECTORY = "data"
-    for filename in os.listdir(DATA_DIRECTORY):
-        if filename.endswith(".csv"):
-            process_file(filename, spark)
+    mode = mode or ("raw" if os.path.isdir(RAW_DIRECTORY) else "csv")
+    if mode == "raw":
+        process_raw(spark, batch_size, num_partitions)
+    elif mode == "csv":
+        process_csv_directory(spark, CSV_DIRECTORY, batch_size, num_partitions)
+    else:
+        for filename in os.listdir(CSV_DIRECTORY):
+            if filename.endswith(".csv"):
+                process_file(filename, spark)
+    refresh_rollups()
 
 
 def initialize_spark():
@@ -24,6 +56,47 @@ def process_file(filename, spark):
     return
 
 
+def process_raw(spark, batch_size=JDBC_BATCH_SIZE, num_partitions=JDBC_NUM_PARTITIONS):
+    df = read_raw_spark(spark, RAW_DIRECTORY, columns=PRICE_COLUMNS)
+    save_to_db(clean_raw_data(df), batch_size, num_partitions)
+
+
+def process_csv_directory(spark, directory=CSV_DIRECTORY, batch_size=JDBC_BATCH_SIZE,
+                          num_partitions=JDBC_NUM_PARTITIONS):
+    """
+    Imports every per-ticker CSV file of a directory with one Spark read and one write.
+
+    The files are read with a declared schema instead of inferring it per file, and the
+    ticker is taken from the name of the file each row was read from.
+    """
+    df = spark.read.option("header", "true").schema(CSV_SCHEMA).csv(f"{directory}/*.csv")
+    df = df.withColumn("ticker", regexp_extract(input_file_name(), r"([^/]+)\.csv$", 1))
+    save_to_db(clean_csv_data(df), batch_size, num_partitions)
+
+
+def clean_csv_data(df):
+    # Dates are written as '2010-01-01 00:00:00-05:00', the first ten characters are the
+    # trading day whatever the offset is.
+    return clean_raw_data(
+        df.select(
+            "ticker",
+            to_date(substring(df["Date"], 1, 10)).alias("date"),
+            df["Open"].alias("open"),
+            df["High"].alias("high"),
+            df["Low"].alias("low"),
+            df["Close"].alias("close"),
+            df["Volume"].alias("volume"),
+        )
+    )
+
+
+def clean_raw_data(df):
+    # Same rules as raw_store.clean_raw_frame, used by the COPY loader.
+    return df.select(*PRICE_COLUMNS).withColumns(
+        {column: round(df[column], PRICE_DECIMALS) for column in ROUNDED_COLUMNS}
+    )
+
+
 def clean_data(df, ticker):
     df1 = df.drop("Dividends", "Stock Splits").withColumns(
         {
@@ -38,7 +111,16 @@ def clean_data(df, ticker):
     return df2
 
 
-def save_to_db(df):
+def save_to_db(df, batch_size=None, num_partitions=None):
+    """
+    Appends a DataFrame to the stock_prize table over JDBC.
+
+    :parameter:
+        - df (pyspark.sql.DataFrame): The rows to write.
+        - batch_size (int, optional): The number of rows sent per JDBC batch.
+        - num_partitions (int, optional): The number of parallel JDBC connections, the
+        DataFrame is repartitioned to it.
+    """
     load_dotenv()
 
     db_name = os.getenv("DBNAME")
@@ -52,12 +134,50 @@ def save_to_db(df):
         raise ValueError("Database configuration environment variables are missing!")
 
     JDBC_URL = f"jdbc:postgresql://{db_server}:{db_port}/{db_name}"
-    df.write.format("jdbc").option("url", JDBC_URL)\
+    writer = df.repartition(num_partitions) if num_partitions else df
+    writer = writer.write.format("jdbc").option("url", JDBC_URL)\
         .option("dbtable", db_table)\
         .option("user", db_user)\
-        .option("password", db_password)\
-        .mode("append").save()
+        .option("password", db_password)
+    if batch_size:
+        writer = writer.option("batchsize", batch_size)
+    if num_partitions:
+        writer = writer.option("numPartitions", num_partitions)
+    writer.mode("append").save()
+
+
+def refresh_rollups(since_date="1900-01-01"):
+    load_dotenv()
+
+    db_name = os.getenv("DBNAME")
+    db_user = os.getenv("DBUSER")
+    db_password = os.getenv("DBPASSWORD")
+    db_server = os.getenv("DBHOST")
+    db_port = os.getenv("DBPORT")
+
+    if not all([db_name, db_user, db_password, db_server, db_port]):
+        raise ValueError("Database configuration environment variables are missing!")
+
+    conn = psycopg2.connect(database=db_name, user=db_user, password=db_password,
+                            host=db_server, port=db_port)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT refresh_stock_rollups(%s)", (since_date,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Imports historical stock data into the database")
+    parser.add_argument("--mode", choices=["raw", "csv", "per-file"],
+                        help="read the Parquet raw layer, all CSV files in one job, or one job per "
+                             "CSV file. Defaults to 'raw' when the raw layer exists, else 'csv'")
+    parser.add_argument("--batch-size", type=int, default=JDBC_BATCH_SIZE)
+    parser.add_argument("--num-partitions", type=int, default=JDBC_NUM_PARTITIONS)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.mode, args.batch_size, args.num_partitions)
@@ -37,12 +37,13 @@ def insert_companies(company_list):
                 cur.execute("""
                     INSERT INTO companies (ticker, name, sector, industry)
                     VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (ticker) DO NOTHING;
+                    ON CONFLICT (ticker) DO UPDATE
+                    SET sector = EXCLUDED.sector, industry = EXCLUDED.industry;
                 """, (
                     company['Symbol'],
                     company['Security'],
-                    company['GICS Sub-Industry'],
-                    company['GICS Sector']
+                    company['GICS Sector'],
+                    company['GICS Sub-Industry']
                 ))
             conn.commit()
 
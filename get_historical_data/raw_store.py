@@ -0,0 +1,373 @@
+"""
+Raw layer of downloaded stock history stored as Parquet, partitioned by ticker.
+
+Layout: data/raw/ticker=AAPL/<file>.parquet. Values keep their downloaded precision in
+typed columns, dates are the exchange's local trading dates. Weekly bars give about 50 rows
+per ticker and year, so years are not partitioned but skipped with row group statistics.
+Run 'python raw_store.py' to convert the per-ticker CSV files of data/ into the raw layer.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+RAW_DIRECTORY = "data/raw"
+CSV_DIRECTORY = "data"
+COMPRESSION = "zstd"
+MANIFEST_FILE = "_manifest.json"
+MAX_FILES_PER_TICKER = 16
+
+RAW_COLUMNS = {
+    "Date": "date",
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Volume": "volume",
+    "Dividends": "dividends",
+    "Stock Splits": "stock_splits",
+}
+PRICE_COLUMNS = ["ticker", "date", "open", "high", "low", "close", "volume"]
+ROUNDED_COLUMNS = ["open", "high", "low", "close"]
+PRICE_DECIMALS = 2
+PARTITION_COLUMNS = ["ticker"]
+KEY_COLUMNS = ["ticker", "date"]
+
+if pa is not None:
+    RAW_SCHEMA = pa.schema(
+        [
+            ("date", pa.date32()),
+            ("open", pa.float64()),
+            ("high", pa.float64()),
+            ("low", pa.float64()),
+            ("close", pa.float64()),
+            ("volume", pa.int64()),
+            ("dividends", pa.float64()),
+            ("stock_splits", pa.float64()),
+            ("ticker", pa.string()),
+        ]
+    )
+    PARTITIONING = ds.partitioning(pa.schema([("ticker", pa.string())]), flavor="hive")
+
+
+def to_raw_frame(hist, ticker):
+    """
+    Converts a yfinance history or a downloaded CSV file to the raw layer columns.
+
+    :parameter:
+        - hist (pandas.DataFrame): Stock history with columns 'Open', 'High', 'Low', 'Close',
+        'Volume', 'Dividends', 'Stock Splits' and a 'Date' column or index.
+        - ticker (str): The company symbol of the history.
+    :return:
+        - df (pandas.DataFrame): A DataFrame with the RAW_SCHEMA columns.
+    """
+    df = hist.reset_index() if "Date" not in hist.columns else hist.copy()
+    df = df.rename(columns=RAW_COLUMNS)
+    for column in RAW_COLUMNS.values():
+        if column not in df.columns:
+            df[column] = 0.0
+
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        # '2010-01-01 00:00:00-05:00', offsets change with daylight saving time.
+        dates = pd.to_datetime(df["date"].astype(str).str[:10])
+    else:
+        dates = pd.to_datetime(df["date"])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+    df["date"] = dates.dt.normalize()
+    df["volume"] = df["volume"].fillna(0).astype("int64")
+    df["ticker"] = ticker
+    df["date"] = df["date"].dt.date
+    return df[[field.name for field in RAW_SCHEMA]]
+
+
+def clean_raw_frame(df):
+    """
+    Applies the stock_prize cleaning rules to raw layer rows: keeps the PRICE_COLUMNS,
+    dropping dividends and stock splits, and rounds prices to PRICE_DECIMALS.
+
+    :parameter:
+        - df (pandas.DataFrame): Rows with the raw layer columns.
+    :return:
+        - df (pandas.DataFrame): A DataFrame with the PRICE_COLUMNS.
+    """
+    df = df[PRICE_COLUMNS].copy()
+    df[ROUNDED_COLUMNS] = df[ROUNDED_COLUMNS].round(PRICE_DECIMALS)
+    return df
+
+
+def write_raw(hist, ticker, directory=RAW_DIRECTORY, manifest=None):
+    """
+    Writes the history of a ticker to the raw layer, replacing the stored history, and
+    records its last date in the manifest so incremental updates continue after it.
+
+    :parameter:
+        - hist (pandas.DataFrame): Stock history as returned by yfinance.
+        - ticker (str): The company symbol of the history.
+        - directory (str): The root directory of the raw layer.
+        - manifest (Manifest, optional): The manifest to update, shared by concurrent
+        writers. Defaults to the manifest of the raw layer.
+    :return:
+        - count (int): The number of written rows.
+    """
+    df = to_raw_frame(hist, ticker)
+    if df.empty:
+        return 0
+    _replace_partition(df, ticker, directory)
+    manifest = manifest or Manifest(os.path.join(directory, MANIFEST_FILE))
+    manifest.record(ticker, df["date"].max())
+    return len(df)
+
+
+def append_raw(hist, ticker, until_date=None, directory=RAW_DIRECTORY):
+    """
+    Appends new bars of a ticker to the raw layer as a new file of its partition.
+
+    Bars up to the last date stored in the partition are skipped. The cutoff is read from
+    the partition rather than the manifest, so bars appended by a run that stopped before
+    recording them in the manifest are not appended twice. A partition holding more than
+    MAX_FILES_PER_TICKER files is compacted into one file.
+
+    :parameter:
+        - hist (pandas.DataFrame): Stock history as returned by yfinance.
+        - ticker (str): The company symbol of the history.
+        - until_date (date, optional): Bars after this date are skipped.
+        - directory (str): The root directory of the raw layer.
+    :return:
+        - df (pandas.DataFrame): The appended rows with the RAW_SCHEMA columns.
+    """
+    df = to_raw_frame(hist, ticker).drop_duplicates(KEY_COLUMNS, keep="last")
+    stored_last_date = get_stored_last_date(ticker, directory)
+    if stored_last_date is not None:
+        df = df[df["date"] > stored_last_date]
+    if until_date is not None:
+        df = df[df["date"] <= until_date]
+    if df.empty:
+        return df
+
+    _write_frame(df, directory)
+    partition = os.path.join(directory, f"ticker={ticker}")
+    if len(os.listdir(partition)) > MAX_FILES_PER_TICKER:
+        compact_ticker(ticker, directory)
+    return df
+
+
+def compact_ticker(ticker, directory=RAW_DIRECTORY):
+    """
+    Rewrites the partition of a ticker as a single file sorted by date. Of rows sharing
+    a date, the one of the most recently written file is kept.
+    """
+    df = read_raw(directory, tickers=[ticker])
+    df = df.drop_duplicates(KEY_COLUMNS, keep="last").sort_values("date")
+    _replace_partition(df, ticker, directory)
+
+
+def _write_frame(df, directory):
+    # File names start with the write time, the dataset reads them in name order, so
+    # rows of later appends come last.
+    table = pa.Table.from_pandas(df, schema=RAW_SCHEMA, preserve_index=False)
+    pq.write_to_dataset(
+        table,
+        directory,
+        partitioning=PARTITIONING,
+        existing_data_behavior="overwrite_or_ignore",
+        basename_template=f"part-{time.time_ns():020d}-{uuid.uuid4().hex}-{{i}}.parquet",
+        compression=COMPRESSION,
+    )
+
+
+def _replace_partition(df, ticker, directory):
+    # The new partition is written next to the old one and swapped in with renames, a
+    # crash leaves either version on disk. Directories starting with '.' are not read.
+    partition = os.path.join(directory, f"ticker={ticker}")
+    temporary_path = os.path.join(directory, f".ticker={ticker}.{uuid.uuid4().hex}.tmp")
+    old_path = f"{temporary_path}.old"
+    os.makedirs(temporary_path)
+    table = pa.Table.from_pandas(df.drop(columns=PARTITION_COLUMNS), preserve_index=False)
+    pq.write_table(
+        table.cast(pa.schema([field for field in RAW_SCHEMA if field.name not in PARTITION_COLUMNS])),
+        os.path.join(temporary_path, "part-0.parquet"),
+        compression=COMPRESSION,
+    )
+    if os.path.isdir(partition):
+        os.rename(partition, old_path)
+    os.rename(temporary_path, partition)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def get_last_dates(directory=RAW_DIRECTORY):
+    """
+    Returns the last stored date of every ticker of the raw layer.
+
+    :return:
+        - last_dates (dict): Mapping of tickers to their last date, empty when the raw
+        layer does not exist.
+    """
+    if not os.path.isdir(directory):
+        return {}
+    df = read_raw(directory, columns=["ticker", "date"])
+    return {str(ticker): last_date for ticker, last_date in df.groupby("ticker")["date"].max().items()}
+
+
+def get_stored_last_date(ticker, directory=RAW_DIRECTORY):
+    """
+    Returns the last date stored in the partition of a ticker, None when it has no partition.
+    """
+    if not os.path.isdir(os.path.join(directory, f"ticker={ticker}")):
+        return None
+    dates = read_raw(directory, columns=["date"], tickers=[ticker])["date"]
+    return dates.max() if len(dates) else None
+
+
+class Manifest:
+    """
+    Checkpoint of the last stored date of every ticker, saved after each recorded ticker
+    so that an interrupted download resumes where it stopped.
+
+    The file is stored in the raw layer directory with a '_' prefix, which pyarrow and
+    Spark skip when reading the dataset.
+    """
+
+    def __init__(self, path=os.path.join(RAW_DIRECTORY, MANIFEST_FILE)):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get_last_date(self, ticker):
+        entry = self.entries.get(ticker)
+        return date.fromisoformat(entry["last_date"]) if entry else None
+
+    def record(self, ticker, last_date):
+        with self.lock:
+            self.entries[ticker] = {
+                "last_date": last_date.isoformat(),
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+
+def raw_predicates(tickers=None, start_date=None, end_date=None):
+    """
+    Builds the row filters of a raw layer read as (column, operator, value) triples.
+
+    The filter on the partition column 'ticker' skips whole directories, the filters on
+    'date' are checked against Parquet row group statistics.
+
+    :parameter:
+        - tickers (list of str, optional): Company symbols to read, all tickers when omitted.
+        - start_date (date, optional): The first date to read.
+        - end_date (date, optional): The last date to read.
+    :return:
+        - predicates (list of tuples): The filters, combined with AND.
+    """
+    predicates = []
+    if tickers:
+        predicates.append(("ticker", "in", list(tickers)))
+    if start_date is not None:
+        predicates.append(("date", ">=", start_date))
+    if end_date is not None:
+        predicates.append(("date", "<=", end_date))
+    return predicates
+
+
+def _arrow_expression(predicates):
+    expression = None
+    for column, operator, value in predicates:
+        field = ds.field(column)
+        if operator == "in":
+            condition = field.isin(value)
+        elif operator == ">=":
+            condition = field >= value
+        else:
+            condition = field <= value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_raw(directory=RAW_DIRECTORY, columns=None, tickers=None, start_date=None, end_date=None):
+    """
+    Reads the raw layer with pyarrow, reading only the requested columns and partitions.
+
+    :parameter:
+        - directory (str): The root directory of the raw layer.
+        - columns (list of str, optional): Columns to read, all columns when omitted.
+        - tickers, start_date, end_date: Row filters, see raw_predicates.
+    :return:
+        - df (pandas.DataFrame): The matching rows.
+    """
+    dataset = ds.dataset(directory, schema=RAW_SCHEMA, format="parquet", partitioning=PARTITIONING)
+    table = dataset.to_table(
+        columns=columns,
+        filter=_arrow_expression(raw_predicates(tickers, start_date, end_date)),
+    )
+    return table.to_pandas()
+
+
+def read_raw_spark(spark, directory=RAW_DIRECTORY, columns=None, tickers=None, start_date=None, end_date=None):
+    """
+    Reads the raw layer as a Spark DataFrame with the same column projection and filters
+    as read_raw. Spark prunes partition directories and pushes the 'date' filters down
+    to the Parquet reader.
+
+    :parameter:
+        - spark (pyspark.sql.SparkSession): The Spark session.
+        - directory (str): The root directory of the raw layer.
+        - columns (list of str, optional): Columns to read, all columns when omitted.
+        - tickers, start_date, end_date: Row filters, see raw_predicates.
+    :return:
+        - df (pyspark.sql.DataFrame): The matching rows.
+    """
+    from pyspark.sql.functions import col
+
+    df = spark.read.option("basePath", directory).parquet(directory)
+    for column, operator, value in raw_predicates(tickers, start_date, end_date):
+        if operator == "in":
+            df = df.where(col(column).isin(value))
+        elif operator == ">=":
+            df = df.where(col(column) >= value)
+        else:
+            df = df.where(col(column) <= value)
+    if columns:
+        df = df.select(*columns)
+    return df
+
+
+def convert_csv_files(csv_directory=CSV_DIRECTORY, directory=RAW_DIRECTORY):
+    """
+    Converts the per-ticker CSV files written by earlier downloads into the raw layer.
+
+    :return:
+        - count (int): The number of converted rows.
+    """
+    count = 0
+    for filename in sorted(os.listdir(csv_directory)):
+        if filename.endswith(".csv"):
+            hist = pd.read_csv(os.path.join(csv_directory, filename))
+            count += write_raw(hist, filename[:-4], directory)
+    return count
+
+
+if __name__ == "__main__":
+    print(f"Converted {convert_csv_files()} rows to {RAW_DIRECTORY}")
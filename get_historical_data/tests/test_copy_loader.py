@@ -0,0 +1,122 @@
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+import psycopg2
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath((os.path.join(os.path.dirname(__file__), '..'))))
+
+import copy_loader
+from copy_loader import MERGE_STAGING, iter_chunks, iter_raw_frames, load
+from raw_store import PRICE_COLUMNS
+
+
+def raw_rows(ticker, count):
+    return pd.DataFrame({
+        'date': [date(2024, 1, day) for day in range(1, count + 1)],
+        'open': 10.123, 'high': 10.5, 'low': 9.5, 'close': 10.256,
+        'volume': 100, 'dividends': 0.1, 'stock_splits': 0.0,
+        'ticker': ticker,
+    })
+
+
+def test_chunks_are_bounded_and_cleaned():
+    chunks = list(iter_chunks([raw_rows('AAPL', 5), raw_rows('MSFT', 4)], chunk_size=4))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 1]
+    assert list(chunks[0].columns) == ['ticker', 'date', 'open', 'high', 'low', 'close', 'volume']
+    assert chunks[0]['open'].iloc[0] == 10.12
+    assert chunks[0]['close'].iloc[0] == 10.26
+
+
+def test_load_copies_and_merges_every_chunk():
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.rowcount = 3
+    copied = []
+    cur.copy_expert.side_effect = lambda sql, buffer: copied.append(buffer.read())
+
+    report = load(conn, [raw_rows('AAPL', 6)], chunk_size=3)
+
+    assert report['rows'] == 6
+    assert report['merged'] == 6
+    assert report['rows_per_second'] > 0
+    assert copied[0].splitlines()[0] == 'AAPL,2024-01-01,10.12,10.5,9.5,10.26,100'
+    assert conn.commit.call_count == 2
+    cur.execute.assert_any_call(MERGE_STAGING)
+
+
+def test_raw_frames_are_batched_from_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    from raw_store import write_raw
+
+    history = pd.DataFrame(
+        {'Open': 10.0, 'High': 10.5, 'Low': 9.5, 'Close': 10.25, 'Volume': 100},
+        index=pd.DatetimeIndex(['2024-01-01', '2024-01-02', '2024-01-03'], name='Date'),
+    )
+    write_raw(history, 'AAPL', str(tmp_path))
+    write_raw(history.iloc[:2], 'MSFT', str(tmp_path))
+
+    frames = list(iter_raw_frames(str(tmp_path), batch_size=2))
+    rows = pd.concat(frames, ignore_index=True).sort_values(['ticker', 'date'])
+
+    assert all(len(frame) <= 2 for frame in frames)
+    assert list(rows.columns) == PRICE_COLUMNS
+    assert list(rows['ticker']) == ['AAPL', 'AAPL', 'AAPL', 'MSFT', 'MSFT']
+    assert list(rows['date']) == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3),
+                                  date(2024, 1, 1), date(2024, 1, 2)]
+
+
+def test_main_refreshes_rollups_from_first_loaded_date(mocker):
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.rowcount = 2
+    mocker.patch.object(copy_loader, 'get_connection', return_value=conn)
+    mocker.patch.object(copy_loader, 'iter_csv_frames',
+                        return_value=[raw_rows('AAPL', 3).iloc[1:], raw_rows('MSFT', 2)])
+
+    report = copy_loader.main('csv', chunk_size=2)
+
+    assert report['min_date'] == date(2024, 1, 1)
+    cur.execute.assert_any_call("SELECT refresh_stock_rollups(%s)", (date(2024, 1, 1),))
+    conn.close.assert_called_once()
+
+
+def test_main_closes_connection_on_error(mocker):
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value.copy_expert.side_effect = psycopg2.Error
+    mocker.patch.object(copy_loader, 'get_connection', return_value=conn)
+    mocker.patch.object(copy_loader, 'iter_csv_frames', return_value=[raw_rows('AAPL', 3)])
+
+    with pytest.raises(psycopg2.Error):
+        copy_loader.main('csv')
+
+    conn.close.assert_called_once()
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DBNAME"), reason="TEST_DBNAME is not set")
+def test_load_into_local_postgres():
+    conn = psycopg2.connect(
+        database=os.getenv("TEST_DBNAME"),
+        user=os.getenv("TEST_DBUSER"),
+        password=os.getenv("TEST_DBPASSWORD"),
+        host=os.getenv("TEST_DBHOST", "localhost"),
+        port=os.getenv("TEST_DBPORT", "5432"),
+    )
+    with conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO companies (ticker, name) VALUES ('ZZZT', 'Test') ON CONFLICT DO NOTHING")
+        cur.execute("DELETE FROM stock_prize WHERE ticker = 'ZZZT'")
+
+    load(conn, [raw_rows('ZZZT', 5)], chunk_size=2)
+    report = load(conn, [raw_rows('ZZZT', 5)], chunk_size=2)
+
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*), min(open)::float FROM stock_prize WHERE ticker = 'ZZZT'")
+        assert cur.fetchone() == (5, pytest.approx(10.12))
+        cur.execute("DELETE FROM stock_prize WHERE ticker = 'ZZZT'")
+        cur.execute("DELETE FROM companies WHERE ticker = 'ZZZT'")
+    conn.close()
+    assert report['merged'] == 5
@@ -8,7 +8,7 @@ from unittest.mock import MagicMock
 
 sys.path.insert(0, os.path.abspath((os.path.join(os.path.dirname(__file__), '..'))))
 
-from get_stock_data import main, get_stock_data
+from get_stock_data import main, get_stock_data, download_history, update_history, TokenBucket
 
 
 @pytest.fixture
@@ -61,11 +61,127 @@ def test_successful_fetching(mocker, mock_yfinance):
         'Close': [150, 160]
     })
 
-    mock_to_csv = mocker.patch('get_stock_data.pd.DataFrame.to_csv')
+    mock_write_raw = mocker.patch('get_stock_data.write_raw')
 
     main()
     print(mock_ticker.mock_calls)
     mock_ticker.assert_any_call('GOOGL')
     mock_ticker.assert_any_call('AAPL')
 
-    assert mock_to_csv.call_count == 2
+    assert mock_write_raw.call_count == 2
+
+
+class StubFetcher:
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.calls = []
+
+    def __call__(self, ticker, start, end):
+        self.calls.append((ticker, start, end))
+        if self.failures.get(ticker, 0) > 0:
+            self.failures[ticker] -= 1
+            raise ConnectionError("Too Many Requests")
+        return pd.DataFrame({'Close': [150.0, 160.0]})
+
+
+def test_download_history_retries_and_reports():
+    fetcher = StubFetcher({'AAPL': 1, 'GOOGL': 10})
+    written = []
+
+    report = download_history(
+        ['AAPL', 'GOOGL', 'MSFT'],
+        fetcher=fetcher,
+        end='2024-07-16',
+        workers=3,
+        rate=1000,
+        retries=2,
+        backoff=0,
+        writer=lambda hist, ticker: written.append(ticker) or len(hist),
+    ).set_index('ticker')
+
+    assert report.loc['AAPL', 'status'] == 'ok'
+    assert report.loc['AAPL', 'attempts'] == 2
+    assert report.loc['GOOGL', 'status'] == 'failed'
+    assert report.loc['GOOGL', 'attempts'] == 3
+    assert report.loc['GOOGL', 'error'] == 'Too Many Requests'
+    assert report.loc['MSFT', 'rows'] == 2
+    assert sorted(written) == ['AAPL', 'MSFT']
+    assert all(end == '2024-07-16' for _, _, end in fetcher.calls)
+
+
+def test_token_bucket_waits_for_tokens():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+
+    assert sleeps == [0.5, 0.5]
+
+
+def weekly_history(start, periods):
+    dates = pd.date_range(start, periods=periods, freq='W-MON', tz='America/New_York')
+    return pd.DataFrame(
+        {'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': range(periods), 'Volume': 10},
+        index=pd.DatetimeIndex(dates, name='Date'),
+    )
+
+
+def test_update_history_fetches_only_missing_bars(tmp_path):
+    pytest.importorskip("pyarrow")
+    from raw_store import Manifest, read_raw, write_raw
+
+    write_raw(weekly_history('2024-01-01', 4), 'AAPL', str(tmp_path))
+    calls = []
+
+    def fetcher(ticker, start, end):
+        calls.append((ticker, start))
+        return weekly_history('2024-01-01', 8)
+
+    report = update_history(
+        ['AAPL', 'MSFT'], fetcher=fetcher, end='2024-02-24', rate=1000, directory=str(tmp_path)
+    ).set_index('ticker')
+
+    assert sorted(calls) == [('AAPL', '2024-01-23'), ('MSFT', '2010-01-01')]
+    assert report.loc['AAPL', 'rows'] == 3
+    assert report.loc['MSFT', 'rows'] == 7
+    assert len(read_raw(str(tmp_path), tickers=['AAPL'])) == 7
+
+    manifest = Manifest(str(tmp_path / '_manifest.json'))
+    assert str(manifest.get_last_date('AAPL')) == '2024-02-12'
+
+    resumed = update_history(
+        ['AAPL', 'MSFT'], fetcher=fetcher, end='2024-02-24', rate=1000, directory=str(tmp_path)
+    )
+    assert set(resumed['status']) == {'up_to_date'}
+    assert len(calls) == 2
+
+
+def test_update_history_after_crash_before_manifest_record(tmp_path, mocker):
+    pytest.importorskip("pyarrow")
+    from raw_store import Manifest, read_raw, write_raw
+
+    write_raw(weekly_history('2024-01-01', 4), 'AAPL', str(tmp_path))
+
+    def fetcher(ticker, start, end):
+        return weekly_history('2024-01-01', 8)
+
+    # The bars are appended, then the process stops before the manifest records them.
+    mocker.patch.object(Manifest, 'record', side_effect=KeyboardInterrupt)
+    with pytest.raises(KeyboardInterrupt):
+        update_history(['AAPL'], fetcher=fetcher, end='2024-02-24', rate=1000, workers=1,
+                       retries=0, directory=str(tmp_path))
+    mocker.stopall()
+
+    report = update_history(['AAPL'], fetcher=fetcher, end='2024-02-24', rate=1000,
+                            directory=str(tmp_path))
+
+    stored = read_raw(str(tmp_path), tickers=['AAPL'])
+    assert report['rows'].sum() == 0
+    assert len(stored) == 7
+    assert not stored.duplicated(['ticker', 'date']).any()
@@ -0,0 +1,117 @@
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath((os.path.join(os.path.dirname(__file__), '..'))))
+
+pytest.importorskip("pyarrow")
+
+from raw_store import read_raw, to_raw_frame, write_raw
+
+
+@pytest.fixture
+def history():
+    return pd.DataFrame(
+        {
+            'Open': [10.123456789, 11.0, 12.0],
+            'High': [10.5, 11.5, 12.5],
+            'Low': [9.5, 10.5, 11.5],
+            'Close': [10.25, 11.25, 12.25],
+            'Volume': [1000, 2000, 3000],
+            'Dividends': [0.0, 0.0, 0.1],
+            'Stock Splits': [0.0, 0.0, 0.0],
+        },
+        index=pd.DatetimeIndex(
+            ['2023-12-29', '2024-01-05', '2024-01-12'], name='Date'
+        ).tz_localize('America/New_York'),
+    )
+
+
+def test_csv_dates_keep_local_trading_day():
+    hist = pd.DataFrame({
+        'Date': ['2010-01-01 00:00:00-05:00', '2010-07-02 00:00:00-04:00'],
+        'Close': [1.0, 2.0],
+        'Volume': [10, 20],
+    })
+
+    df = to_raw_frame(hist, 'AAPL')
+
+    assert list(df['date']) == [date(2010, 1, 1), date(2010, 7, 2)]
+    assert list(df['ticker']) == ['AAPL', 'AAPL']
+
+
+def test_write_and_read_with_filters(tmp_path, history):
+    write_raw(history, 'AAPL', str(tmp_path))
+    write_raw(history, 'MSFT', str(tmp_path))
+
+    df = read_raw(
+        str(tmp_path),
+        columns=['ticker', 'date', 'close'],
+        tickers=['AAPL'],
+        start_date=date(2024, 1, 1),
+    )
+
+    assert list(df.columns) == ['ticker', 'date', 'close']
+    assert list(df['close']) == [11.25, 12.25]
+    assert set(df['ticker']) == {'AAPL'}
+
+
+def test_rewriting_ticker_replaces_history(tmp_path, history):
+    write_raw(history, 'AAPL', str(tmp_path))
+    write_raw(history.iloc[:1], 'AAPL', str(tmp_path))
+
+    df = read_raw(str(tmp_path))
+
+    assert len(df) == 1
+    assert df['open'].iloc[0] == 10.123456789
+
+
+def test_append_skips_stored_bars_and_compacts(tmp_path, history, mocker):
+    mocker.patch('raw_store.MAX_FILES_PER_TICKER', 2)
+    from raw_store import append_raw
+
+    append_raw(history.iloc[:1], 'AAPL', directory=str(tmp_path))
+    append_raw(history.iloc[:2], 'AAPL', directory=str(tmp_path))
+    appended = append_raw(history, 'AAPL', directory=str(tmp_path))
+
+    assert list(appended['close']) == [12.25]
+    assert len(os.listdir(tmp_path / 'ticker=AAPL')) == 1
+    assert list(read_raw(str(tmp_path))['close']) == [10.25, 11.25, 12.25]
+
+
+def test_compaction_keeps_last_written_duplicate(tmp_path, history):
+    from raw_store import _write_frame, compact_ticker
+
+    df = to_raw_frame(history, 'AAPL')
+    _write_frame(df, str(tmp_path))
+    _write_frame(df.assign(close=df['close'] + 1), str(tmp_path))
+    compact_ticker('AAPL', str(tmp_path))
+
+    assert list(read_raw(str(tmp_path))['close']) == [11.25, 12.25, 13.25]
+
+
+def test_write_raw_records_last_date_in_manifest(tmp_path, history):
+    from raw_store import Manifest
+
+    write_raw(history, 'AAPL', str(tmp_path))
+    manifest = Manifest(str(tmp_path / '_manifest.json'))
+    manifest.record('AAPL', date(2025, 1, 1))
+    write_raw(history.iloc[:2], 'AAPL', str(tmp_path))
+
+    assert Manifest(str(tmp_path / '_manifest.json')).get_last_date('AAPL') == date(2024, 1, 5)
+
+
+def test_compaction_failure_keeps_partition(tmp_path, history, mocker):
+    from raw_store import append_raw, compact_ticker
+
+    append_raw(history.iloc[:2], 'AAPL', directory=str(tmp_path))
+    append_raw(history.iloc[2:], 'AAPL', directory=str(tmp_path))
+    mocker.patch('raw_store.pq.write_table', side_effect=OSError('disk full'))
+
+    with pytest.raises(OSError):
+        compact_ticker('AAPL', str(tmp_path))
+
+    assert sorted(read_raw(str(tmp_path))['close']) == [10.25, 11.25, 12.25]
@@ -8,7 +8,7 @@ CREATE TABLE companies (
 
 CREATE TABLE stock_prize(
     id SERIAL PRIMARY KEY,
-    ticker REFERENCES companies(thicker),
+    ticker VARCHAR(20) NOT NULL REFERENCES companies(ticker),
     date DATE NOT NULL,
     open DECIMAL(10, 2),
     high DECIMAL(10, 2),
@@ -16,4 +16,71 @@ CREATE TABLE stock_prize(
     close DECIMAL(10, 2),
     volume BIGINT,
     UNIQUE (ticker, date)
-);
\ No newline at end of file
+);
+
+CREATE TABLE stock_prize_weekly(
+    ticker VARCHAR(20) NOT NULL,
+    period DATE NOT NULL,
+    open DECIMAL(10, 2),
+    high DECIMAL(10, 2),
+    low DECIMAL(10, 2),
+    close DECIMAL(10, 2),
+    volume BIGINT,
+    PRIMARY KEY (ticker, period)
+);
+
+
+CREATE TABLE stock_prize_monthly(
+    ticker VARCHAR(20) NOT NULL,
+    period DATE NOT NULL,
+    open DECIMAL(10, 2),
+    high DECIMAL(10, 2),
+    low DECIMAL(10, 2),
+    close DECIMAL(10, 2),
+    volume BIGINT,
+    PRIMARY KEY (ticker, period)
+);
+
+
+-- Recomputes the weekly and monthly OHLCV rollups of every period containing rows
+-- dated on or after since_date. Called by the import scripts and the Airflow DAG
+-- after they load new rows into stock_prize.
+CREATE OR REPLACE FUNCTION refresh_stock_rollups(since_date DATE) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stock_prize_weekly (ticker, period, open, high, low, close, volume)
+    SELECT ticker,
+           date_trunc('week', date)::DATE AS period,
+           (array_agg(open ORDER BY date ASC))[1],
+           MAX(high),
+           MIN(low),
+           (array_agg(close ORDER BY date DESC))[1],
+           SUM(volume)
+    FROM stock_prize
+    WHERE date >= date_trunc('week', since_date)
+    GROUP BY ticker, period
+    ON CONFLICT (ticker, period) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume;
+
+    INSERT INTO stock_prize_monthly (ticker, period, open, high, low, close, volume)
+    SELECT ticker,
+           date_trunc('month', date)::DATE AS period,
+           (array_agg(open ORDER BY date ASC))[1],
+           MAX(high),
+           MIN(low),
+           (array_agg(close ORDER BY date DESC))[1],
+           SUM(volume)
+    FROM stock_prize
+    WHERE date >= date_trunc('month', since_date)
+    GROUP BY ticker, period
+    ON CONFLICT (ticker, period) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        volume = EXCLUDED.volume;
+END;
+$$ LANGUAGE plpgsql;
@@ -1,11 +1,46 @@
-from flask import Blueprint, render_template, request, jsonify
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from flask import (
+    Blueprint,
+    Response,
+    render_template,
+    request,
+    jsonify,
+    abort,
+    stream_with_context,
+)
 
 from models import (
-    get_stock_values_from_db,
-    get_stock_companies_from_db,
     get_last_update_from_db,
+    get_ticker_values,
+    iter_stock_rows,
+    EXPORT_COLUMNS,
+)
+from routes import (
+    CHART_TIMEOUT,
+    get_cached_company_index,
+    get_cached_series_store,
+    get_data_version,
+    make_chart_etag,
+)
+from serializers import (
+    EXPORT_FORMATS,
+    arrow_response,
+    columns_response,
+    frame_to_columns,
+    get_response_format,
+    is_format_available,
+    iter_csv,
+    iter_ndjson,
 )
-from utils import filter_by_range
+from utils import get_range_start, parse_limit, parse_max_points, parse_range_option
+from metrics import inc, render_prometheus, timed
+from indicators import parse_indicators
+from correlation import correlation_matrix, get_returns_matrix
+from extensions import cache
+from warmup import get_status, is_ready
 
 api_routes = Blueprint("api_routes", __name__)
 
@@ -20,25 +55,57 @@ def get_stock_data_api(ticker):
     :parameter:
         - 'ticker' (str): the name of the company for which stock is requested.
         - 'range' (str, optional): the data range for filtering the stock data.
+        - 'max_points' (int, optional): the maximum number of points, longer series are
+        downsampled with Largest-Triangle-Three-Buckets.
+        - 'format' (str, optional): 'records', 'columns', 'msgpack' or 'arrow'. Negotiated
+        from the 'Accept' header when omitted.
+        - 'indicators' (str, optional): comma separated indicators added to the data, such
+        as 'sma20,ema50,volatility20,drawdown'.
     :return:
         Response: A Flask 'Response' object with a JSON payload containing:
             - A list of dictionaries where each dictionary represents a record of
             stock data with fields such as date, ticker, and price.
+            For the 'columns' and 'msgpack' formats the payload contains 'ticker',
+            'dates' and 'close' arrays, for 'arrow' an Arrow IPC stream.
+            Requested indicators are added as fields or arrays named after the indicator,
+            null where the window is not filled yet.
     """
-    range_option = request.args.get("range", default="all")
+    response_format = get_response_format(request)
 
-    pandas_companies_df = get_stock_companies_from_db()
-    pandas_value_df = get_stock_values_from_db()
+    if not is_format_available(response_format):
+        return abort(406, description=f"Response format {response_format} is not available")
 
-    matching_rows = pandas_companies_df.loc[pandas_companies_df["ticker"] == ticker]
+    try:
+        range_option = parse_range_option(request.args.get("range"), default="all")
+        max_points = parse_max_points(request.args.get("max_points"))
+        indicators = parse_indicators(request.args.get("indicators"))
+    except ValueError as e:
+        return abort(400, description=str(e))
 
-    if matching_rows.empty:
-        return abort(404, description="Stock ticker not found")
+    if indicators:
+        # Indicators need the history before the range, they are read from the store.
+        store = get_cached_series_store()
+        if store is None or ticker not in store:
+            return abort(404, description="Stock ticker not found")
+        with timed("select_range"):
+            data = store.get_frame(ticker, range_option, max_points, indicators)
+    else:
+        with timed("select_range"):
+            values = get_ticker_values([ticker], range_option, max_points)
 
-    data = pandas_value_df[pandas_value_df["ticker"] == ticker].copy()
-    data = filter_by_range(data, range_option)
-    data = data.sort_values(by="date")
+        if not values:
+            return abort(404, description="Stock ticker not found")
 
+        data = values[ticker]
+
+    if response_format == "arrow":
+        return arrow_response(data)
+    if response_format != "records":
+        return columns_response({"ticker": ticker, **frame_to_columns(data)}, response_format)
+
+    if indicators:
+        data = data.astype({name: object for name in indicators})
+        data[indicators] = data[indicators].where(data[indicators].notna(), None)
     return jsonify(data.to_dict(orient="records"))
 
 
@@ -54,6 +121,10 @@ def compare_stocks_api():
         - 'first_ticker' (str): the name of the first stock to compare.
         - 'second_ticker' (str): the name of the second stock to compare.
         - 'range' (str, optional): the data range for filtering the stock data. Defaults to 'all'.
+        - 'max_points' (int, optional): the maximum number of points, longer series are
+        downsampled with Largest-Triangle-Three-Buckets.
+        - 'format' (str, optional): 'records', 'columns', 'msgpack' or 'arrow'. Negotiated
+        from the 'Accept' header when omitted.
     :return:
         Response: A Flask 'Response' object with a JSON payload containing:
             - 'first_ticker' (str): The ticker symbol for the first stock.
@@ -62,31 +133,43 @@ def compare_stocks_api():
             - 'second_ticker' (str): The ticker symbol for the second stock.
             - 'second_data' (list of dicts): A list of dictionaries where each dictionary represents.
             a record of stock data for the second ticker.
+            For the 'columns' and 'msgpack' formats 'first_data' and 'second_data' contain
+            'dates' and 'close' arrays, for 'arrow' both tickers are sent as one Arrow IPC stream.
     """
     first_ticker = request.args.get("first_ticker")
     second_ticker = request.args.get("second_ticker")
-    range_option = request.args.get("range", default="all")
+    response_format = get_response_format(request)
 
-    pandas_companies_df = get_stock_companies_from_db()
-    pandas_value_df = get_stock_values_from_db()
+    if not is_format_available(response_format):
+        return abort(406, description=f"Response format {response_format} is not available")
 
-    first_matching_rows = pandas_companies_df.loc[
-        pandas_companies_df["ticker"] == first_ticker
-    ]
-    second_matching_rows = pandas_companies_df.loc[
-        pandas_companies_df["ticker"] == second_ticker
-    ]
+    try:
+        range_option = parse_range_option(request.args.get("range"), default="all")
+        max_points = parse_max_points(request.args.get("max_points"))
+    except ValueError as e:
+        return abort(400, description=str(e))
 
-    if first_matching_rows.empty or second_matching_rows.empty:
+    with timed("select_range"):
+        values = get_ticker_values([first_ticker, second_ticker], range_option, max_points)
+
+    if not values or first_ticker not in values or second_ticker not in values:
         return abort(404, description="One or both stock tickers not found")
 
-    first_data = pandas_value_df[pandas_value_df["ticker"] == first_ticker].copy()
-    first_data = filter_by_range(first_data, range_option)
-    first_data = first_data.sort_values(by="date")
+    first_data = values[first_ticker]
+    second_data = values[second_ticker]
 
-    second_data = pandas_value_df[pandas_value_df["ticker"] == second_ticker].copy()
-    second_data = filter_by_range(second_data, range_option)
-    second_data = second_data.sort_values(by="date")
+    if response_format == "arrow":
+        return arrow_response(pd.concat([first_data, second_data], ignore_index=True))
+    if response_format != "records":
+        return columns_response(
+            {
+                "first_ticker": first_ticker,
+                "first_data": frame_to_columns(first_data),
+                "second_ticker": second_ticker,
+                "second_data": frame_to_columns(second_data),
+            },
+            response_format,
+        )
 
     return jsonify(
         {
@@ -96,3 +179,335 @@ def compare_stocks_api():
             "second_data": second_data.to_dict(orient="records"),
         }
     )
+
+
+@api_routes.route("/api/top_movers", methods=["GET"])
+def top_movers_api():
+    """
+    Api route handler for ('api/top_movers') with GET method
+
+    Returns the tickers with the largest percentage change over a data range in JSON format,
+    read from the precomputed summary table.
+
+    :parameter:
+        - 'range' (str, optional): the data range for the change. Defaults to '1year'.
+        - 'limit' (int, optional): the maximum number of tickers returned, between 1 and
+        the number of tickers. Defaults to 10.
+        - 'order' (str, optional): 'gainers' or 'losers'. Defaults to 'gainers'.
+    :return:
+        Response: A Flask 'Response' object with a JSON payload containing:
+            - A list of dictionaries with fields 'ticker', 'pct_change', 'last_change'
+            and 'last_value'.
+    """
+    ascending = request.args.get("order", default="gainers") == "losers"
+
+    try:
+        range_option = parse_range_option(request.args.get("range"), default="1year")
+    except ValueError as e:
+        return abort(400, description=str(e))
+
+    store = get_cached_series_store()
+
+    if store is None:
+        return abort(503, description="Stock data could not be loaded")
+
+    try:
+        limit = parse_limit(request.args.get("limit"), default=10, maximum=max(len(store), 1))
+    except ValueError as e:
+        return abort(400, description=str(e))
+
+    movers = store.get_summary().top_movers(range_option, limit=limit, ascending=ascending)
+
+    return jsonify(movers.to_dict(orient="records"))
+
+
+@api_routes.route("/api/stocks", methods=["GET"])
+def get_stocks_api():
+    """
+    Api route handler for ('api/stocks') with GET method
+
+    Retrieves stock data for any number of tickers with a single lookup and returns their
+    close values aligned on a shared date axis.
+
+    :parameter:
+        - 'tickers' (str): comma separated ticker symbols.
+        - 'range' (str, optional): the data range for filtering the stock data. Defaults to 'all'.
+        - 'rebase' (bool, optional): rebases every series to 100 at its first value.
+        - 'format' (str, optional): 'columns', 'msgpack' or 'arrow'. Negotiated from the
+        'Accept' header when omitted.
+    :return:
+        Response: A Flask 'Response' object with a JSON payload containing:
+            - 'dates' (list of str): The shared date axis.
+            - 'series' (dict): Close values of every found ticker aligned on 'dates',
+            with null where a ticker has no value for a date.
+            - 'missing' (list of str): Requested tickers without data in the range.
+    """
+    tickers = list(
+        dict.fromkeys(
+            ticker.strip().upper()
+            for ticker in request.args.get("tickers", default="").split(",")
+            if ticker.strip()
+        )
+    )
+    rebase = request.args.get("rebase", default="false").lower() in ("1", "true", "yes")
+    response_format = get_response_format(request)
+
+    if not tickers:
+        return abort(400, description="No stock tickers given")
+
+    try:
+        range_option = parse_range_option(request.args.get("range"), default="all")
+    except ValueError as e:
+        return abort(400, description=str(e))
+
+    if not is_format_available(response_format):
+        return abort(406, description=f"Response format {response_format} is not available")
+
+    with timed("select_range"):
+        values = get_ticker_values(tickers, range_option)
+
+    if values is None:
+        return abort(503, description="Stock data could not be loaded")
+
+    found = [ticker for ticker in tickers if ticker in values]
+    aligned = align_stock_values(values, found, rebase)
+
+    if response_format == "arrow":
+        return arrow_response(aligned.rename_axis("date").reset_index())
+
+    dates = aligned.index.to_numpy(dtype="datetime64[D]")
+    series = {}
+    for ticker in found:
+        closes = aligned[ticker].to_numpy()
+        series[ticker] = np.where(np.isnan(closes), None, closes).tolist()
+
+    return columns_response(
+        {
+            "dates": np.datetime_as_string(dates, unit="D").tolist(),
+            "series": series,
+            "missing": [ticker for ticker in tickers if ticker not in values],
+        },
+        "msgpack" if response_format == "msgpack" else "columns",
+    )
+
+
+@api_routes.route("/api/correlation", methods=["GET"])
+def correlation_api():
+    """
+    Api route handler for ('api/correlation') with GET method
+
+    Returns the correlation of period returns between every pair of tickers, computed at
+    once on a returns matrix aligned by date. Results are cached per range, sector and
+    data version.
+
+    :parameter:
+        - 'range' (str, optional): the data range of the returns. Defaults to '1year'.
+        - 'sector' (str, optional): a GICS sector such as 'Information Technology',
+        all tickers when omitted.
+        - 'format' (str, optional): 'columns' or 'msgpack'. Negotiated from the 'Accept'
+        header when omitted.
+    :return:
+        Response: A Flask 'Response' object with a JSON payload containing:
+            - 'tickers' (list of str): The tickers in row and column order.
+            - 'matrix' (list of lists): The correlation matrix, with null for pairs with
+            fewer than three shared returns.
+    """
+    sector = request.args.get("sector", default="").strip()
+    response_format = get_response_format(request)
+    response_format = "msgpack" if response_format == "msgpack" else "columns"
+
+    try:
+        range_option = parse_range_option(request.args.get("range"), default="1year")
+    except ValueError as e:
+        return abort(400, description=str(e))
+
+    if not is_format_available(response_format):
+        return abort(406, description=f"Response format {response_format} is not available")
+
+    store = get_cached_series_store()
+    company_index = get_cached_company_index()
+
+    if store is None or company_index is None:
+        return abort(503, description="Stock data could not be loaded")
+
+    if sector:
+        tickers = [ticker for ticker in company_index.get_sector_tickers(sector) if ticker in store]
+        if not tickers:
+            return abort(404, description="Sector not found")
+    else:
+        tickers = store.tickers
+    tickers = sorted(tickers)
+
+    etag = make_chart_etag("correlation", range_option, sector.lower(), *tickers, get_data_version(store))
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    cache_key = f"correlation_{etag}"
+    payload = cache.get(cache_key)
+    inc("sp500_cache_requests_total", cache="correlation", result="miss" if payload is None else "hit")
+    if payload is None:
+        with timed("correlation"):
+            returns = get_returns_matrix(store, tickers, get_range_start(range_option))
+            matrix = correlation_matrix(returns)
+        payload = {
+            "tickers": tickers,
+            "matrix": np.where(np.isnan(matrix), None, np.round(matrix, 6)).tolist(),
+        }
+        cache.set(cache_key, payload, timeout=CHART_TIMEOUT)
+
+    response = columns_response(payload, response_format)
+    response.set_etag(etag)
+    return response
+
+
+def align_stock_values(values, tickers, rebase=False):
+    """
+    Aligns close values of several tickers on the union of their dates.
+
+    :parameter:
+        - values (dict): Mapping of tickers to DataFrames with columns 'date', 'close'.
+        - tickers (list of str): The tickers to align, in column order.
+        - rebase (bool): Divides every series by its first value and multiplies it by 100.
+    :return:
+        - df (pandas.DataFrame): A DataFrame indexed by date with one column per ticker.
+    """
+    if not tickers:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+
+    aligned = pd.concat(
+        {
+            ticker: pd.Series(
+                values[ticker]["close"].to_numpy(dtype=np.float64),
+                index=pd.to_datetime(values[ticker]["date"]),
+            )
+            for ticker in tickers
+        },
+        axis=1,
+    ).sort_index()
+
+    if rebase:
+        first = aligned.bfill().iloc[0]
+        aligned = aligned / first * 100
+
+    return aligned
+
+
+@api_routes.route("/api/export", methods=["GET"])
+def export_stocks_api():
+    """
+    Api route handler for ('api/export') with GET method
+
+    Streams stock_prize rows as chunked NDJSON or CSV. Rows are read from a server-side
+    cursor, so memory stays bounded and the first rows are sent immediately.
+
+    :parameter:
+        - 'tickers' (str, optional): comma separated ticker symbols, all tickers when omitted.
+        - 'range' (str, optional): the data range for filtering the stock data.
+        - 'start' (str, optional): the first date to export in 'YYYY-MM-DD' format,
+        overrides 'range'.
+        - 'end' (str, optional): the last date to export in 'YYYY-MM-DD' format.
+        - 'format' (str, optional): 'ndjson' or 'csv'. Defaults to 'ndjson'.
+    :return:
+        Response: A streamed Flask 'Response' object with one row per line containing
+        'ticker', 'date', 'open', 'high', 'low', 'close' and 'volume'.
+    """
+    tickers = [
+        ticker.strip().upper()
+        for ticker in request.args.get("tickers", default="").split(",")
+        if ticker.strip()
+    ]
+    export_format = request.args.get("format", default="ndjson")
+
+    if export_format not in EXPORT_FORMATS:
+        return abort(406, description=f"Export format {export_format} is not available")
+
+    try:
+        start_date = parse_export_date(request.args.get("start"))
+        end_date = parse_export_date(request.args.get("end"))
+    except ValueError:
+        return abort(400, description="Dates must be given in YYYY-MM-DD format")
+
+    try:
+        range_option = parse_range_option(request.args.get("range"), default="all")
+    except ValueError as e:
+        return abort(400, description=str(e))
+
+    if start_date is None:
+        range_start = get_range_start(range_option)
+        start_date = range_start.date() if range_start is not None else None
+
+    chunks = iter_stock_rows(tickers, start_date, end_date)
+    if export_format == "csv":
+        body = iter_csv(chunks, EXPORT_COLUMNS)
+    else:
+        body = iter_ndjson(chunks, EXPORT_COLUMNS)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=stock_prize.{export_format}"},
+    )
+
+
+def parse_export_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+@api_routes.route("/ready", methods=["GET"])
+def ready():
+    """
+    Route handler for ('/ready') with GET method
+
+    Reports whether the caches were warmed up and the worker can serve requests.
+
+    :return:
+        Response: A Flask 'Response' object with status 200 when ready and 503 otherwise,
+        with a JSON payload containing:
+            - 'ready' (bool): Whether every warm-up stage completed.
+            - 'stages' (dict): The completion of the 'companies', 'values' and 'summary' stages.
+    """
+    return jsonify({"ready": is_ready(), "stages": get_status()}), 200 if is_ready() else 503
+
+
+@api_routes.route("/api/search", methods=["GET"])
+def search_api():
+    """
+    Api route handler for ('api/search') with GET method
+
+    Searches companies whose ticker or name starts with the query.
+
+    :parameter:
+        - 'q' (str): the case-insensitive prefix to look for.
+        - 'limit' (int, optional): the maximum number of results. Defaults to 10, at most 50.
+    :return:
+        Response: A Flask 'Response' object with a JSON payload containing:
+            - A ranked list of dictionaries with fields 'ticker' and 'name'.
+    """
+    query = request.args.get("q", default="")
+    limit = min(request.args.get("limit", default=10, type=int), 50)
+
+    company_index = get_cached_company_index()
+
+    if company_index is None:
+        return abort(503, description="Company data could not be loaded")
+
+    return jsonify(company_index.search(query, limit=limit))
+
+
+@api_routes.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Route handler for ('/metrics') with GET method
+
+    Exposes per-stage timings, request durations, response sizes, cache hit/miss counters
+    and database row counts of this worker, labelled with its 'pid'. Every worker keeps
+    its own metrics, see the metrics module.
+
+    :return:
+        Response: A Flask 'Response' object in the Prometheus text exposition format.
+    """
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
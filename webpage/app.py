@@ -1,13 +1,19 @@
-from flask import Flask
+import os
+import time
+
+from flask import Flask, g, request
 
 from routes import main_routes
 from api import api_routes
-from extensions import cache
+from extensions import cache, get_cache_config
+from metrics import observe
+from warmup import ensure_warm_up
 
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "true").lower() == "true"
 
 app = Flask(__name__)
 
-cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+cache.init_app(app, config=get_cache_config())
 
 main_routes.cache = cache
 
@@ -15,5 +21,32 @@ app.register_blueprint(main_routes)
 app.register_blueprint(api_routes)
 
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.before_request
+def start_warm_up_thread():
+    if WARM_UP_ON_START:
+        ensure_warm_up(app)
+
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    observe(
+        "sp500_request_duration_seconds",
+        time.perf_counter() - g.request_start,
+        endpoint=endpoint,
+    )
+    if not response.is_streamed:
+        observe("sp500_response_bytes", response.calculate_content_length() or 0, endpoint=endpoint)
+    return response
+
+
 if __name__ == "__main__":
+    # The debug reloader serves from a child process started with WERKZEUG_RUN_MAIN.
+    if WARM_UP_ON_START and os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        ensure_warm_up(app)
     app.run(debug=True)
@@ -0,0 +1,63 @@
+import numpy as np
+
+MIN_PERIODS = 3
+
+
+def get_returns_matrix(store, tickers, start_date=None):
+    """
+    Builds a matrix of period returns aligned on the union of the tickers' dates.
+
+    :parameter:
+        - store (SeriesStore): The store holding the close values.
+        - tickers (list of str): Company symbols held in the store, one column each.
+        - start_date (datetime or None): The first date to include, None for the whole history.
+    :return:
+        - returns (numpy.ndarray): A float64 matrix with one row per date after the first
+        and one column per ticker. A return is NaN when the ticker has no close value on
+        the date or on the date before.
+    """
+    series = [store.get_series(ticker, start_date) for ticker in tickers]
+    if not series:
+        return np.empty((0, 0))
+
+    dates = np.unique(np.concatenate([ticker_dates for ticker_dates, _ in series]))
+    closes = np.full((len(dates), len(tickers)), np.nan)
+    for column, (ticker_dates, ticker_closes) in enumerate(series):
+        closes[np.searchsorted(dates, ticker_dates), column] = ticker_closes
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return closes[1:] / closes[:-1] - 1
+
+
+def correlation_matrix(returns, min_periods=MIN_PERIODS):
+    """
+    Computes the Pearson correlation of every pair of columns, ignoring missing values.
+
+    Every pair uses the rows where both columns have a value, the same as
+    pandas.DataFrame.corr, but all pairs are computed with a few matrix products
+    instead of one pass per pair.
+
+    :parameter:
+        - returns (numpy.ndarray): A matrix with one row per observation and one column
+        per ticker, NaN for missing values.
+        - min_periods (int): The minimum number of shared observations of a pair.
+    :return:
+        - correlations (numpy.ndarray): A symmetric matrix with one row and column per
+        ticker. Pairs with too few shared observations or a constant series are NaN.
+    """
+    present = (~np.isnan(returns)).astype(np.float64)
+    values = np.where(present > 0, returns, 0.0)
+
+    counts = present.T @ present
+    sums = values.T @ present
+    sums_squares = (values * values).T @ present
+    products = values.T @ values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = products - sums * sums.T / counts
+        variance = sums_squares - sums * sums / counts
+        correlations = covariance / np.sqrt(variance * variance.T)
+
+    correlations[counts < min_periods] = np.nan
+    np.clip(correlations, -1.0, 1.0, out=correlations)
+    return correlations
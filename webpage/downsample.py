@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def lttb_indices(x, y, max_points):
+    """
+    Selects the points kept by the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The remaining points are split into
+    max_points - 2 buckets and from every bucket the point forming the largest triangle
+    with the previously selected point and the average of the next bucket is kept. The
+    triangle areas of a whole bucket are computed at once with NumPy.
+
+    :parameter:
+        - x (numpy.ndarray): Increasing x coordinates.
+        - y (numpy.ndarray): y coordinates.
+        - max_points (int): The number of points to keep.
+    :return:
+        - indices (numpy.ndarray): Sorted indices of the kept points.
+    """
+    n = len(x)
+    if max_points is None or max_points >= n or n <= 2:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1])[:max_points]
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    bucket_x = np.add.reduceat(x[:-1], edges[:-1]) / np.diff(edges)
+    bucket_y = np.add.reduceat(y[:-1], edges[:-1]) / np.diff(edges)
+    next_x = np.append(bucket_x[1:], x[-1])
+    next_y = np.append(bucket_y[1:], y[-1])
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[selected] - next_x[bucket]) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y[bucket] - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+def downsample_series(dates, closes, max_points):
+    """
+    Reduces a price series to at most max_points points preserving its shape.
+
+    :parameter:
+        - dates (numpy.ndarray): Sorted datetime64 dates.
+        - closes (numpy.ndarray): Close values.
+        - max_points (int or None): The maximum number of points. None or a value lower
+        than 2 keeps every point.
+    :return:
+        - (dates, closes) (tuple of numpy.ndarray): The reduced series.
+    """
+    if max_points is None or max_points < 2 or len(dates) <= max_points:
+        return dates, closes
+
+    indices = lttb_indices(dates.astype("datetime64[ns]").astype(np.int64), closes, max_points)
+    return dates[indices], closes[indices]
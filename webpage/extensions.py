@@ -1,3 +1,38 @@
+import os
+import tempfile
+
 from flask_caching import Cache
 
-cache = Cache()
\ No newline at end of file
+cache = Cache()
+
+
+def get_cache_config():
+    """
+    Builds the flask_caching configuration from environment variables.
+
+    The default backend is a FileSystemCache in a directory shared by every worker
+    process of the host, so the price table is queried once per host instead of once
+    per worker. Each read unpickles its own copy of the frame; the close values the
+    workers hold in memory are shared through the price matrix instead. Setting
+    CACHE_TYPE to 'RedisCache' shares the cache between hosts and 'SimpleCache'
+    restores the per-process cache.
+
+    :return:
+        - config (dict): Configuration passed to Cache.init_app.
+    """
+    cache_type = os.getenv("CACHE_TYPE", "FileSystemCache")
+    config = {
+        "CACHE_TYPE": cache_type,
+        "CACHE_DEFAULT_TIMEOUT": int(os.getenv("CACHE_DEFAULT_TIMEOUT", "60")),
+    }
+
+    if cache_type == "FileSystemCache":
+        config["CACHE_DIR"] = os.getenv(
+            "CACHE_DIR", os.path.join(tempfile.gettempdir(), "sp500_charts_cache")
+        )
+        config["CACHE_THRESHOLD"] = int(os.getenv("CACHE_THRESHOLD", "500"))
+    elif cache_type == "RedisCache":
+        config["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        config["CACHE_KEY_PREFIX"] = os.getenv("CACHE_KEY_PREFIX", "sp500_charts_")
+
+    return config
@@ -0,0 +1,13 @@
+"""
+Gunicorn settings of the web app, read from the working directory by 'gunicorn app:app'.
+"""
+
+
+def post_fork(server, worker):
+    # Threads are not inherited by forked workers, each worker starts its warm-up thread
+    # right after the fork so it becomes ready before it serves traffic.
+    from app import WARM_UP_ON_START, app
+    from warmup import ensure_warm_up
+
+    if WARM_UP_ON_START:
+        ensure_warm_up(app)
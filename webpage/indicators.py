@@ -0,0 +1,182 @@
+import re
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOWS = {
+    "sma": 20,
+    "ema": 20,
+    "volatility": 20,
+}
+
+MAX_WINDOW = 260
+MAX_INDICATORS = 4
+
+INDICATOR_PATTERN = re.compile(r"^(sma|ema|volatility|drawdown)(\d*)$")
+PRICE_INDICATORS = ("sma", "ema")
+
+
+def parse_indicators(value):
+    """
+    Parses the indicators requested by a client.
+
+    :parameter:
+        - value (str or None): A comma separated list such as 'sma20,ema50,volatility,drawdown'.
+        Windows are counted in bars, default to DEFAULT_WINDOWS and are at most MAX_WINDOW.
+    :return:
+        - indicators (list of str): Normalized indicator names, such as 'sma20' or 'drawdown',
+        without duplicates.
+    :raises:
+        - ValueError: If an indicator is unknown, its window is not between 1 and MAX_WINDOW
+        or more than MAX_INDICATORS indicators are requested.
+    """
+    indicators = []
+    for part in (value or "").split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        match = INDICATOR_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Unknown indicator {part}")
+        kind, window = match.groups()
+        if kind == "drawdown":
+            if window:
+                raise ValueError("Indicator drawdown takes no window")
+            name = kind
+        else:
+            window = int(window) if window else DEFAULT_WINDOWS[kind]
+            if window < 1 or window > MAX_WINDOW or (kind == "volatility" and window < 2):
+                raise ValueError(f"Invalid window of indicator {part}")
+            name = f"{kind}{window}"
+        if name not in indicators:
+            indicators.append(name)
+    if len(indicators) > MAX_INDICATORS:
+        raise ValueError(f"At most {MAX_INDICATORS} indicators can be requested")
+    return indicators
+
+
+def is_price_indicator(name):
+    """
+    Returns True for indicators expressed in price units, that are drawn over the close values.
+    """
+    return name.startswith(PRICE_INDICATORS)
+
+
+class Indicator:
+    """
+    An indicator of a single ticker with its running state.
+
+    The full history is computed vectorized when the indicator is created. The state kept
+    afterwards lets 'append' extend the indicator by one bar in constant time, so new
+    values loaded into the store do not recompute the history.
+    """
+
+    def __init__(self, name, closes):
+        """
+        :parameter:
+            - name (str): A normalized indicator name returned by parse_indicators.
+            - closes (numpy.ndarray): The close values of the ticker sorted by date.
+        """
+        kind, window = INDICATOR_PATTERN.match(name).groups()
+        self.name = name
+        self.kind = kind
+        self.window = int(window) if window else None
+        closes = np.asarray(closes, dtype=np.float64)
+        self.values = getattr(self, f"_compute_{kind}")(closes)
+
+    def append(self, closes):
+        """
+        Extends the indicator with new close values.
+
+        :parameter:
+            - closes (numpy.ndarray): Close values newer than the ones already processed.
+        """
+        update = getattr(self, f"_update_{self.kind}")
+        new_values = np.fromiter((update(close) for close in closes), dtype=np.float64, count=len(closes))
+        self.values = np.concatenate((self.values, new_values))
+
+    def _compute_sma(self, closes):
+        values = np.full(len(closes), np.nan)
+        if len(closes) >= self.window:
+            cumsum = np.cumsum(np.insert(closes, 0, 0.0))
+            values[self.window - 1:] = (cumsum[self.window:] - cumsum[:-self.window]) / self.window
+        self._window_closes = deque(closes[-self.window:], maxlen=self.window)
+        self._sum = float(np.sum(self._window_closes))
+        return values
+
+    def _update_sma(self, close):
+        if len(self._window_closes) == self.window:
+            self._sum -= self._window_closes[0]
+        self._window_closes.append(close)
+        self._sum += close
+        if len(self._window_closes) < self.window:
+            return np.nan
+        return self._sum / self.window
+
+    def _compute_ema(self, closes):
+        values = pd.Series(closes).ewm(span=self.window, adjust=False).mean().to_numpy()
+        self._alpha = 2 / (self.window + 1)
+        self._last = values[-1] if len(values) else None
+        return values
+
+    def _update_ema(self, close):
+        if self._last is None:
+            self._last = close
+        else:
+            self._last += self._alpha * (close - self._last)
+        return self._last
+
+    def _compute_volatility(self, closes):
+        returns = np.diff(closes) / closes[:-1] * 100 if len(closes) > 1 else np.array([])
+        values = np.full(len(closes), np.nan)
+        if len(returns):
+            values[1:] = pd.Series(returns).rolling(self.window).std().to_numpy()
+        self._window_returns = deque(returns[-self.window:], maxlen=self.window)
+        self._sum = float(np.sum(self._window_returns))
+        self._sum_squares = float(np.sum(np.square(self._window_returns)))
+        self._last = closes[-1] if len(closes) else None
+        return values
+
+    def _update_volatility(self, close):
+        if self._last is None:
+            self._last = close
+            return np.nan
+
+        value = (close - self._last) / self._last * 100
+        self._last = close
+        if len(self._window_returns) == self.window:
+            oldest = self._window_returns[0]
+            self._sum -= oldest
+            self._sum_squares -= oldest * oldest
+        self._window_returns.append(value)
+        self._sum += value
+        self._sum_squares += value * value
+        if len(self._window_returns) < self.window:
+            return np.nan
+        variance = (self._sum_squares - self._sum * self._sum / self.window) / (self.window - 1)
+        return np.sqrt(max(variance, 0.0))
+
+    def _compute_drawdown(self, closes):
+        peaks = np.maximum.accumulate(closes) if len(closes) else closes
+        self._peak = peaks[-1] if len(peaks) else None
+        return (closes / peaks - 1) * 100
+
+    def _update_drawdown(self, close):
+        if self._peak is None or close > self._peak:
+            self._peak = close
+        return (close / self._peak - 1) * 100
+
+
+def max_drawdown(closes):
+    """
+    Returns the largest decline from a peak within the given close values, in percent.
+
+    :parameter:
+        - closes (numpy.ndarray): Close values sorted by date.
+    :return:
+        - max_drawdown (float): A value lower than or equal to 0, 0 for an empty series.
+    """
+    if len(closes) == 0:
+        return 0.0
+    return float(np.min(closes / np.maximum.accumulate(closes) - 1) * 100)
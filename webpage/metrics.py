@@ -0,0 +1,156 @@
+"""
+Prometheus metrics kept in the memory of the current process.
+
+Every gunicorn worker holds its own histograms and counters and '/metrics' returns those
+of the worker that served the scrape. Each series is therefore labelled with the 'pid' of
+its worker, and every worker must be scraped, for example by running one metrics target
+per worker, and the series summed over 'pid' in queries.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_help = {}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def describe(name, kind, text, buckets=None):
+    _help[name] = (kind, text, buckets)
+
+
+def observe(name, value, **labels):
+    """
+    Records a value in a histogram.
+
+    :parameter:
+        - name (str): The metric name, registered with describe.
+        - value (float): The observed value.
+        - labels: Label values of the series.
+    """
+    buckets = _help[name][2]
+    key = (name, _labels_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def inc(name, amount=1, **labels):
+    """
+    Increments a counter.
+
+    :parameter:
+        - name (str): The metric name, registered with describe.
+        - amount (int or float): The increment.
+        - labels: Label values of the series.
+    """
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def timed(stage):
+    """
+    Measures the duration of a stage into the 'sp500_stage_duration_seconds' histogram.
+
+    :parameter:
+        - stage (str): The stage label, such as 'db_query' or 'figure'.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("sp500_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _process_labels():
+    return [("pid", os.getpid())]
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_prometheus():
+    """
+    Renders every metric of this process in the Prometheus text exposition format, every
+    series labelled with the 'pid' of the process.
+
+    :return:
+        - text (str): The exposition text.
+    """
+    with _lock:
+        histograms = {key: (list(value[0]), value[1], value[2]) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (kind, text, buckets) in sorted(_help.items()):
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = list(labels) + _process_labels()
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(list(labels) + _process_labels())} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+describe(
+    "sp500_stage_duration_seconds",
+    "histogram",
+    "Duration of request processing stages.",
+    DURATION_BUCKETS,
+)
+describe(
+    "sp500_request_duration_seconds",
+    "histogram",
+    "Duration of HTTP requests by endpoint.",
+    DURATION_BUCKETS,
+)
+describe(
+    "sp500_response_bytes",
+    "histogram",
+    "Size of HTTP response bodies by endpoint.",
+    SIZE_BUCKETS,
+)
+describe("sp500_cache_requests_total", "counter", "Cache lookups by cache and result.")
+describe("sp500_db_rows_total", "counter", "Rows returned by database queries.")
@@ -1,10 +1,24 @@
 import os
+import threading
+import time
+from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
 import pandas as pd
 from sqlalchemy import create_engine
 
-from utils import filter_by_range
+from downsample import downsample_series
+from metrics import inc, timed
+import price_matrix
+from price_matrix import (
+    get_current_version,
+    get_version_age,
+    open_price_matrix,
+    publish_lock,
+    write_price_matrix,
+)
+from store import SeriesStore
+from utils import get_range_start
 
 load_dotenv()
 DB_USER = os.getenv("DBUSER")
@@ -12,43 +26,259 @@ DB_PASSWORD = os.getenv("DBPASSWORD")
 DB_NAME = os.getenv("DBNAME")
 DB_HOST = os.getenv("DBHOST")
 DB_PORT = os.getenv("DBPORT")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
 DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URI)
+engine = create_engine(
+    DATABASE_URI,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+HISTORY_START = datetime(2010, 1, 1)
+STOCK_PRIZE_PERIOD_DAYS = int(os.getenv("STOCK_PRIZE_PERIOD_DAYS", "7"))
+RESOLUTIONS = [
+    ("stock_prize", "date", STOCK_PRIZE_PERIOD_DAYS),
+    ("stock_prize_weekly", "period", 7),
+    ("stock_prize_monthly", "period", 30),
+]
+
+STORE_TIMEOUT = 60
+STORE_FULL_REFRESH_TIMEOUT = 24 * 60 * 60
+STORE_RETRY_DELAY = 5
+STORE_MAX_RETRY_DELAY = 10 * 60
+
+_series_store = None
+_store_refresh_failures = 0
+_series_store_lock = threading.Lock()
+
+
+def read_sql(query, query_name, params=None):
+    """
+    Runs a query with pandas, recording its duration and the number of returned rows
+    :parameter:
+        - query (str): The SQL query.
+        - query_name (str): The label of the query in the metrics.
+        - params (dict, optional): Bound query parameters.
+    :return:
+        - df (pandas.DataFrame): The query result.
+    """
+    with timed(f"db_{query_name}"), engine.connect() as conn:
+        df = pd.read_sql(sql=query, con=conn.connection, params=params)
+    inc("sp500_db_rows_total", len(df), query=query_name)
+    return df
 
 
 def get_stock_values_from_db():
     """
     Retrieves stock values from the database and returns them as a pandas DataFrame
     :return:
-        - df (pandas.DataFrame) or None: A DataFrame containing columns 'ticker', 'data', 'close'
-        with the stock values retrieved from the database.
+        - df (pandas.DataFrame) or None: A DataFrame containing columns 'id', 'ticker', 'data',
+        'close' with the stock values retrieved from the database.
         If error occurs while loading data, the function returns None
     """
     df = None
-    query = "SELECT ticker, date, close FROM stock_prize ORDER BY date ASC"
+    query = "SELECT id, ticker, date, close FROM stock_prize ORDER BY date ASC"
+    try:
+        df = read_sql(query, "stock_values")
+        return compact_stock_values(df)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def compact_stock_values(df):
+    """
+    Converts stock values to compact column types before they are cached.
+
+    The 'close' column is read from the database as Decimal objects and 'date' as
+    Python dates. Storing them as float64 and datetime64 columns keeps the frame small
+    and fast to serialize into the shared cache.
+
+    :parameter:
+        - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'close'.
+    :return:
+        - df (pandas.DataFrame): The same DataFrame with typed columns.
+    """
+    df["date"] = pd.to_datetime(df["date"])
+    df["close"] = df["close"].astype("float64")
+    return df
+
+
+def choose_resolution(start_date, max_points=None):
+    """
+    Chooses the coarsest table still holding at least the requested number of points, so
+    downsampling to max_points never has fewer rows than requested to pick from. Ranges
+    too short for any rollup are read from the base table.
+
+    :parameter:
+        - start_date (datetime or None): The first date of the range, None for the whole history.
+        - max_points (int or None): The number of points requested, None for full resolution.
+    :return:
+        - (table, date_column) (tuple of str): The table to read and its date column.
+    """
+    if max_points is None or max_points < 2:
+        return RESOLUTIONS[0][:2]
+
+    start_date = start_date or HISTORY_START
+    span_days = (datetime.today() - start_date).days
+    for table, date_column, period_days in reversed(RESOLUTIONS):
+        if span_days / period_days >= max_points:
+            return table, date_column
+    return RESOLUTIONS[0][:2]
+
+
+def get_period_start(start_date, table):
+    """
+    Returns the first period of a table overlapping the range starting at start_date.
+
+    Rollup periods are keyed by their first day, the week or month containing start_date
+    starts before it and would be excluded by a plain comparison.
+
+    :parameter:
+        - start_date (datetime): The first date of the range.
+        - table (str): A table of RESOLUTIONS.
+    :return:
+        - start_date (date): The first date or period to read.
+    """
+    start_date = start_date.date()
+    if table == "stock_prize_weekly":
+        return start_date - timedelta(days=start_date.weekday())
+    if table == "stock_prize_monthly":
+        return start_date.replace(day=1)
+    return start_date
+
+
+def get_stock_values_for_tickers(tickers, start_date=None, max_points=None):
+    """
+    Retrieves stock values of the given tickers from the database, filtered on the server
+    :parameter:
+        - tickers (list of str): Company symbols for which values are requested.
+        - start_date (datetime or None): The first date to include, None for the whole history.
+        - max_points (int or None): Reads the weekly or monthly rollup when the base
+        resolution would return more points per ticker.
+    :return:
+        - df (pandas.DataFrame) or None: A DataFrame containing columns 'ticker', 'date', 'close'
+        sorted by ticker and date. If error occurs while loading data, the function returns None
+    """
+    df = None
+    table, date_column = choose_resolution(start_date, max_points)
+    query = (
+        f"SELECT ticker, {date_column} AS date, close FROM {table} "
+        "WHERE ticker = ANY(%(tickers)s)"
+    )
+    params = {"tickers": list(tickers)}
+    if start_date is not None:
+        query += f" AND {date_column} >= %(start_date)s"
+        params["start_date"] = get_period_start(start_date, table)
+    query += f" ORDER BY ticker, {date_column} ASC"
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(sql=query, con=conn.connection)
+        df = read_sql(query, "stock_values_for_tickers", params)
         return df
     except Exception as e:
         print(f"Database error: {e}")
         return None
 
 
+def get_stock_values_since(last_id):
+    """
+    Retrieves stock values inserted after the given id from the database
+    :parameter:
+        - last_id (int): The ingestion watermark of the caller, see SeriesStore.get_watermark.
+    :return:
+        - df (pandas.DataFrame) or None: A DataFrame containing columns 'id', 'ticker', 'date',
+        'close' with rows whose id is greater than last_id, whatever their date.
+        If error occurs while loading data, the function returns None
+    """
+    df = None
+    query = "SELECT id, ticker, date, close FROM stock_prize WHERE id > %(last_id)s ORDER BY id ASC"
+    try:
+        df = read_sql(query, "stock_values_since", {"last_id": int(last_id)})
+        return compact_stock_values(df)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None
+
+
+def get_stock_values_for_range(tickers, range_option, max_points=None):
+    """
+    Retrieves stock values of the given tickers within the specified data range
+    :parameter:
+        - tickers (list of str): Company symbols for which values are requested.
+        - range_option (str): A string specifying the data range.
+        - max_points (int or None): The number of points requested per ticker.
+    :return:
+        - df (pandas.DataFrame) or None: A DataFrame containing columns 'ticker', 'date', 'close'.
+        If error occurs while loading data, the function returns None
+    """
+    return get_stock_values_for_tickers(tickers, get_range_start(range_option), max_points)
+
+
+EXPORT_COLUMNS = ["ticker", "date", "open", "high", "low", "close", "volume"]
+
+
+def iter_stock_rows(tickers=None, start_date=None, end_date=None, chunk_size=10000):
+    """
+    Streams stock rows from the database through a server-side cursor
+    :parameter:
+        - tickers (list of str or None): Company symbols to export, None for every ticker.
+        - start_date (date or None): The first date to include.
+        - end_date (date or None): The last date to include.
+        - chunk_size (int): The number of rows fetched from the server at once.
+    :return:
+        - chunks (generator of list of tuples): Lists of at most chunk_size rows with the
+        columns of EXPORT_COLUMNS, ordered by ticker and date.
+    """
+    conditions = []
+    params = {}
+    if tickers:
+        conditions.append("ticker = ANY(%(tickers)s)")
+        params["tickers"] = list(tickers)
+    if start_date is not None:
+        conditions.append("date >= %(start_date)s")
+        params["start_date"] = start_date
+    if end_date is not None:
+        conditions.append("date <= %(end_date)s")
+        params["end_date"] = end_date
+
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM stock_prize"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY ticker, date ASC"
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor(name="stock_export") as cur:
+            cur.itersize = chunk_size
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def get_stock_companies_from_db():
     """
     Retrieves stock companies from the database and returns them as a pandas DataFrame
     :return:
-        - df (pandas.DataFrame) or None: A DataFrame containing columns 'ticker', 'name'
+        - df (pandas.DataFrame) or None: A DataFrame containing columns 'ticker', 'name', 'sector'
         retrieved from the database. If error occurs while loading data, the function returns None
     """
     df = None
-    query = "SELECT ticker, name FROM companies"
+    query = "SELECT ticker, name, sector FROM companies"
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(sql=query, con=conn.connection)
+        df = read_sql(query, "companies")
         return df
     except Exception as e:
         print(f"Database error: {e}")
@@ -65,9 +295,156 @@ def get_last_update_from_db():
     df = None
     query = "SELECT date, ticker FROM stock_prize ORDER BY date DESC LIMIT 1"
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(sql=query, con=conn.connection)
+        df = read_sql(query, "last_update")
         return df
     except Exception as e:
         print(f"Database error: {e}")
         return None
+
+
+def get_series_store(loader=None):
+    """
+    Returns the process-wide SeriesStore shared by the page and api routes.
+
+    The store is built once from the stock values. When it is older than STORE_TIMEOUT
+    seconds only the rows inserted after its ingestion watermark are appended, including
+    rows dated before its last date, and it is rebuilt from scratch after
+    STORE_FULL_REFRESH_TIMEOUT seconds. Rows updated in place keep their id and are
+    picked up by the rebuild.
+
+    When PRICE_MATRIX_DIR is set, which it is by default, the store maps the published
+    price matrix instead of loading the table, so every worker of the host shares one
+    copy of the close values. Rows inserted after the matrix was written are read from
+    the database. When no version exists or the current one is older than
+    STORE_FULL_REFRESH_TIMEOUT, the first worker loads the values and publishes a new
+    version. A newly published version replaces the store on the next refresh.
+
+    :parameter:
+        - loader (callable, optional): A function returning a DataFrame with columns
+        'id', 'ticker', 'date', 'close'. Defaults to get_stock_values_from_db. Stores
+        loaded without 'id' are rebuilt on every refresh.
+    :return:
+        - store (SeriesStore) or None: The shared store. If data could not be loaded and
+        no previous store exists, the function returns None
+    """
+    global _series_store
+    store = _series_store
+    if store is not None and time.monotonic() - store.loaded_at < STORE_TIMEOUT:
+        return store
+
+    with _series_store_lock:
+        store = _series_store
+        now = time.monotonic()
+        if store is not None and now - store.loaded_at < STORE_TIMEOUT:
+            return store
+
+        matrix_version = get_current_version()
+        if price_matrix.PRICE_MATRIX_DIR and (
+            matrix_version is None or get_version_age(matrix_version) >= STORE_FULL_REFRESH_TIMEOUT
+        ):
+            matrix_version = publish_price_matrix(loader or get_stock_values_from_db, matrix_version)
+        if matrix_version is not None:
+            if store is None or store.matrix_version != matrix_version:
+                store = SeriesStore.from_price_matrix(open_price_matrix())
+            if store.get_watermark() is not None:
+                _append_new_values(store, now)
+            _series_store = store
+            return store
+
+        if (
+            store is None
+            or store.get_watermark() is None
+            or now - store.built_at >= STORE_FULL_REFRESH_TIMEOUT
+        ):
+            df = (loader or get_stock_values_from_db)()
+            if df is None:
+                return store
+            _series_store = SeriesStore(df)
+        else:
+            _append_new_values(store, now)
+        return _series_store
+
+
+def _append_new_values(store, now):
+    """
+    Appends the rows inserted after the watermark of the store.
+
+    When they cannot be read, the store is kept and its next refresh is deferred by
+    STORE_RETRY_DELAY seconds, doubled on every consecutive failure up to
+    STORE_MAX_RETRY_DELAY, so requests do not query the database while holding the lock.
+
+    :parameter:
+        - store (SeriesStore): The store to refresh.
+        - now (float): The time.monotonic() value of the refresh.
+    """
+    global _store_refresh_failures
+    new_data = get_stock_values_since(store.get_watermark())
+    if new_data is None:
+        delay = min(STORE_RETRY_DELAY * 2 ** _store_refresh_failures, STORE_MAX_RETRY_DELAY)
+        _store_refresh_failures += 1
+        store.loaded_at = now - STORE_TIMEOUT + delay
+        return
+    _store_refresh_failures = 0
+    store.append(new_data)
+
+
+def publish_price_matrix(loader, stale_version):
+    """
+    Loads the stock values and publishes them as the shared price matrix, unless another
+    worker published a new version while this one waited for the lock.
+
+    :parameter:
+        - loader (callable): A function returning a DataFrame with columns 'id', 'ticker',
+        'date', 'close'.
+        - stale_version (str or None): The version seen before taking the lock.
+    :return:
+        - version (str or None): The current version. If the values could not be loaded,
+        the function returns the stale version
+    """
+    with publish_lock():
+        version = get_current_version()
+        if version == stale_version:
+            df = loader()
+            if df is not None and not df.empty:
+                version = write_price_matrix(df)
+    return version
+
+
+def get_ticker_values(tickers, range_option, max_points=None):
+    """
+    Returns stock values of the given tickers within the specified data range.
+
+    Values are served from the shared SeriesStore when a process already holds one.
+    Otherwise only the requested rows are queried, so a one-off request never loads the
+    whole table, and long ranges are read from the coarsest rollup table meeting
+    max_points.
+
+    :parameter:
+        - tickers (list of str): Company symbols for which values are requested.
+        - range_option (str): A string specifying the data range.
+        - max_points (int, optional): Downsamples every series to at most this many points.
+    :return:
+        - values (dict) or None: Mapping of every ticker with values in the range to a
+        DataFrame containing columns 'ticker', 'date', 'close' sorted by date.
+        If error occurs while loading data, the function returns None
+    """
+    store = _series_store
+    if store is not None:
+        values = {}
+        for ticker in tickers:
+            data = store.get_frame(ticker, range_option, max_points)
+            if not data.empty:
+                values[ticker] = data
+        return values
+
+    df = get_stock_values_for_range(tickers, range_option, max_points)
+    if df is None:
+        return None
+    df = compact_stock_values(df)
+    values = {}
+    for ticker, data in df.groupby("ticker", sort=False):
+        dates, closes = downsample_series(
+            data["date"].to_numpy(), data["close"].to_numpy(), max_points
+        )
+        values[str(ticker)] = pd.DataFrame({"ticker": str(ticker), "date": dates, "close": closes})
+    return values
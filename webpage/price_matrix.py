@@ -0,0 +1,224 @@
+"""
+Dense dates x tickers matrix of close values shared by the web workers through numpy.memmap.
+
+The first worker loading the stock values publishes them as a matrix, the other workers of
+the host map the same file. Run 'python price_matrix.py' to publish a new version right
+after import_hist_data.py loaded new data. The matrix is written to a new version directory
+under PRICE_MATRIX_DIR and published by atomically replacing the CURRENT pointer file, so
+readers never see a partial matrix. Setting PRICE_MATRIX_DIR to an empty value disables it.
+"""
+import fcntl
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from store import WATERMARK_OVERLAP
+
+load_dotenv()
+
+PRICE_MATRIX_DIR = os.getenv(
+    "PRICE_MATRIX_DIR", os.path.join(tempfile.gettempdir(), "sp500_price_matrix")
+) or None
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+VERSION_FORMAT = "%Y%m%dT%H%M%S%f"
+KEEP_VERSIONS = 2
+
+
+class PriceMatrix:
+    """
+    Read-only view of a price matrix version.
+
+    'closes' is a memory-mapped float64 matrix with one row per date and one column per
+    ticker, stored column-major so that the series of a ticker is one contiguous block.
+    Every process mapping the file shares the same pages of the operating system cache.
+    """
+
+    def __init__(self, path, version):
+        """
+        :parameter:
+            - path (str): The directory of the version.
+            - version (str): The version name.
+        """
+        self.version = version
+        self.dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        self.closes = np.load(os.path.join(path, "closes.npy"), mmap_mode="r")
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.tickers = meta["tickers"]
+        self.starts = meta["starts"]
+        self.ends = meta["ends"]
+        self.complete = meta["complete"]
+        self.last_id = meta.get("last_id")
+        self.recent_ids = meta.get("recent_ids", [])
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def get_series(self, column):
+        """
+        Returns dates and close values of the ticker in a column.
+
+        :parameter:
+            - column (int): The column of the ticker.
+        :return:
+            - (dates, closes) (tuple of numpy.ndarray): Zero-copy views of the mapped arrays
+            from the first to the last value of the ticker. Series with missing dates in
+            between are compacted into new arrays.
+        """
+        start, end = self.starts[column], self.ends[column]
+        dates = self.dates[start:end]
+        closes = self.closes[start:end, column]
+        if not self.complete[column]:
+            present = ~np.isnan(closes)
+            dates, closes = dates[present], closes[present]
+        return dates, closes
+
+
+def write_price_matrix(df, directory=None):
+    """
+    Writes stock values as a new price matrix version and publishes it.
+
+    :parameter:
+        - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'close'
+        and optionally the stock_prize 'id', whose watermark is stored with the version.
+        - directory (str, optional): The price matrix directory. Defaults to PRICE_MATRIX_DIR.
+    :return:
+        - version (str): The name of the published version.
+    """
+    directory = directory or PRICE_MATRIX_DIR
+    tickers, ticker_columns = np.unique(df["ticker"].to_numpy(dtype=str), return_inverse=True)
+    dates, date_rows = np.unique(
+        pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]"), return_inverse=True
+    )
+
+    closes = np.full((len(dates), len(tickers)), np.nan, order="F")
+    closes[date_rows, ticker_columns] = df["close"].to_numpy(dtype=np.float64)
+
+    present = ~np.isnan(closes)
+    starts = present.argmax(axis=0)
+    ends = len(dates) - present[::-1].argmax(axis=0)
+    meta = {
+        "tickers": tickers.tolist(),
+        "starts": starts.tolist(),
+        "ends": ends.tolist(),
+        "complete": (present.sum(axis=0) == ends - starts).tolist(),
+    }
+    if "id" in df.columns and not df.empty:
+        ids = df["id"].to_numpy(dtype=np.int64)
+        meta["last_id"] = int(ids.max())
+        meta["recent_ids"] = np.sort(ids[ids > meta["last_id"] - WATERMARK_OVERLAP]).tolist()
+
+    os.makedirs(directory, exist_ok=True)
+    version = datetime.now().strftime(VERSION_FORMAT)
+    temporary_path = os.path.join(directory, f".{version}.tmp")
+    os.makedirs(temporary_path)
+    _save_synced(os.path.join(temporary_path, "dates.npy"), lambda f: np.save(f, dates))
+    _save_synced(os.path.join(temporary_path, "closes.npy"), lambda f: np.save(f, closes))
+    _save_synced(os.path.join(temporary_path, "meta.json"), lambda f: f.write(json.dumps(meta).encode()))
+    os.rename(temporary_path, os.path.join(directory, version))
+
+    pointer_path = os.path.join(directory, f".{CURRENT_FILE}.tmp")
+    _save_synced(pointer_path, lambda f: f.write(version.encode()))
+    os.replace(pointer_path, os.path.join(directory, CURRENT_FILE))
+
+    _remove_old_versions(directory, version)
+    return version
+
+
+def _save_synced(path, write):
+    with open(path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _remove_old_versions(directory, current):
+    # Processes still mapping a removed version keep reading it until they reopen.
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith(".") and name != CURRENT_FILE and name != current
+    )
+    for name in versions[:max(len(versions) - KEEP_VERSIONS + 1, 0)]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def get_current_version(directory=None):
+    """
+    Returns the name of the published price matrix version, or None if there is none.
+    """
+    directory = directory or PRICE_MATRIX_DIR
+    if not directory:
+        return None
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def get_version_age(version):
+    """
+    Returns the number of seconds since a version was published.
+    """
+    return (datetime.now() - datetime.strptime(version, VERSION_FORMAT)).total_seconds()
+
+
+@contextmanager
+def publish_lock(directory=None):
+    """
+    Holds an exclusive lock of the price matrix directory, so that only one worker of a
+    host loads the stock values and publishes them while the others wait for the result.
+    """
+    directory = directory or PRICE_MATRIX_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def open_price_matrix(directory=None):
+    """
+    Maps the published price matrix version.
+
+    :parameter:
+        - directory (str, optional): The price matrix directory. Defaults to PRICE_MATRIX_DIR.
+    :return:
+        - matrix (PriceMatrix) or None: The mapped matrix. If no directory is configured or
+        no version was published, the function returns None
+    """
+    directory = directory or PRICE_MATRIX_DIR
+    version = get_current_version(directory)
+    if version is None:
+        return None
+    return PriceMatrix(os.path.join(directory, version), version)
+
+
+def main(directory=None):
+    from models import get_stock_values_from_db
+
+    directory = directory or PRICE_MATRIX_DIR
+    if not directory:
+        raise ValueError("PRICE_MATRIX_DIR is not set")
+
+    df = get_stock_values_from_db()
+    if df is None:
+        raise RuntimeError("Stock values could not be loaded from database")
+
+    version = write_price_matrix(df, directory)
+    print(f"Price matrix {version} written to {directory} ({len(df)} rows)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
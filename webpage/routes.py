@@ -1,3 +1,6 @@
+import hashlib
+from datetime import date
+
 import numpy as np
 import pandas as pd
 from flask import Blueprint, render_template, request, jsonify, current_app as app
@@ -6,24 +9,36 @@ import plotly.graph_objects as go
 
 from utils import (
     calculate_last_change,
-    filter_by_range,
     calculate_pct_change_for_range,
     get_value,
+    get_range_start,
+    parse_max_points,
+    parse_range_option,
 )
 from models import (
     get_stock_values_from_db,
     get_stock_companies_from_db,
     get_last_update_from_db,
+    get_series_store,
+    get_stock_values_since,
 )
 from extensions import cache
+from indicators import is_price_indicator, max_drawdown, parse_indicators
+from metrics import inc, timed
+from search import get_company_index
+from store import WATERMARK_OVERLAP
 
 main_routes = Blueprint("main_routes", __name__)
 
+FULL_REFRESH_TIMEOUT = 24 * 60 * 60
+CHART_TIMEOUT = 24 * 60 * 60
+
 
 def get_cached_stock_companies():
     cache_key = 'companies_data'
 
     cached_data = cache.get(cache_key)
+    inc("sp500_cache_requests_total", cache="companies", result="miss" if cached_data is None else "hit")
     if cached_data is None:
         cached_data = get_stock_companies_from_db()
         cache.set(cache_key, cached_data, timeout=60)
@@ -33,32 +48,131 @@ def get_cached_stock_companies():
 
 def get_cached_stock_values():
     cache_key = 'values_data'
+    fresh_key = 'values_data_fresh'
 
     cached_data = cache.get(cache_key)
+    inc("sp500_cache_requests_total", cache="values", result="miss" if cached_data is None else "hit")
     if cached_data is None:
         cached_data = get_stock_values_from_db()
-        cache.set(cache_key, cached_data, timeout=60)
+        if cached_data is not None:
+            cache.set(cache_key, cached_data, timeout=FULL_REFRESH_TIMEOUT)
+            cache.set(fresh_key, True, timeout=60)
+    elif cache.get(fresh_key) is None and "id" in cached_data.columns and not cached_data.empty:
+        new_data = get_stock_values_since(int(cached_data["id"].max()) - WATERMARK_OVERLAP)
+        if new_data is not None:
+            new_data = new_data[~new_data["id"].isin(cached_data["id"])]
+            if not new_data.empty:
+                cached_data = pd.concat([cached_data, new_data], ignore_index=True)
+                cache.set(cache_key, cached_data, timeout=FULL_REFRESH_TIMEOUT)
+            cache.set(fresh_key, True, timeout=60)
 
     return cached_data
 
 
+def get_cached_series_store():
+    return get_series_store(get_cached_stock_values)
+
+
+def get_cached_company_index():
+    return get_company_index(get_cached_stock_companies)
+
+
+def get_stock_metrics(store, data, ticker, range_option):
+    """
+    Returns 'pct_change', 'last_change' and 'last_value' of a ticker within the data range.
+
+    Values are read from the store summary table and only computed from the
+    range-filtered data when the summary has no entry for the ticker.
+
+    :parameter:
+        - store (SeriesStore): The store the data was read from.
+        - data (pandas.DataFrame): The range-filtered stock data of the ticker.
+        - ticker (str): A company symbol.
+        - range_option (str): A string specifying the data range.
+    :return:
+        - metrics (tuple): The percentage change, the value change and the last value.
+    """
+    metrics = store.get_summary().get(ticker, range_option)
+    if metrics is not None:
+        return metrics["pct_change"], metrics["last_change"], metrics["last_value"]
+
+    return (
+        calculate_pct_change_for_range(data, ticker),
+        calculate_last_change(data, ticker),
+        get_value(data, ticker),
+    )
+
+
+def get_data_version(store):
+    """
+    Returns a stamp identifying the data a chart is built from.
+
+    The stamp combines the number of rows and the ingestion watermark of the store, which
+    change with every appended row whatever its date, with the current day, because range
+    cutoffs move with the date even when no new data was loaded. Workers holding the same
+    rows return the same stamp.
+
+    :parameter:
+        - store (SeriesStore): The store the chart is built from.
+    :return:
+        - version (str): The data version stamp.
+    """
+    return f"{store.row_count}:{store.last_id}:{pd.Timestamp(store.max_date).date()}:{date.today()}"
+
+
+def make_chart_etag(*parts):
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def get_chart_response(etag, build_payload):
+    """
+    Returns a chart payload for the ETag, answering '304 Not Modified' when the client
+    already holds it and building the payload only on a cache miss.
+
+    :parameter:
+        - etag (str): The strong ETag of the payload.
+        - build_payload (callable): A function building the payload dictionary.
+    :return:
+        Response: A Flask 'Response' object with the JSON payload and its ETag.
+    """
+    if request.if_none_match.contains(etag):
+        inc("sp500_cache_requests_total", cache="chart", result="not_modified")
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+
+    cache_key = f"chart_{etag}"
+    payload = cache.get(cache_key)
+    inc("sp500_cache_requests_total", cache="chart", result="miss" if payload is None else "hit")
+    if payload is None:
+        payload = build_payload()
+        cache.set(cache_key, payload, timeout=CHART_TIMEOUT)
+
+    with timed("json_encode"):
+        response = jsonify(payload)
+    response.set_etag(etag)
+    # Browsers keep the chart and revalidate it with If-None-Match on the next GET.
+    response.cache_control.no_cache = True
+    return response
+
+
 @main_routes.route("/")
 def index():
     """
     Route handler for the root URL ('/')
 
     Retrieves stock company data from database and renders 'index.html' template with
-    the list of unique stock company names and the last update date.
+    the last update date. Company names are looked up by the page through '/api/search'.
 
     :return:
         Response: A Flask 'Response' object that renders the 'index.html' template with the:
-            - 'stocks' (list of str): List of unique stock company names.
             - 'last_update' (str): The date of the last update in 'YYYY-MM-DD' format.
     """
-    pandas_companies_df = get_cached_stock_companies()
+    company_index = get_cached_company_index()
 
     try:
-        if pandas_companies_df is None:
+        if company_index is None:
             raise Exception("Data could not be loaded from database.")
 
         last_update_df = get_last_update_from_db()
@@ -67,7 +181,6 @@ def index():
 
         return render_template(
             "index.html",
-            stocks=list(pandas_companies_df["name"].unique()),
             last_update=last_update_str,
         )
     except Exception as e:
@@ -75,16 +188,22 @@ def index():
         return jsonify({"Database error": str(e)}), 500
 
 
-@main_routes.route("/get_stock_data", methods=["POST"])
+@main_routes.route("/get_stock_data", methods=["GET", "POST"])
 def get_stock_data():
     """
     Route handler for the  URL ('/get_stock_data')
 
-    Process a request to retrieve stock data for a given company ticker.
+    Process a request to retrieve stock data for a given company ticker. Parameters are
+    read from the query string, or from the form of POST requests. GET responses carry
+    an ETag and are answered with '304 Not Modified' while the data is unchanged.
 
     :parameter:
         - 'ticker' (str): the name of the company for which stock is requested.
         - 'range' (str): the data range for filtering the stock data.
+        - 'max_points' (int, optional): the maximum number of chart points, the series is
+        downsampled when it is longer.
+        - 'indicators' (str, optional): comma separated indicators drawn on the chart, such
+        as 'sma20,ema50,volatility20,drawdown'.
     :return:
         Response: A Flask 'Response' object with a JSON payload containing:
             - 'graph' (str): A JSON string representation of the line chart of stock prices.
@@ -92,45 +211,39 @@ def get_stock_data():
             - 'name' (str): the company name provided in the request.
             - 'ticker' (str): the company ticker symbol.
             - 'last_value' (int or float): the stock value from last week.
+            - 'max_drawdown' (float): the largest decline within the range in percent,
+            only when 'drawdown' is requested.
     """
-    name = request.form["ticker"]
-    range_option = request.form["range"]
-
-    pandas_companies_df = get_cached_stock_companies()
-    pandas_value_df = get_cached_stock_values()
-
-    matching_rows = pandas_companies_df.loc[
-        pandas_companies_df["name"] == name, "ticker"
-    ]
-
-    if not matching_rows.empty:
-        ticker = matching_rows.iloc[0]
-
-        if ticker in pandas_value_df["ticker"].unique():
-            data = pandas_value_df[pandas_value_df["ticker"] == ticker].copy()
-
-            data = filter_by_range(data, range_option)
-
-            pct_change = calculate_pct_change_for_range(data, ticker)
-
-            last_change = calculate_last_change(data, ticker)
-
-            last_value = get_value(data, ticker)
-
-            fig = px.line(data, x="date", y="close")
-            graphJSON = fig.to_json()
-
-            stored_first_data = data
-
-            return jsonify(
-                {
-                    "graph": graphJSON,
-                    "pct_change": pct_change,
-                    "name": name,
-                    "ticker": ticker,
-                    "last_change": last_change,
-                    "last_value": last_value,
-                }
+    name = request.values["ticker"]
+    try:
+        range_option = parse_range_option(request.values["range"])
+        max_points = parse_max_points(request.values.get("max_points"))
+        indicators = parse_indicators(request.values.get("indicators"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    company_index = get_cached_company_index()
+    store = get_cached_series_store()
+
+    ticker = company_index.resolve_name(name) if company_index is not None else None
+
+    if ticker is not None:
+
+        if store is not None and ticker in store:
+            etag = make_chart_etag(
+                "stock",
+                name,
+                ticker,
+                range_option,
+                max_points,
+                ",".join(indicators),
+                get_data_version(store),
+            )
+            return get_chart_response(
+                etag,
+                lambda: build_stock_chart(
+                    store, name, ticker, range_option, max_points, indicators
+                ),
             )
         else:
             return jsonify({"error": "Stock ticker not found"})
@@ -138,94 +251,161 @@ def get_stock_data():
         return jsonify({"error": "Company name not found"})
 
 
-@main_routes.route("/compare_stocks", methods=["POST"])
+def build_stock_chart(store, name, ticker, range_option, max_points=None, indicators=()):
+    with timed("select_range"):
+        data = store.get_frame(ticker, range_option, max_points, indicators)
+
+    with timed("metrics"):
+        pct_change, last_change, last_value = get_stock_metrics(
+            store, data, ticker, range_option
+        )
+
+    with timed("figure"):
+        price_indicators = [name for name in indicators if is_price_indicator(name)]
+        fig = px.line(data, x="date", y=["close", *price_indicators] if price_indicators else "close")
+        for indicator in indicators:
+            if not is_price_indicator(indicator):
+                fig.add_trace(
+                    go.Scatter(
+                        x=data["date"], y=data[indicator], mode="lines", name=indicator, yaxis="y2"
+                    )
+                )
+        if len(price_indicators) < len(indicators):
+            fig.update_layout(yaxis2=dict(title="%", overlaying="y", side="right"))
+
+    with timed("figure_json"):
+        graphJSON = fig.to_json()
+
+    payload = {
+        "graph": graphJSON,
+        "pct_change": pct_change,
+        "name": name,
+        "ticker": ticker,
+        "last_change": last_change,
+        "last_value": last_value,
+    }
+    if "drawdown" in indicators:
+        payload["max_drawdown"] = max_drawdown(
+            store.get_series(ticker, get_range_start(range_option))[1]
+        )
+    return payload
+
+
+@main_routes.route("/compare_stocks", methods=["GET", "POST"])
 def compare_stocks():
     """
     Route handler for the  URL ('/compare_stocks')
 
     Compare stock prices for two given companies and generates a line chart showing historical stock values.
+    Parameters are read from the query string, or from the form of POST requests.
 
     :parameter:
         - 'first_ticker' (str): the name of the first company to compare.
         - 'second_ticker' (str): the name of the second company to compare
         - 'range' (str): the data range for filtering the stock data.
+        - 'max_points' (int, optional): the maximum number of chart points per stock.
     :return:
         Response: A Flask 'Response' object with a JSON payload containing:
             - 'graph' (str): A JSON string representation of the line chart of stock prices.
     """
-    first_ticker = request.form["first_ticker"]
-    second_ticker = request.form["second_ticker"]
-    range_option = request.form["range"]
+    first_ticker = request.values["first_ticker"]
+    second_ticker = request.values["second_ticker"]
+    try:
+        range_option = parse_range_option(request.values["range"])
+        max_points = parse_max_points(request.values.get("max_points"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    pandas_companies_df = get_cached_stock_companies()
-    pandas_value_df = get_cached_stock_values()
+    company_index = get_cached_company_index()
+    store = get_cached_series_store()
 
-    if "stored_first_date" in globals() and stored_first_data is not None:
-        first_data = stored_first_data
-        first_last_value = stored_first_data["close"].iloc[-1]
-        first_pct_change = calculate_pct_change_for_range(first_data, first_ticker)
-    else:
-        matching_first_rows = pandas_companies_df.loc[
-            pandas_companies_df["name"] == first_ticker, "ticker"
-        ]
-        if not matching_first_rows.empty:
-            first_ticker_symbol = matching_first_rows.iloc[0]
-            first_data = pandas_value_df[
-                pandas_value_df["ticker"] == first_ticker_symbol
-            ].copy()
-            first_data = filter_by_range(first_data, range_option)
-
-            first_last_value = first_data["close"].iloc[-1]
-            first_pct_change = calculate_pct_change_for_range(first_data, first_ticker_symbol)
-            first_last_change = calculate_last_change(first_data, first_ticker_symbol)
-        else:
-            return jsonify({"error": "First company name not found"})
-
-    matching_second_rows = pandas_companies_df.loc[
-        pandas_companies_df["name"] == second_ticker, "ticker"
-    ]
-    if not matching_second_rows.empty:
-        second_ticker_symbol = matching_second_rows.iloc[0]
-        second_data = pandas_value_df[
-            pandas_value_df["ticker"] == second_ticker_symbol
-        ].copy()
-        second_data = filter_by_range(second_data, range_option)
-
-        second_last_value = second_data["close"].iloc[-1]
-        second_pct_change = calculate_pct_change_for_range(second_data, second_ticker_symbol)
-        second_last_change = calculate_last_change(second_data, second_ticker_symbol)
-    else:
+    if store is None or company_index is None:
+        return jsonify({"error": "Stock data could not be loaded"})
+
+    first_ticker_symbol = company_index.resolve_name(first_ticker)
+    if first_ticker_symbol is None:
+        return jsonify({"error": "First company name not found"})
+
+    second_ticker_symbol = company_index.resolve_name(second_ticker)
+    if second_ticker_symbol is None:
         return jsonify({"error": "Second company name not found"})
 
-    fig = go.Figure()
-    fig.add_trace(
-        go.Scatter(
-            x=first_data["date"],
-            y=first_data["close"],
-            mode="lines",
-            name=first_ticker,
-            line=dict(color="blue"),
-        )
+    etag = make_chart_etag(
+        "compare",
+        first_ticker,
+        first_ticker_symbol,
+        second_ticker,
+        second_ticker_symbol,
+        range_option,
+        max_points,
+        get_data_version(store),
     )
-    fig.add_trace(
-        go.Scatter(
-            x=second_data["date"],
-            y=second_data["close"],
-            mode="lines",
-            name=second_ticker,
-            line=dict(color="red"),
-        )
+    return get_chart_response(
+        etag,
+        lambda: build_comparison_chart(
+            store,
+            first_ticker,
+            first_ticker_symbol,
+            second_ticker,
+            second_ticker_symbol,
+            range_option,
+            max_points,
+        ),
     )
 
-    fig.update_layout(
-        title=f"{first_ticker} vs {second_ticker} Stock Prizes",
-        xaxis_title="Date",
-        yaxis_title="Price",
-    )
 
-    graphJSON = fig.to_json()
+def build_comparison_chart(
+    store,
+    first_ticker,
+    first_ticker_symbol,
+    second_ticker,
+    second_ticker_symbol,
+    range_option,
+    max_points=None,
+):
+    with timed("select_range"):
+        first_data = store.get_frame(first_ticker_symbol, range_option, max_points)
+        second_data = store.get_frame(second_ticker_symbol, range_option, max_points)
+
+    with timed("metrics"):
+        first_pct_change, first_last_change, first_last_value = get_stock_metrics(
+            store, first_data, first_ticker_symbol, range_option
+        )
+        second_pct_change, second_last_change, second_last_value = get_stock_metrics(
+            store, second_data, second_ticker_symbol, range_option
+        )
+
+    with timed("figure"):
+        fig = go.Figure()
+        fig.add_trace(
+            go.Scatter(
+                x=first_data["date"],
+                y=first_data["close"],
+                mode="lines",
+                name=first_ticker,
+                line=dict(color="blue"),
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=second_data["date"],
+                y=second_data["close"],
+                mode="lines",
+                name=second_ticker,
+                line=dict(color="red"),
+            )
+        )
 
-    response_data = {
+        fig.update_layout(
+            title=f"{first_ticker} vs {second_ticker} Stock Prizes",
+            xaxis_title="Date",
+            yaxis_title="Price",
+        )
+
+    with timed("figure_json"):
+        graphJSON = fig.to_json()
+
+    return {
         "graph": graphJSON,
         "first_stock": {
             "name": first_ticker_symbol,
@@ -240,5 +420,3 @@ def compare_stocks():
             "pct_change": second_pct_change
         }
     }
-
-    return jsonify(response_data)
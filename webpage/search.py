@@ -0,0 +1,133 @@
+import bisect
+import threading
+import time
+
+COMPANY_INDEX_TIMEOUT = 60
+
+_company_index = None
+_company_index_lock = threading.Lock()
+
+
+class CompanyIndex:
+    """
+    In-memory lookup of companies by name and ticker.
+
+    Exact name and ticker resolution are dictionary lookups. Prefix search runs a binary
+    search over sorted lowercase names and tickers, so its cost grows with the number of
+    matches rather than with the number of companies.
+    """
+
+    def __init__(self, df):
+        """
+        :parameter:
+            - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'name' and
+            optionally 'sector'.
+        """
+        self.loaded_at = time.monotonic()
+        self.ticker_by_name = {}
+        self.name_by_ticker = {}
+        self.tickers_by_sector = {}
+        for ticker, name in zip(df["ticker"], df["name"]):
+            self.ticker_by_name.setdefault(name, ticker)
+            self.name_by_ticker.setdefault(ticker, name)
+        if "sector" in df:
+            for ticker, sector in zip(df["ticker"], df["sector"]):
+                if sector:
+                    self.tickers_by_sector.setdefault(sector.lower(), []).append(ticker)
+
+        self._names = sorted((name.lower(), name) for name in self.ticker_by_name)
+        self._tickers = sorted((ticker.lower(), ticker) for ticker in self.name_by_ticker)
+
+    def __len__(self):
+        return len(self.name_by_ticker)
+
+    @property
+    def names(self):
+        return [name for _, name in self._names]
+
+    def resolve_name(self, name):
+        """
+        Returns the ticker of a company name, or None if the name is unknown.
+        """
+        return self.ticker_by_name.get(name)
+
+    def resolve_ticker(self, ticker):
+        """
+        Returns the company name of a ticker, or None if the ticker is unknown.
+        """
+        return self.name_by_ticker.get(ticker)
+
+    def get_sector_tickers(self, sector):
+        """
+        Returns the tickers of a GICS sector, or an empty list if the sector is unknown.
+        """
+        return self.tickers_by_sector.get(sector.strip().lower(), [])
+
+    @staticmethod
+    def _prefix_matches(entries, prefix):
+        start = bisect.bisect_left(entries, (prefix,))
+        for key, value in entries[start:]:
+            if not key.startswith(prefix):
+                break
+            yield value
+
+    def search(self, query, limit=10):
+        """
+        Returns companies whose ticker or name starts with the query.
+
+        Results are ranked as exact ticker matches, exact name matches, ticker prefix
+        matches and name prefix matches, alphabetically within each group.
+
+        :parameter:
+            - query (str): The case-insensitive prefix to look for.
+            - limit (int): The maximum number of results.
+        :return:
+            - results (list of dict): Dictionaries with keys 'ticker' and 'name'.
+        """
+        prefix = query.strip().lower()
+        if not prefix or limit <= 0:
+            return []
+
+        ranked = []
+        for ticker in self._prefix_matches(self._tickers, prefix):
+            rank = 0 if ticker.lower() == prefix else 2
+            ranked.append((rank, ticker, self.name_by_ticker[ticker]))
+        for name in self._prefix_matches(self._names, prefix):
+            rank = 1 if name.lower() == prefix else 3
+            ranked.append((rank, self.ticker_by_name[name], name))
+
+        results = []
+        seen = set()
+        for _, ticker, name in sorted(ranked, key=lambda match: (match[0], match[2].lower())):
+            if ticker in seen:
+                continue
+            seen.add(ticker)
+            results.append({"ticker": ticker, "name": name})
+            if len(results) == limit:
+                break
+        return results
+
+
+def get_company_index(loader):
+    """
+    Returns the process-wide CompanyIndex, rebuilt when it is older than
+    COMPANY_INDEX_TIMEOUT seconds.
+
+    :parameter:
+        - loader (callable): A function returning a DataFrame with columns 'ticker', 'name'.
+    :return:
+        - index (CompanyIndex) or None: The shared index. If data could not be loaded and
+        no previous index exists, the function returns None
+    """
+    global _company_index
+    index = _company_index
+    if index is not None and time.monotonic() - index.loaded_at < COMPANY_INDEX_TIMEOUT:
+        return index
+
+    with _company_index_lock:
+        index = _company_index
+        if index is None or time.monotonic() - index.loaded_at >= COMPANY_INDEX_TIMEOUT:
+            df = loader()
+            if df is not None:
+                _company_index = CompanyIndex(df)
+        return _company_index
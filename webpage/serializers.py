@@ -0,0 +1,185 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/x-msgpack"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+RESPONSE_FORMATS = {
+    "records": JSON_MIMETYPE,
+    "columns": JSON_MIMETYPE,
+    "msgpack": MSGPACK_MIMETYPE,
+    "arrow": ARROW_MIMETYPE,
+}
+
+
+def get_response_format(request):
+    """
+    Negotiates the response format of an api request.
+
+    The 'format' query parameter takes precedence over the 'Accept' header. JSON requests
+    default to the 'records' format, binary formats are chosen by their mimetype.
+
+    :parameter:
+        - request (flask.Request): The current request.
+    :return:
+        - response_format (str): One of 'records', 'columns', 'msgpack', 'arrow', or the
+        unknown value passed in the 'format' parameter.
+    """
+    response_format = request.args.get("format")
+    if response_format:
+        return response_format
+
+    best_match = request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, MSGPACK_MIMETYPE, ARROW_MIMETYPE], default=JSON_MIMETYPE
+    )
+    if best_match == MSGPACK_MIMETYPE:
+        return "msgpack"
+    if best_match == ARROW_MIMETYPE:
+        return "arrow"
+    return "records"
+
+
+def is_format_available(response_format):
+    if response_format == "msgpack":
+        return msgpack is not None
+    if response_format == "arrow":
+        return pa is not None
+    return response_format in RESPONSE_FORMATS
+
+
+def frame_to_columns(data):
+    """
+    Converts stock data of a single ticker to split arrays.
+
+    :parameter:
+        - data (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'close'
+        and optionally indicator columns.
+    :return:
+        - columns (dict): A dictionary with 'dates' as ISO 8601 strings, 'close' and every
+        other column as float64 arrays, without repeating the ticker on every row.
+    """
+    dates = pd.to_datetime(data["date"]).to_numpy(dtype="datetime64[D]")
+    columns = {"dates": np.datetime_as_string(dates, unit="D").tolist()}
+    for column in data.columns:
+        if column not in ("ticker", "date"):
+            columns[column] = data[column].to_numpy(dtype=np.float64)
+    return columns
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "f":
+            # NaN is not valid JSON, it is encoded as null like orjson does.
+            return np.where(np.isnan(obj), None, obj).tolist()
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def columns_response(payload, response_format):
+    """
+    Encodes a payload of split arrays in the negotiated format.
+
+    :parameter:
+        - payload (dict): A dictionary built from frame_to_columns results.
+        - response_format (str): 'columns' or 'msgpack'.
+    :return:
+        Response: A Flask 'Response' object with the encoded payload.
+    """
+    if response_format == "msgpack":
+        body = msgpack.packb(payload, default=_default)
+    else:
+        body = dumps_json(payload)
+    return Response(body, mimetype=RESPONSE_FORMATS[response_format])
+
+
+def arrow_response(data):
+    """
+    Encodes stock data as an Arrow IPC stream.
+
+    :parameter:
+        - data (pandas.DataFrame): A DataFrame of stock data, such as columns 'ticker',
+        'date', 'close' or a 'date' column followed by one column per ticker.
+    :return:
+        Response: A Flask 'Response' object with the Arrow IPC stream.
+    """
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_MIMETYPE)
+
+
+def iter_ndjson(chunks, columns):
+    """
+    Encodes chunks of rows as newline delimited JSON objects.
+
+    :parameter:
+        - chunks (iterable of list of tuples): Rows grouped in chunks.
+        - columns (list of str): The column names of the rows.
+    :return:
+        - lines (generator of bytes): One encoded block per chunk.
+    """
+    for rows in chunks:
+        yield b"".join(dumps_json(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def iter_csv(chunks, columns):
+    """
+    Encodes chunks of rows as CSV, starting with a header line.
+
+    :parameter:
+        - chunks (iterable of list of tuples): Rows grouped in chunks.
+        - columns (list of str): The column names of the rows.
+    :return:
+        - lines (generator of str): The header and one encoded block per chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
@@ -0,0 +1,318 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from downsample import downsample_series
+from indicators import Indicator
+from summary import SummaryTable
+from utils import get_range_start
+
+DOWNSAMPLED_CACHE_SIZE = 1024
+INDICATORS_PER_TICKER = 8
+WATERMARK_OVERLAP = 10000
+
+
+class LRUCache:
+    """
+    Thread-safe mapping holding at most 'size' entries. Reading an entry marks it as
+    recently used, storing a new entry evicts the least recently used one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def values(self):
+        with self.lock:
+            return list(self.entries.values())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SeriesStore:
+    """
+    In-memory columnar store of stock close values keyed by ticker.
+
+    Every ticker holds two NumPy arrays sorted by date: 'dates' (datetime64) and
+    'closes' (float64). Selecting a data range is a dictionary lookup followed by a
+    binary search, so the cost of a request does not depend on the number of tickers
+    or years held in the store.
+    """
+
+    def __init__(self, df):
+        """
+        :parameter:
+            - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'close'
+            and optionally the stock_prize 'id' used as ingestion watermark.
+        """
+        self.series = {}
+        self.max_date = None
+        self.row_count = 0
+        self.version = 0
+        self._summary = None
+        self._downsampled = LRUCache(DOWNSAMPLED_CACHE_SIZE)
+        self._downsampled_day = date.today()
+        self._indicators = {}
+        # Held while a series is swapped and its indicators updated, so no indicator is
+        # computed from closes of another length than the stored series.
+        self._indicators_lock = threading.RLock()
+        self.last_id = None
+        self._recent_ids = set()
+        self.matrix_version = None
+        self.built_at = self.loaded_at = time.monotonic()
+        if df is not None and not df.empty:
+            self._load(df)
+
+    @classmethod
+    def from_price_matrix(cls, matrix):
+        """
+        Builds a store on top of a memory-mapped price matrix without copying its series.
+
+        :parameter:
+            - matrix (PriceMatrix): The mapped price matrix.
+        :return:
+            - store (SeriesStore): A store whose series are views of the matrix.
+        """
+        store = cls(None)
+        for column, ticker in enumerate(matrix.tickers):
+            dates, closes = matrix.get_series(column)
+            if len(dates):
+                store.series[ticker] = (dates, closes)
+                store.row_count += len(dates)
+                if store.max_date is None or dates[-1] > store.max_date:
+                    store.max_date = dates[-1]
+        if matrix.last_id is not None:
+            store._track_ids(np.array([matrix.last_id, *matrix.recent_ids], dtype=np.int64))
+        store.matrix_version = matrix.version
+        store.version += 1
+        return store
+
+    @staticmethod
+    def _split_by_ticker(df):
+        tickers = df["ticker"].to_numpy()
+        dates = pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]")
+        closes = df["close"].to_numpy(dtype=np.float64)
+
+        order = np.lexsort((dates, tickers))
+        tickers, dates, closes = tickers[order], dates[order], closes[order]
+
+        unique_tickers, starts = np.unique(tickers, return_index=True)
+        ends = np.append(starts[1:], len(tickers))
+        for ticker, start, end in zip(unique_tickers, starts, ends):
+            yield str(ticker), dates[start:end], closes[start:end]
+
+    def _load(self, df):
+        for ticker, dates, closes in self._split_by_ticker(df):
+            self.series[ticker] = (dates, closes)
+            if self.max_date is None or dates[-1] > self.max_date:
+                self.max_date = dates[-1]
+        if "id" in df.columns:
+            self._track_ids(df["id"].to_numpy(dtype=np.int64))
+        self.row_count = len(df)
+        self.version += 1
+
+    def _track_ids(self, ids):
+        if not len(ids):
+            return
+        self.last_id = max(int(ids.max()), self.last_id or 0)
+        floor = self.last_id - WATERMARK_OVERLAP
+        self._recent_ids = {i for i in self._recent_ids if i > floor} | set(ids[ids > floor].tolist())
+
+    def get_watermark(self):
+        """
+        Returns the id after which the next incremental refresh reads stock_prize rows.
+
+        Ids are assigned when a row is inserted but become visible when its transaction
+        commits, so concurrent loads can commit a lower id after a higher one was read.
+        The watermark therefore lags the last loaded id by WATERMARK_OVERLAP and append
+        skips the rows it already holds.
+
+        :return:
+            - watermark (int or None): The id, None when the store was built without ids.
+        """
+        if self.last_id is None:
+            return None
+        return self.last_id - WATERMARK_OVERLAP
+
+    def append(self, df):
+        """
+        Appends new stock values to the store without rebuilding the existing series.
+
+        :parameter:
+            - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'close'
+            and optionally 'id'. Rows may be dated before the ones already held, rows
+            whose id was already loaded are skipped.
+        :return:
+            - count (int): The number of appended rows.
+        """
+        self.loaded_at = time.monotonic()
+        if df is None or df.empty:
+            return 0
+
+        if "id" in df.columns:
+            ids = df["id"].to_numpy(dtype=np.int64)
+            new = ~np.isin(ids, np.fromiter(self._recent_ids, dtype=np.int64, count=len(self._recent_ids)))
+            df = df[new]
+            self._track_ids(ids[new])
+            if df.empty:
+                return 0
+
+        for ticker, new_dates, new_closes in self._split_by_ticker(df):
+            if ticker in self.series:
+                dates, closes = self.series[ticker]
+                dates = np.concatenate((dates, new_dates))
+                closes = np.concatenate((closes, new_closes))
+                in_order = len(dates) == len(new_dates) or new_dates[0] >= dates[-len(new_dates) - 1]
+                if not in_order:
+                    order = np.argsort(dates, kind="stable")
+                    dates, closes = dates[order], closes[order]
+                with self._indicators_lock:
+                    self.series[ticker] = (dates, closes)
+                    if not in_order:
+                        self._indicators.pop(ticker, None)
+                    elif ticker in self._indicators:
+                        for indicator in self._indicators[ticker].values():
+                            indicator.append(new_closes)
+            else:
+                self.series[ticker] = (new_dates, new_closes)
+            if self.max_date is None or new_dates[-1] > self.max_date:
+                self.max_date = new_dates[-1]
+
+        self.row_count += len(df)
+        self.version += 1
+        self._downsampled.clear()
+        return len(df)
+
+    def __contains__(self, ticker):
+        return ticker in self.series
+
+    def __len__(self):
+        return len(self.series)
+
+    @property
+    def tickers(self):
+        return list(self.series)
+
+    def get_series(self, ticker, start_date=None):
+        """
+        Returns dates and close values of a ticker starting at the given date.
+
+        :parameter:
+            - ticker (str): A company symbol.
+            - start_date (datetime or None): The first date to include, None for the whole history.
+        :return:
+            - (dates, closes) (tuple of numpy.ndarray): Views of the stored arrays, or
+            empty arrays if the ticker is unknown.
+        """
+        if ticker not in self.series:
+            return np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.float64)
+
+        dates, closes = self.series[ticker]
+        if start_date is None:
+            return dates, closes
+
+        start = np.searchsorted(dates, np.datetime64(start_date, "ns"), side="left")
+        return dates[start:], closes[start:]
+
+    def get_indicator(self, ticker, name):
+        """
+        Returns an indicator over the whole history of a ticker.
+
+        Indicators are computed on first use and kept with the series, later appends
+        extend them without recomputing the history. At most INDICATORS_PER_TICKER
+        indicators are kept per ticker, the least recently used one is dropped first.
+
+        :parameter:
+            - ticker (str): A company symbol held in the store.
+            - name (str): A normalized indicator name returned by parse_indicators.
+        :return:
+            - values (numpy.ndarray): The indicator values aligned with the stored dates.
+        """
+        with self._indicators_lock:
+            indicators = self._indicators.get(ticker)
+            if indicators is None:
+                indicators = self._indicators.setdefault(ticker, LRUCache(INDICATORS_PER_TICKER))
+            indicator = indicators.get(name)
+            if indicator is None:
+                indicator = Indicator(name, self.series[ticker][1])
+                indicators.set(name, indicator)
+            return indicator.values
+
+    def get_frame(self, ticker, range_option, max_points=None, indicators=()):
+        """
+        Returns stock data of a ticker within the specified data range.
+
+        :parameter:
+            - ticker (str): A company symbol.
+            - range_option (str): A string specifying the data range.
+            - max_points (int, optional): Downsamples the series to at most this many points
+            with Largest-Triangle-Three-Buckets. Reduced series are cached per range in an
+            LRU cache of DOWNSAMPLED_CACHE_SIZE entries, cleared when the day changes.
+            - indicators (list of str, optional): Indicator names returned by parse_indicators,
+            added as one column each.
+        :return:
+            - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'date', 'close'
+            and the requested indicators, sorted by date.
+        """
+        if max_points is None:
+            dates, closes = self.get_series(ticker, get_range_start(range_option))
+        else:
+            today = date.today()
+            if today != self._downsampled_day:
+                # Range starts move with the date, series reduced yesterday are stale.
+                self._downsampled.clear()
+                self._downsampled_day = today
+            key = (ticker, range_option, max_points)
+            series = self._downsampled.get(key)
+            if series is None:
+                dates, closes = self.get_series(ticker, get_range_start(range_option))
+                series = downsample_series(dates, closes, max_points)
+                self._downsampled.set(key, series)
+            dates, closes = series
+
+        data = pd.DataFrame({"ticker": ticker, "date": dates, "close": closes})
+        if indicators and ticker in self.series:
+            with self._indicators_lock:
+                positions = np.searchsorted(self.series[ticker][0], dates)
+                for name in indicators:
+                    data[name] = self.get_indicator(ticker, name)[positions]
+        return data
+
+    def get_summary(self):
+        """
+        Returns the summary table of the store, recomputed when the data changed.
+
+        :return:
+            - summary (SummaryTable): Precomputed metrics for every ticker and range option.
+        """
+        summary = self._summary
+        if summary is None or not summary.is_current(self):
+            summary = self._summary = SummaryTable(self)
+        return summary
@@ -0,0 +1,126 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils import RANGE_OPTIONS, get_range_start
+
+
+class SummaryTable:
+    """
+    Precomputed 'pct_change', 'last_change' and 'last_value' of every ticker for every
+    range option.
+
+    The values match calculate_pct_change_for_range, calculate_last_change and
+    get_value applied to the range-filtered data, but are computed for all tickers at
+    once over flat NumPy arrays whenever the store data changes.
+    """
+
+    def __init__(self, store):
+        """
+        :parameter:
+            - store (SeriesStore): The store the summary is computed from.
+        """
+        self.version = store.version
+        self.built_on = date.today()
+        self.frame = self._build(store)
+        self.rows = {
+            key: (pct_change, last_change, last_value)
+            for key, pct_change, last_change, last_value in zip(
+                self.frame.index,
+                self.frame["pct_change"],
+                self.frame["last_change"],
+                self.frame["last_value"],
+            )
+        }
+
+    @staticmethod
+    def _build(store):
+        columns = ["pct_change", "last_change", "last_value"]
+        tickers = store.tickers
+        if not tickers:
+            index = pd.MultiIndex.from_tuples([], names=["ticker", "range"])
+            return pd.DataFrame(columns=columns, index=index, dtype=np.float64)
+
+        lengths = np.array([len(store.series[ticker][0]) for ticker in tickers])
+        dates = np.concatenate([store.series[ticker][0] for ticker in tickers])
+        closes = np.concatenate([store.series[ticker][1] for ticker in tickers])
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        last_close = closes[ends - 1]
+
+        frames = []
+        for range_option in RANGE_OPTIONS:
+            start_date = get_range_start(range_option)
+            if start_date is None:
+                first = starts
+            else:
+                before = (dates < np.datetime64(start_date, "ns")).astype(np.int64)
+                first = starts + np.add.reduceat(before, starts)
+            count = ends - first
+
+            first_close = closes[np.minimum(first, ends - 1)]
+            last_change = np.where(count >= 2, last_close - first_close, 0.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                pct_change = np.where(count >= 2, last_change / first_close * 100, 0.0)
+            last_value = np.where(count >= 1, last_close, np.nan)
+
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "ticker": tickers,
+                        "range": range_option,
+                        "pct_change": pct_change,
+                        "last_change": last_change,
+                        "last_value": last_value,
+                    }
+                )
+            )
+
+        frame = pd.concat(frames, ignore_index=True)
+        frame = frame[frame["last_value"].notna()]
+        return frame.set_index(["ticker", "range"])[columns]
+
+    def is_current(self, store):
+        return self.version == store.version and self.built_on == date.today()
+
+    def get(self, ticker, range_option):
+        """
+        Returns the precomputed metrics of a ticker within the specified data range.
+
+        :parameter:
+            - ticker (str): A company symbol.
+            - range_option (str): A string specifying the data range.
+        :return:
+            - metrics (dict) or None: A dictionary with keys 'pct_change', 'last_change' and
+            'last_value', or None if the ticker has no values in the range.
+        """
+        if range_option not in RANGE_OPTIONS:
+            range_option = "all"
+        row = self.rows.get((ticker, range_option))
+        if row is None:
+            return None
+        pct_change, last_change, last_value = row
+        return {
+            "pct_change": float(pct_change),
+            "last_change": float(last_change),
+            "last_value": float(last_value),
+        }
+
+    def top_movers(self, range_option, limit=10, ascending=False):
+        """
+        Returns the tickers with the largest percentage change within the data range.
+
+        :parameter:
+            - range_option (str): A string specifying the data range.
+            - limit (int): The maximum number of tickers returned.
+            - ascending (bool): Returns the largest losers instead of gainers when True.
+        :return:
+            - df (pandas.DataFrame): A DataFrame containing columns 'ticker', 'pct_change',
+            'last_change', 'last_value' sorted by 'pct_change'.
+        """
+        if range_option not in RANGE_OPTIONS:
+            range_option = "all"
+        frame = self.frame[self.frame.index.get_level_values("range") == range_option]
+        frame = frame.sort_values("pct_change", ascending=ascending).head(limit)
+        return frame.reset_index()[["ticker", "pct_change", "last_change", "last_value"]]
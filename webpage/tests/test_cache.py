@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from extensions import get_cache_config
+from flask_caching import Cache
+
+
+@pytest.fixture
+def sample_data():
+    data = {
+        'ticker': ['AAPL', 'AAPL', 'AAPL'],
+        'date': pd.to_datetime(['2023-07-01', '2023-07-08', '2023-07-15']),
+        'close': [150.0, 155.0, 160.0],
+    }
+    return pd.DataFrame(data)
+
+
+def test_default_cache_is_shared_filesystem(mocker, tmp_path):
+    mocker.patch.dict("os.environ", {"CACHE_DIR": str(tmp_path)}, clear=True)
+
+    config = get_cache_config()
+
+    assert config["CACHE_TYPE"] == "FileSystemCache"
+    assert config["CACHE_DIR"] == str(tmp_path)
+
+
+def test_redis_cache_config(mocker):
+    mocker.patch.dict(
+        "os.environ",
+        {"CACHE_TYPE": "RedisCache", "CACHE_REDIS_URL": "redis://cache:6379/1"},
+        clear=True,
+    )
+
+    config = get_cache_config()
+
+    assert config["CACHE_REDIS_URL"] == "redis://cache:6379/1"
+
+
+def test_filesystem_cache_shared_between_instances(mocker, tmp_path, sample_data):
+    mocker.patch.dict("os.environ", {"CACHE_DIR": str(tmp_path)}, clear=True)
+    writer, reader = Cache(), Cache()
+    writer.init_app(Flask("writer"), config=get_cache_config())
+    reader.init_app(Flask("reader"), config=get_cache_config())
+
+    writer.set("values_data", sample_data)
+
+    pd.testing.assert_frame_equal(reader.get("values_data"), sample_data)
+
+
+def test_redis_cache_round_trip(sample_data):
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = Cache()
+    cache.init_app(
+        Flask("redis"),
+        config={"CACHE_TYPE": "RedisCache", "CACHE_REDIS_HOST": fakeredis.FakeRedis()},
+    )
+
+    cache.set("values_data", sample_data)
+
+    pd.testing.assert_frame_equal(cache.get("values_data"), sample_data)
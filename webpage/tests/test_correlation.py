@@ -0,0 +1,49 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from correlation import correlation_matrix, get_returns_matrix
+from store import SeriesStore
+
+
+def test_correlation_matches_pandas_with_missing_values():
+    rng = np.random.default_rng(1)
+    returns = rng.normal(size=(60, 5))
+    returns[:, 1] += returns[:, 0]
+    returns[rng.random(returns.shape) < 0.2] = np.nan
+
+    expected = pd.DataFrame(returns).corr(min_periods=3).to_numpy()
+
+    np.testing.assert_allclose(correlation_matrix(returns), expected, equal_nan=True)
+
+
+def test_correlation_of_constant_series_is_nan():
+    returns = np.array([[0.1, 0.0], [0.2, 0.0], [0.3, 0.0], [0.1, 0.0]])
+
+    correlations = correlation_matrix(returns)
+
+    assert correlations[0, 0] == pytest.approx(1.0)
+    assert np.isnan(correlations[0, 1])
+
+
+def test_returns_matrix_is_aligned_by_date():
+    dates = pd.to_datetime(["2023-07-07", "2023-07-14", "2023-07-21"])
+    store = SeriesStore(
+        pd.DataFrame(
+            {
+                "ticker": ["AAPL", "AAPL", "AAPL", "MSFT", "MSFT"],
+                "date": [dates[0], dates[1], dates[2], dates[0], dates[2]],
+                "close": [100.0, 110.0, 121.0, 200.0, 220.0],
+            }
+        )
+    )
+
+    returns = get_returns_matrix(store, ["AAPL", "MSFT"])
+
+    np.testing.assert_allclose(returns[:, 0], [0.1, 0.1])
+    assert np.isnan(returns).all(axis=0)[1]
@@ -0,0 +1,80 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from downsample import downsample_series, lttb_indices
+import store as store_module
+from store import SeriesStore
+
+
+def test_lttb_keeps_endpoints_and_size():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+
+    indices = lttb_indices(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0
+    assert indices[-1] == 999
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_spike():
+    x = np.arange(500, dtype=np.float64)
+    y = np.zeros(500)
+    y[250] = 100
+
+    indices = lttb_indices(x, y, 20)
+
+    assert 250 in indices
+
+
+def test_short_series_is_not_downsampled():
+    dates = pd.date_range("2023-01-01", periods=10, freq="W").to_numpy()
+    closes = np.arange(10, dtype=np.float64)
+
+    reduced_dates, reduced_closes = downsample_series(dates, closes, 50)
+
+    assert len(reduced_dates) == 10
+    assert (reduced_closes == closes).all()
+
+
+def test_store_caches_downsampled_series():
+    dates = pd.date_range("2010-01-01", periods=760, freq="W")
+    store = SeriesStore(pd.DataFrame({"ticker": "AAPL", "date": dates, "close": np.arange(760.0)}))
+
+    first = store.get_frame("AAPL", "all", max_points=100)
+    second = store.get_frame("AAPL", "all", max_points=100)
+
+    assert len(first) == 100
+    assert first["close"].iloc[-1] == 759
+    assert (first["date"] == second["date"]).all()
+    assert len(store._downsampled) == 1
+
+
+def test_store_downsampled_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(store_module, "DOWNSAMPLED_CACHE_SIZE", 3)
+    dates = pd.date_range("2010-01-01", periods=760, freq="W")
+    store = SeriesStore(pd.DataFrame({"ticker": "AAPL", "date": dates, "close": np.arange(760.0)}))
+
+    for max_points in range(10, 15):
+        store.get_frame("AAPL", "all", max_points=max_points)
+
+    assert len(store._downsampled) == 3
+    assert ("AAPL", "all", 14) in store._downsampled
+    assert ("AAPL", "all", 10) not in store._downsampled
+
+
+def test_store_downsampled_cache_cleared_on_new_day():
+    dates = pd.date_range("2010-01-01", periods=760, freq="W")
+    store = SeriesStore(pd.DataFrame({"ticker": "AAPL", "date": dates, "close": np.arange(760.0)}))
+    store.get_frame("AAPL", "all", max_points=100)
+    store._downsampled_day = store._downsampled_day.replace(year=2000)
+
+    store.get_frame("AAPL", "1year", max_points=100)
+
+    assert len(store._downsampled) == 1
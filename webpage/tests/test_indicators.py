@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from indicators import MAX_INDICATORS, Indicator, max_drawdown, parse_indicators
+import store as store_module
+from store import SeriesStore
+
+
+@pytest.fixture
+def closes():
+    rng = np.random.default_rng(0)
+    return 100 * np.cumprod(1 + rng.normal(0, 0.02, 120))
+
+
+def test_parse_indicators_defaults_and_duplicates():
+    assert parse_indicators("SMA, ema50,sma20, drawdown") == ["sma20", "ema50", "drawdown"]
+    assert parse_indicators(None) == []
+
+
+@pytest.mark.parametrize("value", ["rsi14", "sma0", "volatility1", "drawdown5", "sma261", "sma99999999"])
+def test_parse_indicators_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_indicators(value)
+
+
+def test_parse_indicators_limits_count():
+    assert len(parse_indicators("sma5,sma10,ema5,drawdown")) == MAX_INDICATORS
+    with pytest.raises(ValueError):
+        parse_indicators("sma5,sma10,ema5,ema10,drawdown")
+
+
+@pytest.mark.parametrize("name", ["sma5", "ema10", "volatility5", "drawdown"])
+def test_append_matches_full_computation(closes, name):
+    indicator = Indicator(name, closes[:3])
+    indicator.append(closes[3:50])
+    for close in closes[50:]:
+        indicator.append([close])
+
+    np.testing.assert_allclose(indicator.values, Indicator(name, closes).values, equal_nan=True)
+
+
+def test_sma_matches_pandas(closes):
+    expected = pd.Series(closes).rolling(20).mean().to_numpy()
+
+    np.testing.assert_allclose(Indicator("sma20", closes).values, expected, equal_nan=True)
+
+
+def test_max_drawdown():
+    assert max_drawdown(np.array([100.0, 120.0, 90.0, 130.0])) == pytest.approx(-25.0)
+    assert max_drawdown(np.array([])) == 0.0
+
+
+def test_store_extends_cached_indicators_on_append(closes):
+    dates = pd.date_range("2020-01-03", periods=len(closes), freq="W-FRI")
+    store = SeriesStore(pd.DataFrame({"ticker": "AAPL", "date": dates[:100], "close": closes[:100]}))
+    store.get_frame("AAPL", "all", indicators=["sma10"])
+
+    store.append(pd.DataFrame({"ticker": "AAPL", "date": dates[100:], "close": closes[100:]}))
+    data = store.get_frame("AAPL", "all", indicators=["sma10"])
+
+    expected = pd.Series(closes).rolling(10).mean().to_numpy()
+    np.testing.assert_allclose(data["sma10"].to_numpy(), expected, equal_nan=True)
+
+
+def test_store_bounds_cached_indicators(closes, monkeypatch):
+    monkeypatch.setattr(store_module, "INDICATORS_PER_TICKER", 2)
+    dates = pd.date_range("2020-01-03", periods=len(closes), freq="W-FRI")
+    store = SeriesStore(pd.DataFrame({"ticker": "AAPL", "date": dates, "close": closes}))
+
+    for name in ["sma5", "sma10", "ema5"]:
+        store.get_indicator("AAPL", name)
+
+    assert len(store._indicators["AAPL"]) == 2
+    assert "sma5" not in store._indicators["AAPL"]
+
+
+def test_indicator_read_during_out_of_order_append(closes):
+    dates = pd.date_range("2020-01-03", periods=len(closes), freq="W-FRI")
+    store = SeriesStore(pd.DataFrame({"ticker": "AAPL", "date": dates[1:], "close": closes[1:]}))
+    store.get_indicator("AAPL", "sma10")
+    readers = []
+
+    class ReadOnInvalidate(dict):
+        def pop(self, *args):
+            value = super().pop(*args)
+            # Another request reads the indicator while the append invalidates it.
+            reader = threading.Thread(target=store.get_indicator, args=("AAPL", "sma10"))
+            reader.start()
+            reader.join(0.2)
+            readers.append(reader)
+            return value
+
+    store._indicators = ReadOnInvalidate(store._indicators)
+    store.append(pd.DataFrame({"ticker": "AAPL", "date": dates[:1], "close": closes[:1]}))
+    for reader in readers:
+        reader.join()
+    data = store.get_frame("AAPL", "all", indicators=["sma10"])
+
+    expected = pd.Series(closes).rolling(10).mean().to_numpy()
+    np.testing.assert_allclose(data["sma10"].to_numpy(), expected, equal_nan=True)
@@ -0,0 +1,135 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DBPORT", "5432")
+os.environ.setdefault("PRICE_MATRIX_DIR", "")
+
+import models
+from store import WATERMARK_OVERLAP
+
+
+@pytest.fixture
+def mock_read_sql(mocker):
+    mocker.patch.object(models, "engine", MagicMock())
+    mocker.patch.object(models, "_series_store", None)
+    return mocker.patch(
+        "models.pd.read_sql",
+        return_value=pd.DataFrame(
+            {
+                "ticker": ["AAPL", "AAPL"],
+                "date": ["2023-07-01", "2023-07-08"],
+                "close": [150, 155],
+            }
+        ),
+    )
+
+
+def test_range_filter_is_bound_parameter(mock_read_sql):
+    models.get_stock_values_for_range(["AAPL"], "1year")
+
+    kwargs = mock_read_sql.call_args.kwargs
+    assert "date >= %(start_date)s" in kwargs["sql"]
+    assert kwargs["params"]["tickers"] == ["AAPL"]
+    assert "start_date" in kwargs["params"]
+
+
+def test_all_range_has_no_date_filter(mock_read_sql):
+    models.get_stock_values_for_range(["AAPL"], "all")
+
+    kwargs = mock_read_sql.call_args.kwargs
+    assert "start_date" not in kwargs["params"]
+
+
+def test_get_ticker_values_skips_missing_tickers(mock_read_sql):
+    values = models.get_ticker_values(["AAPL", "GOOGL"], "all")
+
+    assert list(values) == ["AAPL"]
+    assert list(values["AAPL"]["close"]) == [150, 155]
+
+
+def test_choose_resolution_full_without_max_points():
+    assert models.choose_resolution(None) == ("stock_prize", "date")
+
+
+def test_choose_resolution_coarse_for_long_ranges():
+    start_date = datetime.today() - timedelta(days=3650)
+
+    assert models.choose_resolution(start_date, 100) == ("stock_prize_monthly", "period")
+    assert models.choose_resolution(start_date, 200) == ("stock_prize_weekly", "period")
+    assert models.choose_resolution(start_date, 1000) == ("stock_prize", "date")
+
+
+def test_rollup_query_uses_period_column(mock_read_sql):
+    models.get_stock_values_for_range(["AAPL"], "all", max_points=50)
+
+    assert "FROM stock_prize_monthly" in mock_read_sql.call_args.kwargs["sql"]
+
+
+def test_series_store_refresh_reads_rows_after_watermark(mocker):
+    mocker.patch.object(models, "_series_store", None)
+    mocker.patch.object(models, "get_current_version", return_value=None)
+    loader = MagicMock(
+        return_value=pd.DataFrame(
+            {
+                "id": [1, 2, 3],
+                "ticker": ["AAPL", "AAPL", "MSFT"],
+                "date": pd.to_datetime(["2023-07-07", "2023-07-14", "2023-07-14"]),
+                "close": [150.0, 155.0, 300.0],
+            }
+        )
+    )
+    store = models.get_series_store(loader)
+    store.loaded_at -= models.STORE_TIMEOUT
+
+    # A late batch for the last date and a backfilled older row, next to rows already held.
+    since = mocker.patch.object(
+        models,
+        "get_stock_values_since",
+        return_value=pd.DataFrame(
+            {
+                "id": [3, 4, 5],
+                "ticker": ["MSFT", "GOOGL", "MSFT"],
+                "date": pd.to_datetime(["2023-07-14", "2023-07-14", "2023-07-07"]),
+                "close": [300.0, 120.0, 290.0],
+            }
+        ),
+    )
+    refreshed = models.get_series_store(loader)
+
+    loader.assert_called_once()
+    assert refreshed is store
+    assert since.call_args.args[0] == 3 - WATERMARK_OVERLAP
+    assert list(store.get_series("MSFT")[1]) == [290.0, 300.0]
+    assert list(store.get_series("GOOGL")[1]) == [120.0]
+    assert store.last_id == 5
+
+
+def test_coarse_range_reads_store_when_held(mock_read_sql, mocker):
+    store = MagicMock()
+    store.get_frame.return_value = pd.DataFrame({"ticker": "AAPL", "date": [], "close": []})
+    mocker.patch.object(models, "_series_store", store)
+
+    models.get_ticker_values(["AAPL"], "all", max_points=50)
+
+    store.get_frame.assert_called_once_with("AAPL", "all", 50)
+    mock_read_sql.assert_not_called()
+
+
+def test_coarse_range_reads_rollup_without_store(mock_read_sql):
+    values = models.get_ticker_values(["AAPL"], "all", max_points=50)
+
+    assert "FROM stock_prize_monthly" in mock_read_sql.call_args.kwargs["sql"]
+    assert list(values["AAPL"]["close"]) == [150, 155]
+
+
+def test_rollup_range_includes_first_partial_period(mock_read_sql):
+    models.get_stock_values_for_tickers(["AAPL"], datetime(2020, 3, 18), max_points=10)
+
+    assert "FROM stock_prize_monthly" in mock_read_sql.call_args.kwargs["sql"]
+    assert str(mock_read_sql.call_args.kwargs["params"]["start_date"]) == "2020-03-01"
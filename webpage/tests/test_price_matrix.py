@@ -0,0 +1,152 @@
+import os
+import sys
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DBPORT", "5432")
+os.environ.setdefault("PRICE_MATRIX_DIR", "")
+
+import models
+import price_matrix
+from price_matrix import get_current_version, open_price_matrix, write_price_matrix
+from store import WATERMARK_OVERLAP, SeriesStore
+
+
+@pytest.fixture
+def sample_data():
+    dates = pd.to_datetime(["2023-07-07", "2023-07-14", "2023-07-21", "2023-07-28"])
+    return pd.DataFrame(
+        {
+            "id": range(1, 9),
+            "ticker": ["AAPL"] * 4 + ["MSFT"] * 2 + ["ABNB"] * 2,
+            "date": list(dates) + [dates[1], dates[2]] + [dates[0], dates[3]],
+            "close": [150.0, 155.0, 160.0, 165.0, 300.0, 310.0, 120.0, 130.0],
+        }
+    )
+
+
+def test_matrix_series_are_memory_mapped(tmp_path, sample_data):
+    write_price_matrix(sample_data, str(tmp_path))
+    matrix = open_price_matrix(str(tmp_path))
+
+    dates, closes = matrix.get_series(matrix.tickers.index("MSFT"))
+
+    assert matrix.tickers == ["AAPL", "ABNB", "MSFT"]
+    assert isinstance(closes, np.memmap)
+    assert list(closes) == [300.0, 310.0]
+    assert dates[0] == np.datetime64("2023-07-14")
+
+
+def test_matrix_compacts_series_with_gaps(tmp_path, sample_data):
+    write_price_matrix(sample_data, str(tmp_path))
+    matrix = open_price_matrix(str(tmp_path))
+
+    dates, closes = matrix.get_series(matrix.tickers.index("ABNB"))
+
+    assert list(closes) == [120.0, 130.0]
+    assert list(dates) == list(pd.to_datetime(["2023-07-07", "2023-07-28"]).to_numpy())
+
+
+def test_publishing_replaces_current_version(tmp_path, sample_data):
+    versions = [write_price_matrix(sample_data, str(tmp_path)) for _ in range(3)]
+
+    assert get_current_version(str(tmp_path)) == versions[-1]
+    assert sorted(os.listdir(tmp_path)) == [*versions[-2:], "CURRENT"]
+
+
+def test_store_from_matrix_matches_store_from_frame(tmp_path, sample_data):
+    write_price_matrix(sample_data, str(tmp_path))
+
+    mapped = SeriesStore.from_price_matrix(open_price_matrix(str(tmp_path)))
+    loaded = SeriesStore(sample_data)
+
+    assert mapped.tickers == loaded.tickers
+    assert mapped.max_date == loaded.max_date
+    for ticker in loaded.tickers:
+        assert list(mapped.get_series(ticker)[1]) == list(loaded.get_series(ticker)[1])
+
+
+def test_series_store_uses_published_matrix(tmp_path, mocker, sample_data):
+    write_price_matrix(sample_data, str(tmp_path))
+    mocker.patch.object(price_matrix, "PRICE_MATRIX_DIR", str(tmp_path))
+    mocker.patch.object(models, "_series_store", None)
+    since = mocker.patch.object(
+        models,
+        "get_stock_values_since",
+        return_value=pd.DataFrame(
+            {
+                "id": [8, 9],
+                "ticker": ["ABNB", "AAPL"],
+                "date": pd.to_datetime(["2023-07-28", "2023-08-04"]),
+                "close": [130.0, 170.0],
+            }
+        ),
+    )
+    loader = MagicMock()
+
+    store = models.get_series_store(loader)
+
+    loader.assert_not_called()
+    assert since.call_args.args[0] == 8 - WATERMARK_OVERLAP
+    assert list(store.get_series("AAPL")[1]) == [150.0, 155.0, 160.0, 165.0, 170.0]
+    assert list(store.get_series("ABNB")[1]) == [120.0, 130.0]
+
+
+def test_first_worker_publishes_matrix_for_the_others(tmp_path, mocker, sample_data):
+    mocker.patch.object(price_matrix, "PRICE_MATRIX_DIR", str(tmp_path))
+    mocker.patch.object(models, "_series_store", None)
+    mocker.patch.object(models, "get_stock_values_since", return_value=None)
+    loader = MagicMock(return_value=sample_data)
+
+    first = models.get_series_store(loader)
+    version = get_current_version(str(tmp_path))
+    mocker.patch.object(models, "_series_store", None)
+    second = models.get_series_store(loader)
+
+    loader.assert_called_once()
+    assert version is not None
+    assert first.matrix_version == second.matrix_version == version
+    assert list(second.get_series("AAPL")[1]) == [150.0, 155.0, 160.0, 165.0]
+
+
+def test_expired_matrix_is_republished(tmp_path, mocker, sample_data):
+    mocker.patch.object(price_matrix, "PRICE_MATRIX_DIR", str(tmp_path))
+    mocker.patch.object(models, "_series_store", None)
+    mocker.patch.object(models, "get_stock_values_since", return_value=None)
+    stale_version = write_price_matrix(sample_data, str(tmp_path))
+    mocker.patch.object(
+        models, "get_version_age", return_value=models.STORE_FULL_REFRESH_TIMEOUT
+    )
+    loader = MagicMock(return_value=sample_data)
+
+    store = models.get_series_store(loader)
+
+    loader.assert_called_once()
+    assert store.matrix_version != stale_version
+    assert store.matrix_version == get_current_version(str(tmp_path))
+
+
+def test_failed_refresh_backs_off(tmp_path, mocker, sample_data):
+    write_price_matrix(sample_data, str(tmp_path))
+    mocker.patch.object(price_matrix, "PRICE_MATRIX_DIR", str(tmp_path))
+    mocker.patch.object(models, "_series_store", None)
+    mocker.patch.object(models, "_store_refresh_failures", 0)
+    monotonic = mocker.patch("models.time.monotonic", return_value=1000.0)
+    since = mocker.patch.object(models, "get_stock_values_since", return_value=None)
+
+    store = models.get_series_store()
+    models.get_series_store()
+
+    assert since.call_count == 1
+    assert store.loaded_at == 1000.0 - models.STORE_TIMEOUT + models.STORE_RETRY_DELAY
+
+    monotonic.return_value = 1000.0 + models.STORE_RETRY_DELAY
+    models.get_series_store()
+
+    assert since.call_count == 2
+    retry_at = monotonic.return_value + 2 * models.STORE_RETRY_DELAY
+    assert store.loaded_at == retry_at - models.STORE_TIMEOUT
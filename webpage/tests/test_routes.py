@@ -0,0 +1,394 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DBPORT", "5432")
+os.environ.setdefault("PRICE_MATRIX_DIR", "")
+os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+os.environ.setdefault("WARM_UP_ON_START", "false")
+
+import models
+import search
+from app import app
+from extensions import cache
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def sample_data():
+    data = {
+        'ticker': ['AAPL', 'AAPL', 'AAPL', 'GOOGL', 'GOOGL'],
+        'date': pd.to_datetime(
+            ['2023-07-01', '2023-07-08', '2023-07-15', '2023-07-08', '2023-07-15']
+        ),
+        'close': [150.0, 155.0, 160.0, 120.0, 126.0],
+    }
+    return pd.DataFrame(data)
+
+
+@pytest.fixture(autouse=True)
+def mock_db(mocker, sample_data):
+    mocker.patch.object(models, "_series_store", None)
+    mocker.patch.object(search, "_company_index", None)
+    mocker.patch(
+        "routes.get_stock_companies_from_db",
+        return_value=pd.DataFrame(
+            {
+                'ticker': ['AAPL', 'GOOGL'],
+                'name': ['Apple Inc.', 'Google'],
+                'sector': ['Information Technology', 'Communication Services'],
+            }
+        ),
+    )
+    mocker.patch("routes.get_stock_values_from_db", return_value=sample_data)
+    mocker.patch(
+        "models.get_stock_values_for_range",
+        side_effect=lambda tickers, range_option, max_points=None: sample_data[
+            sample_data["ticker"].isin(tickers)
+        ].copy(),
+    )
+    with app.app_context():
+        cache.clear()
+
+
+def test_get_stock_data_sets_etag(client):
+    response = client.post('/get_stock_data', data={'ticker': 'Apple Inc.', 'range': 'all'})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert response.get_json()["last_value"] == 160
+
+
+def test_get_stock_data_not_modified(client):
+    response = client.get('/get_stock_data', query_string={'ticker': 'Apple Inc.', 'range': 'all'})
+
+    repeated = client.get(
+        '/get_stock_data',
+        query_string={'ticker': 'Apple Inc.', 'range': 'all'},
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+
+    assert "no-cache" in response.headers["Cache-Control"]
+    assert repeated.status_code == 304
+    assert repeated.data == b""
+
+
+def test_chart_etag_changes_when_rows_are_appended(client):
+    query = {'ticker': 'Apple Inc.', 'range': 'all'}
+    response = client.get('/get_stock_data', query_string=query)
+
+    # A late row for a date already held does not move max_date.
+    models._series_store.append(
+        pd.DataFrame({'ticker': ['MSFT'], 'date': pd.to_datetime(['2023-07-15']), 'close': [300.0]})
+    )
+    repeated = client.get(
+        '/get_stock_data', query_string=query, headers={"If-None-Match": response.headers["ETag"]}
+    )
+
+    assert repeated.status_code == 200
+    assert repeated.headers["ETag"] != response.headers["ETag"]
+
+
+def test_chart_payload_is_memoized(client, mocker):
+    client.post('/get_stock_data', data={'ticker': 'Apple Inc.', 'range': 'all'})
+    build = mocker.patch("routes.build_stock_chart")
+
+    response = client.post('/get_stock_data', data={'ticker': 'Apple Inc.', 'range': 'all'})
+
+    assert response.status_code == 200
+    build.assert_not_called()
+
+
+def test_compare_stocks_etag_differs_per_pair(client):
+    first = client.post(
+        '/compare_stocks',
+        data={'first_ticker': 'Apple Inc.', 'second_ticker': 'Google', 'range': 'all'},
+    )
+    second = client.post(
+        '/compare_stocks',
+        data={'first_ticker': 'Google', 'second_ticker': 'Apple Inc.', 'range': 'all'},
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+
+def test_api_stock_columns_format(client):
+    response = client.get('/api/stockAAPL?format=columns')
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "ticker": "AAPL",
+        "dates": ["2023-07-01", "2023-07-08", "2023-07-15"],
+        "close": [150.0, 155.0, 160.0],
+    }
+
+
+def test_api_stock_msgpack_accept_header(client):
+    msgpack = pytest.importorskip("msgpack")
+
+    response = client.get('/api/stockAAPL', headers={"Accept": "application/x-msgpack"})
+
+    assert response.mimetype == "application/x-msgpack"
+    assert msgpack.unpackb(response.data)["close"] == [150.0, 155.0, 160.0]
+
+
+def test_api_compare_stocks_columns_format(client):
+    response = client.get(
+        '/api/compare_stocks?first_ticker=AAPL&second_ticker=GOOGL&format=columns'
+    )
+
+    json_data = response.get_json()
+    assert json_data["first_data"]["close"] == [150.0, 155.0, 160.0]
+    assert json_data["second_data"]["dates"] == ["2023-07-08", "2023-07-15"]
+
+
+def test_api_unknown_format(client):
+    response = client.get('/api/stockAAPL?format=xml')
+
+    assert response.status_code == 406
+
+
+def test_api_stock_max_points(client):
+    response = client.get('/api/stockAAPL?format=columns&max_points=2')
+
+    assert response.get_json()["close"] == [150.0, 160.0]
+
+
+@pytest.mark.parametrize("query", ["range=10years", "max_points=1", "max_points=-5", "max_points=99999", "max_points=x"])
+def test_api_stock_rejects_invalid_parameters(client, query):
+    response = client.get(f'/api/stockAAPL?format=columns&{query}')
+
+    assert response.status_code == 400
+
+
+def test_api_top_movers_limit(client):
+    response = client.get('/api/top_movers?range=all&limit=1')
+
+    assert response.status_code == 200
+    assert [mover["ticker"] for mover in response.get_json()] == ["AAPL"]
+
+
+@pytest.mark.parametrize("limit", ["-3", "0", "3", "x"])
+def test_api_top_movers_rejects_invalid_limit(client, limit):
+    response = client.get(f'/api/top_movers?range=all&limit={limit}')
+
+    assert response.status_code == 400
+
+
+def test_get_stock_data_rejects_invalid_range(client):
+    response = client.post('/get_stock_data', data={'ticker': 'Apple Inc.', 'range': 'forever'})
+
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_api_stocks_aligned(client):
+    response = client.get('/api/stocks?tickers=AAPL,GOOGL,MSFT')
+
+    json_data = response.get_json()
+    assert json_data["dates"] == ["2023-07-01", "2023-07-08", "2023-07-15"]
+    assert json_data["series"]["AAPL"] == [150.0, 155.0, 160.0]
+    assert json_data["series"]["GOOGL"] == [None, 120.0, 126.0]
+    assert json_data["missing"] == ["MSFT"]
+
+
+def test_api_stocks_rebased(client):
+    response = client.get('/api/stocks?tickers=AAPL,GOOGL&rebase=true')
+
+    json_data = response.get_json()
+    assert json_data["series"]["AAPL"][0] == 100
+    assert json_data["series"]["GOOGL"] == [None, 100.0, 105.0]
+
+
+def test_api_stocks_without_tickers(client):
+    response = client.get('/api/stocks')
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def export_rows(mocker):
+    from datetime import date
+    from decimal import Decimal
+
+    return mocker.patch(
+        "api.iter_stock_rows",
+        return_value=iter(
+            [
+                [("AAPL", date(2023, 7, 1), Decimal("149.5"), Decimal("151"), Decimal("148"), Decimal("150"), 100)],
+                [("AAPL", date(2023, 7, 8), Decimal("150"), Decimal("156"), Decimal("149"), Decimal("155"), 200)],
+            ]
+        ),
+    )
+
+
+def test_api_export_ndjson(client, export_rows):
+    response = client.get('/api/export?tickers=aapl&start=2023-07-01')
+
+    lines = response.data.decode().splitlines()
+    assert response.mimetype == "application/x-ndjson"
+    assert len(lines) == 2
+    assert '"close":155.0' in lines[1]
+    assert export_rows.call_args.args[0] == ["AAPL"]
+
+
+def test_api_export_csv(client, export_rows):
+    response = client.get('/api/export?format=csv')
+
+    lines = response.data.decode().splitlines()
+    assert lines[0] == "ticker,date,open,high,low,close,volume"
+    assert lines[1] == "AAPL,2023-07-01,149.5,151,148,150,100"
+
+
+def test_api_export_invalid_date(client, export_rows):
+    response = client.get('/api/export?start=07/01/2023')
+
+    assert response.status_code == 400
+
+
+def test_ready_after_warm_up(client, mocker):
+    import warmup
+
+    mocker.patch.object(warmup, "_ready", warmup.threading.Event())
+    mocker.patch.object(warmup, "_status", dict.fromkeys(warmup._status, False))
+
+    assert client.get('/ready').status_code == 503
+
+    assert warmup.warm_up(app)
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()["stages"] == {"companies": True, "values": True, "summary": True}
+
+
+def test_warm_up_starts_once_per_process(client, mocker):
+    import app as app_module
+    import warmup
+
+    mocker.patch.object(app_module, "WARM_UP_ON_START", True)
+    mocker.patch.object(warmup, "_thread_pid", None)
+    start = mocker.patch.object(warmup, "start_warm_up")
+
+    client.get('/ready')
+    client.get('/ready')
+
+    start.assert_called_once_with(app)
+
+    # A worker forked from a preloaded master has another pid and starts its own thread.
+    mocker.patch.object(warmup.os, "getpid", return_value=warmup._thread_pid + 1)
+    client.get('/ready')
+
+    assert start.call_count == 2
+
+
+def test_gunicorn_post_fork_starts_warm_up(mocker):
+    import importlib.util
+
+    import app as app_module
+    import warmup
+
+    spec = importlib.util.spec_from_file_location(
+        "gunicorn_conf", os.path.join(os.path.dirname(app_module.__file__), "gunicorn.conf.py")
+    )
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+    mocker.patch.object(app_module, "WARM_UP_ON_START", True)
+    mocker.patch.object(warmup, "_thread_pid", None)
+    start = mocker.patch.object(warmup, "start_warm_up")
+
+    gunicorn_conf.post_fork(server=None, worker=None)
+    gunicorn_conf.post_fork(server=None, worker=None)
+
+    start.assert_called_once_with(app)
+
+
+def test_api_search(client):
+    response = client.get('/api/search?q=goo')
+
+    assert response.get_json() == [{"ticker": "GOOGL", "name": "Google"}]
+
+
+def test_metrics_exposes_stages_and_cache_counters(client):
+    client.post('/get_stock_data', data={'ticker': 'Apple Inc.', 'range': 'all'})
+
+    text = client.get('/metrics').data.decode()
+
+    pid = os.getpid()
+    assert f'sp500_stage_duration_seconds_count{{stage="figure_json",pid="{pid}"}}' in text
+    assert f'sp500_cache_requests_total{{cache="chart",result="miss",pid="{pid}"}}' in text
+    assert (
+        'sp500_request_duration_seconds_bucket'
+        f'{{endpoint="main_routes.get_stock_data",pid="{pid}",le="+Inf"}}'
+    ) in text
+
+
+def test_get_stock_data_with_indicators(client):
+    response = client.post(
+        '/get_stock_data',
+        data={'ticker': 'Apple Inc.', 'range': 'all', 'indicators': 'sma2,drawdown'},
+    )
+
+    payload = response.get_json()
+    assert response.status_code == 200
+    assert payload["max_drawdown"] == 0.0
+    assert "sma2" in payload["graph"]
+
+
+def test_api_stock_indicators(client):
+    response = client.get('/api/stockAAPL?format=columns&indicators=sma2')
+
+    assert response.status_code == 200
+    assert response.get_json()["sma2"] == [None, 152.5, 157.5]
+
+
+def test_api_stock_unknown_indicator(client):
+    response = client.get('/api/stockAAPL?indicators=rsi')
+
+    assert response.status_code == 400
+
+
+def test_api_correlation(client):
+    response = client.get('/api/correlation?range=all')
+
+    payload = response.get_json()
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert payload["tickers"] == ["AAPL", "GOOGL"]
+    assert payload["matrix"][0][0] is None
+
+
+def test_api_correlation_matches_pandas(client, mocker):
+    dates = pd.date_range('2023-07-07', periods=7, freq='W-FRI')
+    values = pd.DataFrame(
+        {
+            'ticker': ['AAPL'] * 7 + ['GOOGL'] * 6,
+            'date': list(dates) + list(dates.delete(3)),
+            'close': [150.0, 153.0, 151.0, 156.0, 160.0, 158.0, 163.0,
+                      120.0, 124.0, 121.0, 127.0, 125.0, 130.0],
+        }
+    )
+    mocker.patch("routes.get_stock_values_from_db", return_value=values)
+    closes = values.pivot(index='date', columns='ticker', values='close')
+    expected = closes.pct_change(fill_method=None).iloc[1:].corr(min_periods=3)
+
+    payload = client.get('/api/correlation?range=all').get_json()
+
+    assert payload["tickers"] == ["AAPL", "GOOGL"]
+    assert payload["matrix"][0][1] == pytest.approx(expected.loc['AAPL', 'GOOGL'])
+    assert payload["matrix"][1][0] == pytest.approx(expected.loc['GOOGL', 'AAPL'])
+    assert payload["matrix"][0][0] == pytest.approx(1.0)
+
+
+def test_api_correlation_unknown_sector(client):
+    response = client.get('/api/correlation?sector=Energy')
+
+    assert response.status_code == 404
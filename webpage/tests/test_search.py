@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from search import CompanyIndex
+
+
+@pytest.fixture
+def companies():
+    return pd.DataFrame(
+        {
+            'ticker': ['AAPL', 'ABNB', 'GOOGL', 'GOOG', 'A'],
+            'name': ['Apple Inc.', 'Airbnb', 'Alphabet Inc. (Class A)', 'Alphabet Inc. (Class C)', 'Agilent Technologies'],
+        }
+    )
+
+
+def test_resolve_name_and_ticker(companies):
+    index = CompanyIndex(companies)
+
+    assert index.resolve_name("Apple Inc.") == "AAPL"
+    assert index.resolve_ticker("ABNB") == "Airbnb"
+    assert index.resolve_name("Unknown") is None
+
+
+def test_search_ranks_exact_ticker_first(companies):
+    index = CompanyIndex(companies)
+
+    results = index.search("a")
+
+    assert results[0] == {"ticker": "A", "name": "Agilent Technologies"}
+    assert [result["ticker"] for result in results[1:3]] == ["ABNB", "AAPL"]
+
+
+def test_search_by_name_prefix(companies):
+    index = CompanyIndex(companies)
+
+    results = index.search("alph", limit=1)
+
+    assert results == [{"ticker": "GOOGL", "name": "Alphabet Inc. (Class A)"}]
+
+
+def test_search_empty_query(companies):
+    index = CompanyIndex(companies)
+
+    assert index.search("  ") == []
@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import serializers
+from serializers import dumps_json, frame_to_columns
+
+
+def reject_constant(value):
+    raise ValueError(f"{value} is not valid JSON")
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_nan_columns_are_encoded_as_null(mocker, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        mocker.patch.object(serializers, "orjson", None)
+    data = pd.DataFrame(
+        {
+            "ticker": "AAPL",
+            "date": pd.to_datetime(["2023-07-07", "2023-07-14", "2023-07-21"]),
+            "close": [150.0, 155.0, 160.0],
+            "sma2": [np.nan, 152.5, 157.5],
+        }
+    )
+
+    body = dumps_json({"ticker": "AAPL", **frame_to_columns(data)})
+
+    payload = json.loads(body, parse_constant=reject_constant)
+    assert payload["sma2"] == [None, 152.5, 157.5]
+    assert payload["close"] == [150.0, 155.0, 160.0]
+    assert payload["dates"] == ["2023-07-07", "2023-07-14", "2023-07-21"]
@@ -0,0 +1,83 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from store import SeriesStore
+
+
+@pytest.fixture
+def sample_data():
+    today = datetime.today()
+    data = {
+        'ticker': ['MSFT', 'AAPL', 'AAPL', 'MSFT', 'AAPL'],
+        'date': [
+            today - timedelta(days=400),
+            today - timedelta(days=7),
+            today - timedelta(days=400),
+            today - timedelta(days=7),
+            today - timedelta(days=200),
+        ],
+        'close': [300, 160, 150, 310, 155],
+    }
+    return pd.DataFrame(data)
+
+
+def test_store_sorts_series_by_date(sample_data):
+    store = SeriesStore(sample_data)
+
+    dates, closes = store.get_series("AAPL")
+
+    assert list(closes) == [150, 155, 160]
+    assert (dates[:-1] <= dates[1:]).all()
+
+
+def test_store_contains(sample_data):
+    store = SeriesStore(sample_data)
+
+    assert "AAPL" in store
+    assert "GOOGL" not in store
+    assert sorted(store.tickers) == ["AAPL", "MSFT"]
+
+
+def test_get_frame_range(sample_data):
+    store = SeriesStore(sample_data)
+
+    data = store.get_frame("AAPL", "1year")
+
+    assert list(data["close"]) == [155, 160]
+    assert set(data["ticker"]) == {"AAPL"}
+
+
+def test_get_frame_unknown_ticker(sample_data):
+    store = SeriesStore(sample_data)
+
+    data = store.get_frame("GOOGL", "all")
+
+    assert data.empty
+
+
+def test_empty_store():
+    store = SeriesStore(pd.DataFrame(columns=["ticker", "date", "close"]))
+
+    assert len(store) == 0
+    assert store.max_date is None
+
+
+def test_append_new_rows(sample_data):
+    store = SeriesStore(sample_data)
+    new_date = datetime.today()
+    new_rows = pd.DataFrame(
+        {'ticker': ['AAPL', 'NVDA'], 'date': [new_date, new_date], 'close': [165, 120]}
+    )
+
+    appended = store.append(new_rows)
+
+    assert appended == 2
+    assert list(store.get_series("AAPL")[1]) == [150, 155, 160, 165]
+    assert list(store.get_series("NVDA")[1]) == [120]
+    assert store.max_date == pd.Timestamp(new_date).to_datetime64()
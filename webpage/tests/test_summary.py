@@ -0,0 +1,70 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from store import SeriesStore
+from utils import (
+    RANGE_OPTIONS,
+    calculate_last_change,
+    calculate_pct_change_for_range,
+    filter_by_range,
+    get_value,
+)
+
+
+@pytest.fixture
+def sample_data():
+    today = datetime.today()
+    dates = [today - timedelta(days=days) for days in (2000, 700, 300, 100, 30, 7)]
+    data = {
+        'ticker': ['AAPL'] * 6 + ['MSFT'] * 2,
+        'date': dates + [dates[3], dates[5]],
+        'close': [50, 80, 120, 150, 155, 160, 300, 270],
+    }
+    return pd.DataFrame(data)
+
+
+def test_summary_matches_utils(sample_data):
+    summary = SeriesStore(sample_data).get_summary()
+
+    for ticker in ("AAPL", "MSFT"):
+        for range_option in RANGE_OPTIONS:
+            data = filter_by_range(sample_data[sample_data["ticker"] == ticker].copy(), range_option)
+            metrics = summary.get(ticker, range_option)
+
+            assert metrics["pct_change"] == pytest.approx(calculate_pct_change_for_range(data, ticker))
+            assert metrics["last_change"] == pytest.approx(calculate_last_change(data, ticker))
+            assert metrics["last_value"] == pytest.approx(get_value(data, ticker))
+
+
+def test_summary_single_row_range(sample_data):
+    summary = SeriesStore(sample_data).get_summary()
+
+    assert summary.get("MSFT", "3months") == {
+        "pct_change": 0.0,
+        "last_change": 0.0,
+        "last_value": 270.0,
+    }
+
+
+def test_summary_refreshes_after_append(sample_data):
+    store = SeriesStore(sample_data)
+    summary = store.get_summary()
+
+    store.append(pd.DataFrame({'ticker': ['AAPL'], 'date': [datetime.today()], 'close': [170]}))
+
+    assert store.get_summary() is not summary
+    assert store.get_summary().get("AAPL", "all")["last_value"] == 170
+
+
+def test_top_movers(sample_data):
+    summary = SeriesStore(sample_data).get_summary()
+
+    movers = summary.top_movers("all", limit=1)
+
+    assert list(movers["ticker"]) == ["AAPL"]
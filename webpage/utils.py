@@ -2,31 +2,114 @@ from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 
-def filter_by_range(data, range_option):
+RANGE_OPTIONS = ["3months", "6months", "thisyear", "1year", "3year", "5year", "all"]
+MIN_POINTS = 2
+MAX_POINTS = 5000
+
+
+def parse_range_option(value, default=None):
     """
-    Filters the provided stock data based on the specified data range.
+    Validates the data range requested by a client.
 
     :parameter:
-        - data: (pandas.DataFrame): A DataFrame containing stock data.
-        - range_option (str): A string specifying the data range to filter the data.
+        - value (str or None): The requested data range.
+        - default (str, optional): The range used when value is empty.
     :return:
-        - data: (pandas.DataFrame): A DataFrame containing only the rows where the 'date' is within the specified range.
+        - range_option (str): One of RANGE_OPTIONS.
+    :raises:
+        - ValueError: If the range is not one of RANGE_OPTIONS.
+    """
+    range_option = value or default
+    if range_option not in RANGE_OPTIONS:
+        raise ValueError(f"Unknown range {value}")
+    return range_option
+
+
+def parse_max_points(value):
+    """
+    Validates the maximum number of chart points requested by a client.
+
+    :parameter:
+        - value (str or None): The requested number of points.
+    :return:
+        - max_points (int or None): The number of points, None when value is empty.
+    :raises:
+        - ValueError: If value is not an integer between MIN_POINTS and MAX_POINTS.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        max_points = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid max_points {value}") from None
+    if not MIN_POINTS <= max_points <= MAX_POINTS:
+        raise ValueError(f"max_points must be between {MIN_POINTS} and {MAX_POINTS}")
+    return max_points
+
+
+def parse_limit(value, default, maximum):
+    """
+    Validates the number of results requested by a client.
+
+    :parameter:
+        - value (str or None): The requested number of results.
+        - default (int): The number used when value is empty.
+        - maximum (int): The largest accepted number.
+    :return:
+        - limit (int): The number of results.
+    :raises:
+        - ValueError: If value is not an integer between 1 and maximum.
+    """
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid limit {value}") from None
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+def get_range_start(range_option):
+    """
+    Returns the first date included in the specified data range.
+
+    :parameter:
+        - range_option (str): A string specifying the data range.
+    :return:
+        - start_date: (datetime or None): The earliest date of the range, or None when
+        the whole history is requested.
     """
     today = datetime.today()
 
     if range_option == "3months":
-        start_date = today - timedelta(days=90)
+        return today - timedelta(days=90)
     elif range_option == "6months":
-        start_date = today - timedelta(days=180)
+        return today - timedelta(days=180)
     elif range_option == "thisyear":
-        start_date = datetime(today.year, 1, 1)
+        return datetime(today.year, 1, 1)
     elif range_option == "1year":
-        start_date = today - timedelta(days=365)
+        return today - timedelta(days=365)
     elif range_option == "3year":
-        start_date = today - timedelta(days=1095)
+        return today - timedelta(days=1095)
     elif range_option == "5year":
-        start_date = today - timedelta(days=1825)
-    else:
+        return today - timedelta(days=1825)
+    return None
+
+
+def filter_by_range(data, range_option):
+    """
+    Filters the provided stock data based on the specified data range.
+
+    :parameter:
+        - data: (pandas.DataFrame): A DataFrame containing stock data.
+        - range_option (str): A string specifying the data range to filter the data.
+    :return:
+        - data: (pandas.DataFrame): A DataFrame containing only the rows where the 'date' is within the specified range.
+    """
+    start_date = get_range_start(range_option)
+    if start_date is None:
         return data
 
     data["date"] = pd.to_datetime(data["date"])
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+from routes import get_cached_company_index, get_cached_series_store
+
+WARM_UP_RETRY_DELAY = int(os.getenv("WARM_UP_RETRY_DELAY", "5"))
+WARM_UP_REFRESH_INTERVAL = int(os.getenv("WARM_UP_REFRESH_INTERVAL", "30"))
+
+_ready = threading.Event()
+_status = {"companies": False, "values": False, "summary": False}
+_thread_pid = None
+_thread_lock = threading.Lock()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def get_status():
+    return dict(_status)
+
+
+def warm_up(app):
+    """
+    Fills the company and price caches, the company index, the series store and its
+    summary table.
+
+    :parameter:
+        - app (flask.Flask): The application whose cache is filled.
+    :return:
+        - ready (bool): True when every stage completed.
+    """
+    with app.app_context():
+        company_index = get_cached_company_index()
+        _status["companies"] = company_index is not None
+
+        store = get_cached_series_store()
+        _status["values"] = store is not None
+
+        if store is not None:
+            store.get_summary()
+            _status["summary"] = True
+
+    if all(_status.values()):
+        _ready.set()
+    return is_ready()
+
+
+def _run(app):
+    while True:
+        try:
+            ready = warm_up(app)
+        except Exception as e:
+            print(f"Warm-up error: {e}")
+            ready = False
+        time.sleep(WARM_UP_REFRESH_INTERVAL if ready else WARM_UP_RETRY_DELAY)
+
+
+def start_warm_up(app):
+    """
+    Starts a background thread that warms the caches until they are loaded and then
+    keeps refreshing them, so requests never wait for a cold load or an expired cache.
+
+    :parameter:
+        - app (flask.Flask): The application whose cache is filled.
+    :return:
+        - thread (threading.Thread): The started daemon thread.
+    """
+    thread = threading.Thread(target=_run, args=(app,), name="cache-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def ensure_warm_up(app):
+    """
+    Starts the warm-up thread of the current process unless it already runs one.
+
+    Threads are not inherited by forked processes, so a thread started at import time
+    under 'gunicorn --preload' would only run in the master and no worker would ever
+    become ready. The thread is therefore started by each worker process itself: by
+    the post_fork hook of gunicorn.conf.py, when app.py is run directly, and on the
+    first request under any other server.
+
+    :parameter:
+        - app (flask.Flask): The application whose cache is filled.
+    :return:
+        - started (bool): True when this call started the thread.
+    """
+    global _thread_pid
+    pid = os.getpid()
+    if _thread_pid == pid:
+        return False
+    with _thread_lock:
+        if _thread_pid == pid:
+            return False
+        start_warm_up(app)
+        _thread_pid = pid
+    return True